@@ -1,219 +1,38 @@
 import tkinter as tk
-from tkinter import filedialog, ttk, scrolledtext
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from tkinter import filedialog, messagebox, simpledialog, ttk
 import threading
+import time
 import os
-from PIL import Image, ImageTk
+import weakref
 
 import jieba
-import jieba.posseg as pseg
-from collections import Counter
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
-import networkx as nx
-import pandas as pd
-import os
-
-
-# 导入上面B部分的所有函数
-# 分词功能
-def segment_text(text, user_dict=None):
-    """
-    对文本进行分词
-    :param text: 待分词文本
-    :param user_dict: 自定义词典路径
-    :return: 分词结果列表
-    """
-    if user_dict and os.path.exists(user_dict):
-        jieba.load_userdict(user_dict)
-    words = list(jieba.cut(text))
-    return words
-
-# 词频统计功能
-def count_word_frequency(word_list, top_n=None):
-    """
-    统计词频
-    :param word_list: 分词后的列表
-    :param top_n: 返回前N个高频词
-    :return: 词频统计结果
-    """
-    counter = Counter(word_list)
-    if top_n:
-        return counter.most_common(top_n)
-    return counter
 
-# 词性标注功能
-def pos_tagging(text):
-    """
-    进行词性标注
-    :param text: 待标注文本
-    :return: 标注结果列表 [(词, 词性)]
-    """
-    words_pos = list(pseg.cut(text))
-    return words_pos
+# 导入各模块的功能函数；matplotlib、wordcloud、networkx、PIL 等可视化依赖在首次使用时才加载
+from 文本处理 import (segment_text, count_word_frequency, pos_tagging, save_pos_results,
+                  ParallelSegmenter, analyze_text, analyze_corpus, iter_file_chunks)
+from 实体提取 import (extract_and_save_names, extract_and_save_locations, extract_and_save_weapons,
+                  save_entity_counts, extract_relationships, FastEntityExtractor)
+from 可视化 import visualize_bar_chart, generate_wordcloud, visualize_relationship_graph, render_wordcloud
+from 词典管理 import create_custom_dict, ensure_user_dict, get_dictionary_manager, load_dict_words
+from 结果缓存 import ResultCache, make_cache_key, text_fingerprint
+from 增量分析 import IncrementalAnalyzer
+from 任务调度 import TaskScheduler, JobCancelled
+from 结果视图 import ResultViewer, TokenResult, CountResult, TextResult
+from 性能监控 import instrumentation, get_metrics, configure_log, profile_run
+from 结果导出 import EXPORT_FORMATS, extension_of, format_of, job_output_dir
+from 关键词提取 import KeywordExtractor
+from 倒排索引 import InvertedIndex
+from 文件加载 import MappedText
 
-# 保存词性分类结果
-def save_pos_results(words_pos, output_file):
-    """
-    保存词性标注结果
-    :param words_pos: 词性标注结果
-    :param output_file: 输出文件路径
-    """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for word, pos in words_pos:
-            f.write(f"{word}\t{pos}\n")
+# 超过该字符数的文本使用多进程并行分词/词性标注
+PARALLEL_MIN_CHARS = 1 << 20
 
-# 柱状图可视化
-def visualize_bar_chart(data, title, xlabel, ylabel, output_file=None):
-    """
-    生成柱状图
-    :param data: 数据字典 {标签: 值}
-    :param title: 图表标题
-    :param xlabel: x轴标签
-    :param ylabel: y轴标签
-    :param output_file: 输出文件路径
-    """
-    plt.figure(figsize=(12, 8))
-    plt.bar(data.keys(), data.values())
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    
-    if output_file:
-        plt.savefig(output_file)
-    plt.show()
+# 武器词典路径
+WEAPON_DICT = "weapon_dict.txt"
 
-# 词云可视化
-def generate_wordcloud(word_freq, output_file=None, background_color='white'):
-    """
-    生成词云
-    :param word_freq: 词频字典 {词: 频率}
-    :param output_file: 输出文件路径
-    :param background_color: 背景颜色
-    """
-    wordcloud = WordCloud(
-        font_path='simhei.ttf',  # 使用中文字体
-        background_color=background_color,
-        width=800,
-        height=600
-    ).generate_from_frequencies(word_freq)
-    
-    plt.figure(figsize=(10, 8))
-    plt.imshow(wordcloud, interpolation='bilinear')
-    plt.axis('off')
-    
-    if output_file:
-        plt.savefig(output_file)
-    plt.show()
+# 提取结果和关系图的输出根目录，每个任务写入其中独立的子目录
+OUTPUT_ROOT = "output"
 
-# 关系图可视化
-def visualize_relationship_graph(relationships, output_file=None):
-    """
-    生成关系图
-    :param relationships: 关系列表 [(实体1, 实体2, 权重)]
-    :param output_file: 输出文件路径
-    """
-    G = nx.Graph()
-    
-    # 添加节点和边
-    for source, target, weight in relationships:
-        G.add_edge(source, target, weight=weight)
-    
-    # 计算节点大小，基于度中心性
-    degree = dict(nx.degree(G))
-    node_size = [v * 20 for v in degree.values()]
-    
-    plt.figure(figsize=(12, 10))
-    pos = nx.spring_layout(G, seed=42)
-    nx.draw_networkx_nodes(G, pos, node_size=node_size, node_color='skyblue')
-    nx.draw_networkx_edges(G, pos, width=1, alpha=0.5)
-    nx.draw_networkx_labels(G, pos, font_size=10, font_family='SimHei')
-    plt.axis('off')
-    
-    if output_file:
-        plt.savefig(output_file)
-    plt.show()
-
-# 自定义词典功能
-def create_custom_dict(words_dict, output_file):
-    """
-    创建自定义词典
-    :param words_dict: 词汇字典 {词: 词频}
-    :param output_file: 输出文件路径
-    """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for word, freq in words_dict.items():
-            f.write(f"{word} {freq} n\n")  # 默认词性为n
-
-# 统计并保存人名
-def extract_and_save_names(words_pos, output_file):
-    """
-    提取并保存人名
-    :param words_pos: 词性标注结果
-    :param output_file: 输出文件路径
-    :return: 人名词频字典
-    """
-    names = [word for word, pos in words_pos if pos == 'nr']
-    name_counts = Counter(names)
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for name, count in name_counts.most_common():
-            f.write(f"{name}\t{count}\n")
-    
-    return name_counts
-
-# 统计并保存地名
-def extract_and_save_locations(words_pos, output_file):
-    """
-    提取并保存地名
-    :param words_pos: 词性标注结果
-    :param output_file: 输出文件路径
-    :return: 地名词频字典
-    """
-    locations = [word for word, pos in words_pos if pos == 'ns']
-    location_counts = Counter(locations)
-    
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for location, count in location_counts.most_common():
-            f.write(f"{location}\t{count}\n")
-    
-    return location_counts
-
-# 统计并保存武器名
-def extract_and_save_weapons(text, weapon_dict, output_file):
-    """
-    提取并保存武器名
-    :param text: 文本内容
-    :param weapon_dict: 武器词典路径
-    :param output_file: 输出文件路径
-    :return: 武器词频字典
-    """
-    # 加载武器词典
-    jieba.load_userdict(weapon_dict)
-    words = list(jieba.cut(text))
-    
-    # 从武器词典中读取武器列表
-    weapons = []
-    with open(weapon_dict, 'r', encoding='utf-8') as f:
-        for line in f:
-            weapon = line.strip().split()[0]
-            weapons.append(weapon)
-    
-    # 统计武器出现频率
-    weapon_counts = {}
-    for word in words:
-        if word in weapons:
-            weapon_counts[word] = weapon_counts.get(word, 0) + 1
-    
-    # 保存结果
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for weapon, count in sorted(weapon_counts.items(), key=lambda x: x[1], reverse=True):
-            f.write(f"{weapon}\t{count}\n")
-    
-    return weapon_counts
 
 class NLPApp:
     def __init__(self, root):
@@ -239,8 +58,8 @@ class NLPApp:
         self.right_frame = ttk.LabelFrame(self.main_frame, text="结果显示")
         self.right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
         
-        # 文本显示区
-        self.text_area = scrolledtext.ScrolledText(self.right_frame, wrap=tk.WORD, width=60, height=15)
+        # 文本显示区：只渲染可见的行，完整结果按需分页读取
+        self.text_area = ResultViewer(self.right_frame)
         self.text_area.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
         
         # 可视化显示区
@@ -251,9 +70,68 @@ class NLPApp:
         self.status_bar = ttk.Label(self.root, text="就绪", relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        # 最近一个阶段的耗时与资源占用
+        self.metrics_label = ttk.Label(self.root, text="", relief=tk.SUNKEN, anchor=tk.W)
+        self.metrics_label.pack(side=tk.BOTTOM, fill=tk.X)
+        instrumentation.subscribe(lambda record: self.root.after(0, lambda: self.show_stage_metrics(record)))
+        
+        # 单次性能剖析：开启后由下一个开始运行的任务消费
+        self.profile_pending = False
+        self.profile_lock = threading.Lock()
+        
         # 存储当前文件路径
         self.current_file = None
-        self.text_content = None
+        self.document = None
+        
+        # 当前可保存的完整结果
+        self.result_source = None
+        
+        # 并行处理的工作进程数，None 表示使用全部CPU核
+        self.workers = None
+        
+        # 融合分析结果，各功能共享
+        self.analysis = None
+        
+        # 按段落缓存的增量分析状态，以及它所对应的词典指纹和武器名集合
+        # incremental_base 为尚未建立增量状态时最近一次命中缓存的语料
+        self.incremental = None
+        self.incremental_base = None
+        self.incremental_dict = None
+        self.analysis_lock = threading.Lock()
+        
+        # 后台任务调度：有界线程池，合并重复点击，分析完成后再执行依赖它的任务
+        self.doc_version = 0
+        self.scheduler = TaskScheduler(
+            max_workers=2,
+            dispatch=lambda callback: self.root.after(0, callback),
+            on_progress=self.show_progress
+        )
+        
+        # 磁盘结果缓存，重复打开同一文件时直接复用分析结果
+        self.result_cache = ResultCache()
+        
+        # TF-IDF 关键词提取，打开过的文档登记到持久化的 IDF 索引中
+        # 每个文件版本只登记一次，索引在加载新文件和退出时写回磁盘
+        self.keyword_extractor = KeywordExtractor()
+        self.keyword_lock = threading.Lock()
+        self.keyword_registered = {}   # 文档标识 -> 已登记的分析结果（弱引用）
+        self.keyword_dirty = False
+        
+        # 本次会话中分析过的文档的位置倒排索引，支持跨文档检索
+        self.inverted_index = InvertedIndex()
+        self.indexed_versions = {}
+        self.index_lock = threading.Lock()
+        
+        # 窗口绘制完成后在后台预热 jieba 词典
+        self.root.after(100, self.warm_up)
+    
+    def warm_up(self):
+        """在后台线程中构建 jieba 前缀词典并加载词性标注模型，避免第一次分析时等待"""
+        def warm_thread():
+            jieba.initialize()
+            import jieba.posseg
+        
+        threading.Thread(target=warm_thread, daemon=True).start()
         
     def create_menu(self):
         menu_bar = tk.Menu(self.root)
@@ -271,6 +149,10 @@ class NLPApp:
         function_menu.add_command(label="分词", command=lambda: self.process_text('segment'))
         function_menu.add_command(label="词频统计", command=lambda: self.process_text('frequency'))
         function_menu.add_command(label="词性标注", command=lambda: self.process_text('pos'))
+        function_menu.add_command(label="关键词提取", command=lambda: self.process_text('keywords'))
+        function_menu.add_command(label="检索...", command=self.search_index)
+        function_menu.add_separator()
+        function_menu.add_command(label="取消任务", command=self.cancel_tasks)
         menu_bar.add_cascade(label="功能", menu=function_menu)
         
         # 可视化菜单
@@ -280,6 +162,14 @@ class NLPApp:
         viz_menu.add_command(label="关系图", command=lambda: self.visualize('relationship'))
         menu_bar.add_cascade(label="可视化", menu=viz_menu)
         
+        # 性能菜单
+        perf_menu = tk.Menu(menu_bar, tearoff=0)
+        perf_menu.add_command(label="显示性能指标", command=self.show_metrics)
+        perf_menu.add_command(label="剖析下一次运行", command=self.profile_next_run)
+        perf_menu.add_command(label="写入性能日志...", command=self.choose_metrics_log)
+        perf_menu.add_command(label="清空性能指标", command=instrumentation.reset)
+        menu_bar.add_cascade(label="性能", menu=perf_menu)
+        
         # 帮助菜单
         help_menu = tk.Menu(menu_bar, tearoff=0)
         help_menu.add_command(label="关于", command=self.show_about)
@@ -295,6 +185,11 @@ class NLPApp:
         
         ttk.Button(file_frame, text="打开文件", command=self.open_file).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(file_frame, text="保存结果", command=self.save_results).pack(fill=tk.X, padx=5, pady=2)
+        ttk.Button(file_frame, text="取消任务", command=self.cancel_tasks).pack(fill=tk.X, padx=5, pady=2)
+        ttk.Label(file_frame, text="导出格式").pack(anchor=tk.W, padx=5)
+        self.export_format = tk.StringVar(value='csv')
+        ttk.Combobox(file_frame, textvariable=self.export_format, values=list(EXPORT_FORMATS),
+                     state='readonly', width=10).pack(fill=tk.X, padx=5, pady=2)
         
         # 文本处理按钮
         process_frame = ttk.LabelFrame(self.left_frame, text="文本处理")
@@ -303,6 +198,8 @@ class NLPApp:
         ttk.Button(process_frame, text="分词", command=lambda: self.process_text('segment')).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(process_frame, text="词频统计", command=lambda: self.process_text('frequency')).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(process_frame, text="词性标注", command=lambda: self.process_text('pos')).pack(fill=tk.X, padx=5, pady=2)
+        ttk.Button(process_frame, text="关键词提取", command=lambda: self.process_text('keywords')).pack(fill=tk.X, padx=5, pady=2)
+        ttk.Button(process_frame, text="检索", command=self.search_index).pack(fill=tk.X, padx=5, pady=2)
         
         # 实体提取按钮
         entity_frame = ttk.LabelFrame(self.left_frame, text="实体提取")
@@ -311,6 +208,9 @@ class NLPApp:
         ttk.Button(entity_frame, text="提取人名", command=lambda: self.extract_entity('name')).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(entity_frame, text="提取地名", command=lambda: self.extract_entity('location')).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(entity_frame, text="提取武器", command=lambda: self.extract_entity('weapon')).pack(fill=tk.X, padx=5, pady=2)
+        # 快速识别只对含姓氏、地名后缀的片段做词性标注；文本已经完整分析过时仍直接使用完整结果
+        self.fast_entities = tk.BooleanVar(value=False)
+        ttk.Checkbutton(entity_frame, text="快速识别人名/地名", variable=self.fast_entities).pack(anchor=tk.W, padx=5, pady=2)
         
         # 可视化按钮
         viz_frame = ttk.LabelFrame(self.left_frame, text="可视化")
@@ -319,149 +219,310 @@ class NLPApp:
         ttk.Button(viz_frame, text="生成柱状图", command=lambda: self.visualize('bar')).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(viz_frame, text="生成词云", command=lambda: self.visualize('wordcloud')).pack(fill=tk.X, padx=5, pady=2)
         ttk.Button(viz_frame, text="生成关系图", command=lambda: self.visualize('relationship')).pack(fill=tk.X, padx=5, pady=2)
+        # 柱状图和词云默认使用 TF-IDF 关键词权重，原始词频会被虚词和标点占据
+        self.chart_keywords = tk.BooleanVar(value=True)
+        ttk.Checkbutton(viz_frame, text="按关键词权重绘图", variable=self.chart_keywords).pack(anchor=tk.W, padx=5, pady=2)
     
     def open_file(self):
         file_path = filedialog.askopenfilename(
             filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")]
         )
         if file_path:
+            if file_path != self.current_file:
+                # 重新打开同一文件时保留按段落缓存的分析结果，只重新分析修改过的段落
+                self.incremental = None
+                self.incremental_base = None
             self.current_file = file_path
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    self.text_content = f.read()
-                    self.text_area.delete(1.0, tk.END)
-                    self.text_area.insert(tk.END, f"已加载文件: {os.path.basename(file_path)}\n")
-                    self.text_area.insert(tk.END, f"文件长度: {len(self.text_content)} 字符\n")
-                    self.text_area.insert(tk.END, "预览:\n")
-                    self.text_area.insert(tk.END, self.text_content[:200] + "...\n")
-                    self.status_bar.config(text=f"已加载文件: {file_path}")
+                # 只映射文件并检测编码，全文在分析任务中逐块解码
+                self.document = MappedText(file_path, errors='replace')
+                self.reset_analysis()
+                self.update_result(
+                    f"已加载文件: {os.path.basename(file_path)}\n"
+                    f"文件大小: {self.document.size / 1024:.1f} KB，编码: {self.document.encoding}\n"
+                    "预览:\n" + self.document.preview(200) + "...\n"
+                )
+                self.status_bar.config(text=f"已加载文件: {file_path}")
             except Exception as e:
-                self.text_area.delete(1.0, tk.END)
-                self.text_area.insert(tk.END, f"错误: {str(e)}")
+                self.update_result(f"错误: {str(e)}")
+            if self.keyword_dirty:
+                self.scheduler.submit(
+                    ('save_keyword_index',), lambda job: self.save_keyword_index(),
+                    on_error=lambda e: self.status_bar.config(text=f"IDF 索引保存失败: {e}"),
+                    label="保存 IDF 索引"
+                )
     
     def save_results(self):
-        if not hasattr(self, 'result_data'):
+        if self.result_source is None:
             tk.messagebox.showinfo("提示", "没有可保存的结果")
             return
             
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
-            filetypes=[("文本文件", "*.txt"), ("所有文件", "*.*")]
+            filetypes=[("文本文件", "*.txt"), ("CSV", "*.csv"), ("Parquet", "*.parquet"),
+                       ("Arrow IPC", "*.arrow"), ("所有文件", "*.*")]
         )
         
         if file_path:
-            try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(self.result_data)
-                self.status_bar.config(text=f"结果已保存至: {file_path}")
-            except Exception as e:
-                tk.messagebox.showerror("保存错误", str(e))
+            source = self.result_source
+            # .txt 按显示的文本保存，其他扩展名按对应的表格格式导出
+            fmt = None if file_path.lower().endswith('.txt') else format_of(file_path, default=None)
+            
+            # 在后台分块写出完整结果，而不是界面上显示的部分
+            def save_job(job):
+                return source.export(file_path, fmt, job.report)
+            
+            self.scheduler.submit(
+                ('save', file_path), save_job,
+                on_done=lambda path: self.status_bar.config(text=f"结果已保存至: {path}"),
+                on_error=lambda e: tk.messagebox.showerror("保存错误", str(e)),
+                label="保存结果"
+            )
+    
+    def reset_analysis(self):
+        """取消上一个文件的分析和显示任务并丢弃其分析结果；保存结果等任务继续完成"""
+        # 与文档相关的任务键以 doc_version 结尾
+        version = self.doc_version
+        self.scheduler.cancel_where(lambda key: key[-1] == version)
+        self.doc_version += 1
+        self.analysis = None
+        for attr in ('segmented_words', 'words_pos', 'word_freq', 'relationships'):
+            if hasattr(self, attr):
+                delattr(self, attr)
+    
+    def get_analysis(self, progress=None):
+        """
+        对当前文本做一次融合分析（单次 pseg.cut 遍历），结果在分词、词频、词性和实体提取之间共享
+        :param progress: 进度回调 progress(已完成字符数, 总字符数)，抛出异常时中止分析
+        :return: AnalysisResult
+        """
+        with self.analysis_lock:
+            if self.analysis is not None:
+                return self.analysis
+            document = self.document
+            # 武器词典仍作为自定义词典加载，避免武器名被切碎影响其他统计
+            weapon_dict = WEAPON_DICT if os.path.exists(WEAPON_DICT) else None
+            if weapon_dict:
+                ensure_user_dict(weapon_dict)
+            dict_fingerprint = get_dictionary_manager().fingerprint
+            cache_key = make_cache_key(text_fingerprint(iter_file_chunks(document)), 'pos', dict_fingerprint)
+            weapons = frozenset(load_dict_words(weapon_dict)) if weapon_dict else frozenset()
+            cached = self.result_cache.get(cache_key)
+            if self.incremental_dict != (dict_fingerprint, weapons):
+                # 词典变化后各段落的分词结果都可能改变，需要从头分析
+                self.incremental = None
+                self.incremental_base = None
+                self.incremental_dict = (dict_fingerprint, weapons)
+            if cached is not None:
+                # 命中缓存时不建立按段落的状态，文本修改后未命中缓存时才由这份结果补建
+                if self.incremental is None:
+                    self.incremental_base = cached.corpus
+                analysis = analyze_corpus(cached.corpus, weapons)
+            else:
+                incremental = self.incremental
+                if incremental is None:
+                    incremental = IncrementalAnalyzer(weapons)
+                    if self.incremental_base is not None:
+                        try:
+                            incremental.load_corpus(self.incremental_base)
+                        except ValueError:
+                            # 缓存的结果与块划分对不上时从头分析
+                            incremental = IncrementalAnalyzer(weapons)
+                    self.incremental = incremental
+                    self.incremental_base = None
+                # 进程池只在变化的文本足够多时才会真正启动
+                with ParallelSegmenter(self.workers, weapon_dict) as segmenter:
+                    incremental.update(iter_file_chunks(document), segmenter, PARALLEL_MIN_CHARS, progress)
+                analysis = incremental.result()
+                try:
+                    self.result_cache.put(cache_key, analysis.corpus)
+                except OSError:
+                    # 缓存目录不可写时只是放弃缓存，不影响分析结果
+                    pass
+            # 分析期间重新加载了文件时结果已经过期，不再保存
+            if document is self.document:
+                self.segmented_words = analysis.words
+                self.words_pos = analysis.words_pos
+                self.analysis = analysis
+            return analysis
+    
+    def submit_analysis(self):
+        """
+        提交当前文档的分析任务；同一文档的分析进行中时复用该任务
+        :return: Job
+        """
+        return self.scheduler.submit(
+            ('analysis', self.doc_version),
+            self.profiled(lambda job: self.get_analysis(job.report)),
+            label="分析文本"
+        )
+    
+    def show_progress(self, job, done, total):
+        if total:
+            self.status_bar.config(text=f"{job.label}: {done * 100 // total}%")
+    
+    def job_failed(self, error, message, status):
+        """任务出错或被取消时更新界面"""
+        if isinstance(error, JobCancelled):
+            self.status_bar.config(text="任务已取消")
+            return
+        self.update_result(f"{message}: {str(error)}")
+        self.status_bar.config(text=status)
+    
+    def cancel_tasks(self):
+        count = self.scheduler.cancel_all()
+        self.status_bar.config(text=f"已取消 {count} 个任务" if count else "没有进行中的任务")
     
     def process_text(self, mode):
-        if not self.text_content:
+        if self.document is None:
             tk.messagebox.showinfo("提示", "请先加载文本文件")
             return
             
         self.status_bar.config(text="处理中...")
         
-        # 使用线程避免界面卡顿
-        def process_thread():
-            result = ""
-            try:
-                if mode == 'segment':
-                    words = segment_text(self.text_content)
-                    result = " ".join(words[:100]) + "...\n\n共分词 " + str(len(words)) + " 个词语"
-                    self.segmented_words = words
-                
-                elif mode == 'frequency':
-                    if not hasattr(self, 'segmented_words'):
-                        self.segmented_words = segment_text(self.text_content)
-                    
-                    word_freq = count_word_frequency(self.segmented_words, top_n=50)
-                    result = "词频统计结果 (前50):\n\n"
-                    for word, freq in word_freq:
-                        result += f"{word}: {freq}\n"
-                    
-                    self.word_freq = word_freq
-                
-                elif mode == 'pos':
-                    words_pos = pos_tagging(self.text_content)
-                    result = "词性标注结果 (前100):\n\n"
-                    for word, pos in words_pos[:100]:
-                        result += f"{word}/{pos} "
-                    
-                    self.words_pos = words_pos
-                
-                self.result_data = result
-                
-                # 在主线程中更新UI
-                self.root.after(0, lambda: self.update_result(result))
-                self.root.after(0, lambda: self.status_bar.config(text="处理完成"))
+        # 在后台任务中处理，词频等结果等待分词任务完成后再生成
+        def process_job(job, analysis):
+            # 结果是按需分页读取的行序列，显示和保存的都是完整结果
+            result = None
+            if mode == 'segment':
+                result = TokenResult(analysis.corpus, header=[f"共分词 {len(analysis.words)} 个词语", ""])
+            
+            elif mode == 'frequency':
+                result = CountResult(analysis.word_freq, header=[f"词频统计结果 (共{len(analysis.word_freq)}个词):", ""])
                 
-            except Exception as e:
-                error_msg = f"处理过程中发生错误: {str(e)}"
-                self.root.after(0, lambda: self.update_result(error_msg))
-                self.root.after(0, lambda: self.status_bar.config(text="处理出错"))
+                self.word_freq = analysis.word_freq.most_common(50)
+            
+            elif mode == 'pos':
+                result = TokenResult(analysis.corpus, with_pos=True, header=["词性标注结果:", ""])
+            
+            elif mode == 'keywords':
+                keywords, n_docs = self.extract_keywords(analysis)
+                result = CountResult([(word, round(weight, 4)) for word, weight in keywords],
+                                     header=[f"关键词 (TF-IDF，IDF 索引共 {n_docs} 篇文档):", ""],
+                                     column='keyword', value_column='weight')
+            
+            return result
         
-        # 启动线程
-        threading.Thread(target=process_thread).start()
+        def done(result):
+            self.result_source = result
+            self.update_result(result)
+            self.status_bar.config(text="处理完成")
+        
+        self.scheduler.submit(
+            ('process', mode, self.doc_version), self.profiled(process_job), deps=[self.submit_analysis()],
+            on_done=done, on_error=lambda e: self.job_failed(e, "处理过程中发生错误", "处理出错"),
+            label="处理中"
+        )
+    
+    def search_index(self):
+        if self.document is None:
+            tk.messagebox.showinfo("提示", "请先加载文本文件")
+            return
+        query = simpledialog.askstring(
+            "检索", "输入词语或短语；用 & 连接两个词查询同一句中的共现（如 曹操&许昌）:", parent=self.root)
+        if not query or not query.strip():
+            return
+        query = query.strip()
+        doc_name = os.path.abspath(self.current_file)
+        doc_version = self.doc_version
+        
+        def search_job(job, analysis):
+            index = self.inverted_index
+            with self.index_lock:
+                # 当前文档加入（或替换进）会话索引，之前打开过的文档一并参与检索
+                if self.indexed_versions.get(doc_name) != doc_version:
+                    index.add_document(doc_name, analysis.corpus)
+                    self.indexed_versions[doc_name] = doc_version
+                if '&' in query:
+                    a, b = [part.strip() for part in query.split('&', 1)]
+                    passages = index.co_mentions(a, b)
+                    lines = [f"{os.path.basename(doc)} 第{sentence + 1}句: {index.sentence_text(doc, sentence).strip()}"
+                             for doc, sentence, _ in passages[:1000]]
+                    header = [f"“{a}”与“{b}”同句出现 {len(passages)} 处（{len(index)} 篇文档）:", ""]
+                else:
+                    total = len(index.matches(query)[1].doc)
+                    lines = [f"{os.path.basename(row.document)} @{row.offset}: {row.left:>20}【{row.match}】{row.right}"
+                             for row in index.kwic(query, width=20, limit=1000)]
+                    header = [f"“{query}”出现 {total} 处（{len(index)} 篇文档）:", ""]
+            return TextResult('\n'.join(header + lines))
+        
+        def done(result):
+            self.result_source = result
+            self.update_result(result)
+            self.status_bar.config(text="检索完成")
+        
+        self.scheduler.submit(
+            ('search', query, self.doc_version), self.profiled(search_job), deps=[self.submit_analysis()],
+            on_done=done, on_error=lambda e: self.job_failed(e, "检索过程中发生错误", "检索出错"),
+            label="检索中"
+        )
     
     def extract_entity(self, entity_type):
-        if not hasattr(self, 'words_pos'):
-            if not self.text_content:
-                tk.messagebox.showinfo("提示", "请先加载文本文件")
-                return
-            self.words_pos = pos_tagging(self.text_content)
+        if self.document is None:
+            tk.messagebox.showinfo("提示", "请先加载文本文件")
+            return
         
         self.status_bar.config(text="提取中...")
         
-        def extract_thread():
-            result = ""
-            try:
-                if entity_type == 'name':
-                    temp_file = "temp_names.txt"
-                    name_counts = extract_and_save_names(self.words_pos, temp_file)
-                    result = "人名提取结果:\n\n"
-                    for name, count in name_counts.most_common(30):
-                        result += f"{name}: {count}\n"
-                    
-                    self.name_counts = name_counts
-                
-                elif entity_type == 'location':
-                    temp_file = "temp_locations.txt"
-                    location_counts = extract_and_save_locations(self.words_pos, temp_file)
-                    result = "地名提取结果:\n\n"
-                    for location, count in location_counts.most_common(30):
-                        result += f"{location}: {count}\n"
-                    
-                    self.location_counts = location_counts
-                
-                elif entity_type == 'weapon':
-                    # 假设有武器词典
-                    if not os.path.exists("weapon_dict.txt"):
-                        result = "错误: 武器词典文件不存在"
-                    else:
-                        temp_file = "temp_weapons.txt"
-                        weapon_counts = extract_and_save_weapons(self.text_content, "weapon_dict.txt", temp_file)
-                        result = "武器提取结果:\n\n"
-                        for weapon, count in sorted(weapon_counts.items(), key=lambda x: x[1], reverse=True)[:30]:
-                            result += f"{weapon}: {count}\n"
-                        
-                        self.weapon_counts = weapon_counts
+        # 导出格式在界面线程中读取
+        fmt = self.export_format.get()
+        document = self.document
+        fast = self.fast_entities.get() and entity_type in ('name', 'location') and self.analysis is None
+        
+        def fast_counts(label):
+            return FastEntityExtractor().count(iter_file_chunks(document), (label,))[label]
+        
+        def entity_header(kind, fast):
+            if fast:
+                # 快速识别以召回率换速度，不等同于完整词性标注的结果
+                return [f"{kind}提取结果（快速识别，可能漏掉部分{kind}，召回率约 89%）:", ""]
+            return [f"{kind}提取结果:", ""]
+        
+        def extract_job(job, analysis=None):
+            result = None
+            output_file = None
+            if entity_type == 'name':
+                output_file = self.job_output_file('names', fmt)
+                name_counts = fast_counts('name') if fast else analysis.name_counts
+                save_entity_counts(name_counts, output_file, fmt, column='name')
+                result = CountResult(name_counts, header=entity_header("人名", fast), column='name')
                 
-                self.result_data = result
-                
-                # 在主线程中更新UI
-                self.root.after(0, lambda: self.update_result(result))
-                self.root.after(0, lambda: self.status_bar.config(text="提取完成"))
+                self.name_counts = name_counts
+            
+            elif entity_type == 'location':
+                output_file = self.job_output_file('locations', fmt)
+                location_counts = fast_counts('location') if fast else analysis.location_counts
+                save_entity_counts(location_counts, output_file, fmt, column='location')
+                result = CountResult(location_counts, header=entity_header("地名", fast), column='location')
                 
-            except Exception as e:
-                error_msg = f"提取过程中发生错误: {str(e)}"
-                self.root.after(0, lambda: self.update_result(error_msg))
-                self.root.after(0, lambda: self.status_bar.config(text="提取出错"))
-        
-        # 启动线程
-        threading.Thread(target=extract_thread).start()
+                self.location_counts = location_counts
+            
+            elif entity_type == 'weapon':
+                # 假设有武器词典
+                if not os.path.exists(WEAPON_DICT):
+                    result = TextResult("错误: 武器词典文件不存在")
+                else:
+                    output_file = self.job_output_file('weapons', fmt)
+                    weapon_counts = extract_and_save_weapons(iter_file_chunks(document), WEAPON_DICT, output_file, fmt)
+                    result = CountResult(weapon_counts, header=["武器提取结果:", ""], column='weapon')
+                    
+                    self.weapon_counts = weapon_counts
+            
+            return result, output_file
+        
+        def done(result):
+            result, output_file = result
+            self.result_source = result
+            self.update_result(result)
+            self.status_bar.config(text=f"提取完成，结果已导出至: {output_file}" if output_file else "提取完成")
+        
+        # 武器按词典直接匹配原文，快速识别只标注候选片段，都不需要等待完整的词性标注
+        deps = [] if entity_type == 'weapon' or fast else [self.submit_analysis()]
+        self.scheduler.submit(
+            ('entity', entity_type, fmt, fast, self.doc_version), self.profiled(extract_job), deps=deps,
+            on_done=done, on_error=lambda e: self.job_failed(e, "提取过程中发生错误", "提取出错"),
+            label="提取中"
+        )
     
     def visualize(self, viz_type):
         self.status_bar.config(text="生成可视化...")
@@ -470,81 +531,184 @@ class NLPApp:
         for widget in self.viz_frame.winfo_children():
             widget.destroy()
         
-        def visualize_thread():
-            try:
+        # 在主线程中读取显示区尺寸，词云直接按该尺寸渲染
+        frame_size = (self.viz_frame.winfo_width(), self.viz_frame.winfo_height())
+        if frame_size[0] <= 1 or frame_size[1] <= 1:
+            frame_size = (800, 600)
+        
+        use_keywords = self.chart_keywords.get()
+        
+        def visualize_job(job, analysis=None):
+            # 首次可视化时才加载 matplotlib
+            import matplotlib.pyplot as plt
+            
+            if viz_type == 'bar':
+                if use_keywords and analysis is not None:
+                    data = self.extract_keywords(analysis)[0]
+                    title, ylabel = "关键词权重 (TF-IDF)", "权重"
+                else:
+                    if not hasattr(self, 'word_freq'):
+                        if analysis is None:
+                            raise Exception("请先加载文本并进行分词")
+                        self.word_freq = analysis.word_freq.most_common(20)
+                    data = self.word_freq
+                    title, ylabel = "词频统计", "频率"
+                
                 # 创建图形
                 fig = plt.Figure(figsize=(6, 4), dpi=100)
                 ax = fig.add_subplot(111)
                 
-                if viz_type == 'bar':
-                    if not hasattr(self, 'word_freq'):
-                        if not hasattr(self, 'segmented_words'):
-                            if not self.text_content:
-                                raise Exception("请先加载文本并进行分词")
-                            self.segmented_words = segment_text(self.text_content)
-                        self.word_freq = count_word_frequency(self.segmented_words, top_n=20)
-                    
-                    labels = [word for word, _ in self.word_freq[:15]]
-                    values = [freq for _, freq in self.word_freq[:15]]
-                    
-                    ax.bar(labels, values)
-                    ax.set_title("词频统计")
-                    ax.set_xlabel("词语")
-                    ax.set_ylabel("频率")
-                    plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
-                    fig.tight_layout()
+                labels = [word for word, _ in data[:15]]
+                values = [freq for _, freq in data[:15]]
                 
-                elif viz_type == 'wordcloud':
-                    if not hasattr(self, 'word_freq'):
-                        if not hasattr(self, 'segmented_words'):
-                            if not self.text_content:
-                                raise Exception("请先加载文本并进行分词")
-                            self.segmented_words = segment_text(self.text_content)
-                        self.word_freq = count_word_frequency(self.segmented_words)
-                    
+                ax.bar(labels, values)
+                ax.set_title(title)
+                ax.set_xlabel("词语")
+                ax.set_ylabel(ylabel)
+                plt.setp(ax.get_xticklabels(), rotation=45, ha="right")
+                fig.tight_layout()
+                return 'figure', fig, "可视化生成完成"
+            
+            elif viz_type == 'wordcloud':
+                if use_keywords and analysis is not None:
+                    word_freq_dict = dict(self.extract_keywords(analysis)[0])
+                elif hasattr(self, 'word_freq'):
                     word_freq_dict = dict(self.word_freq)
-                    
-                    # 生成词云图像并保存
-                    temp_file = "temp_wordcloud.png"
-                    generate_wordcloud(word_freq_dict, temp_file)
-                    
-                    # 在主线程中显示图像
-                    self.root.after(0, lambda: self.show_image(temp_file))
-                    self.root.after(0, lambda: self.status_bar.config(text="词云生成完成"))
-                    return
+                else:
+                    if analysis is None:
+                        raise Exception("请先加载文本并进行分词")
+                    word_freq_dict = dict(analysis.word_freq)
                 
-                elif viz_type == 'relationship':
-                    # 这里需要有关系数据
-                    if not hasattr(self, 'relationships'):
-                        # 使用示例关系数据
-                        self.relationships = [('刘备', '关羽', 5), ('关羽', '张飞', 4), 
-                                             ('刘备', '张飞', 5), ('曹操', '刘备', 3), 
-                                             ('曹操', '孙权', 2), ('孙权', '刘备', 2)]
-                    
-                    # 生成关系图并保存
-                    temp_file = "temp_relationship.png"
-                    visualize_relationship_graph(self.relationships, temp_file)
-                    
-                    # 在主线程中显示图像
-                    self.root.after(0, lambda: self.show_image(temp_file))
-                    self.root.after(0, lambda: self.status_bar.config(text="关系图生成完成"))
-                    return
-                
-                # 在主线程中更新UI
-                self.root.after(0, lambda: self.show_matplotlib_figure(fig))
-                self.root.after(0, lambda: self.status_bar.config(text="可视化生成完成"))
+                # 在内存中按显示区尺寸生成词云图像
+                image = render_wordcloud(word_freq_dict, frame_size)
+                return 'image', image, "词云生成完成"
+            
+            elif viz_type == 'relationship':
+                if not hasattr(self, 'relationships') and analysis is not None:
+                    # 按句子统计人名共现关系
+                    self.relationships = extract_relationships(analysis.corpus, min_weight=2, top_k=200)
+                    if not self.relationships:
+                        raise Exception("文本中没有找到共现的人名")
+                if not hasattr(self, 'relationships'):
+                    # 未加载文本时使用示例关系数据
+                    self.relationships = [('刘备', '关羽', 5), ('关羽', '张飞', 4), 
+                                         ('刘备', '张飞', 5), ('曹操', '刘备', 3), 
+                                         ('曹操', '孙权', 2), ('孙权', '刘备', 2)]
                 
-            except Exception as e:
-                error_msg = f"可视化生成过程中发生错误: {str(e)}"
-                self.root.after(0, lambda: self.update_result(error_msg))
-                self.root.after(0, lambda: self.status_bar.config(text="可视化生成出错"))
-        
-        # 启动线程
-        threading.Thread(target=visualize_thread).start()
+                # 生成关系图并保存到本任务的输出目录
+                image_file = os.path.join(job_output_dir(OUTPUT_ROOT), "relationship.png")
+                visualize_relationship_graph(self.relationships, image_file)
+                return 'image', image_file, f"关系图生成完成: {image_file}"
+        
+        def done(result):
+            kind, content, status = result
+            if kind == 'figure':
+                self.show_matplotlib_figure(content)
+            else:
+                self.show_image(content)
+            self.status_bar.config(text=status)
+        
+        deps = [self.submit_analysis()] if self.document is not None else []
+        self.scheduler.submit(
+            ('visualize', viz_type, use_keywords, self.doc_version), self.profiled(visualize_job), deps=deps,
+            on_done=done, on_error=lambda e: self.job_failed(e, "可视化生成过程中发生错误", "可视化生成出错"),
+            label="生成可视化"
+        )
+    
+    def extract_keywords(self, analysis, top_k=200):
+        """
+        提取当前文档的 TF-IDF 关键词
+        每个文件版本的第一次调用把文档登记到内存中的 IDF 索引（同一文件重复登记时替换旧版本），
+        之后的调用（如重绘图表）只读索引，不写磁盘
+        :param analysis: 分析结果
+        :param top_k: 关键词数
+        :return: ([(词, 权重)], 索引中的文档数)
+        """
+        doc_id = os.path.abspath(self.current_file) if self.current_file else None
+        extractor = self.keyword_extractor
+        with self.keyword_lock:
+            registered = self.keyword_registered.get(doc_id)
+            if doc_id is not None and (registered is None or registered() is not analysis):
+                extractor.add_documents([(doc_id, analysis.word_freq)], save=False)
+                self.keyword_registered[doc_id] = weakref.ref(analysis)
+                self.keyword_dirty = True
+            keywords = extractor.extract(analysis.word_freq, top_k, learn=False)
+            return keywords, extractor.index.n_docs
+    
+    def save_keyword_index(self):
+        """把新登记的文档写回 IDF 索引文件"""
+        with self.keyword_lock:
+            if self.keyword_dirty and self.keyword_extractor.index_path:
+                self.keyword_extractor.index.save(self.keyword_extractor.index_path)
+            self.keyword_dirty = False
+    
+    def job_output_file(self, name, fmt):
+        """
+        为一次提取任务分配独立的输出文件，同时运行的任务不会互相覆盖
+        :param name: 结果名称，如 names
+        :param fmt: 导出格式
+        :return: 输出文件路径
+        """
+        return os.path.join(job_output_dir(OUTPUT_ROOT), name + extension_of(fmt))
+    
+    def show_stage_metrics(self, record):
+        text = f"{record.stage}: {record.wall * 1000:.0f} ms，CPU {record.cpu * 1000:.0f} ms"
+        if record.tokens:
+            text += f"，{record.tokens} 词"
+        if record.bytes_read:
+            text += f"，读取 {record.bytes_read} 字节"
+        if record.bytes_written:
+            text += f"，写入 {record.bytes_written} 字节"
+        if record.max_rss is not None:
+            text += f"，进程内存最高 {record.max_rss} MB"
+        self.metrics_label.config(text=text)
+    
+    def show_metrics(self):
+        """在结果显示区列出各阶段的累计指标"""
+        lines = ["各阶段性能指标:", "",
+                 f"{'阶段':<20}{'次数':>6}{'耗时(s)':>10}{'CPU(s)':>10}{'最长(s)':>10}{'词数':>12}{'词/秒':>12}{'读取':>12}{'写入':>12}"]
+        for stage, m in sorted(get_metrics().items(), key=lambda x: -x[1]['wall_s']):
+            lines.append(f"{stage:<20}{m['calls']:>6}{m['wall_s']:>10.3f}{m['cpu_s']:>10.3f}{m['max_wall_s']:>10.3f}"
+                         f"{m['tokens']:>12}{m['tokens_per_sec'] or 0:>12.0f}{m['bytes_read']:>12}{m['bytes_written']:>12}")
+        self.update_result(TextResult('\n'.join(lines)))
+    
+    def choose_metrics_log(self):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".jsonl",
+            filetypes=[("JSON 行", "*.jsonl"), ("所有文件", "*.*")]
+        )
+        if file_path:
+            configure_log(file_path)
+            self.status_bar.config(text=f"性能记录将写入: {file_path}")
+    
+    def profile_next_run(self):
+        with self.profile_lock:
+            self.profile_pending = True
+        self.status_bar.config(text="下一个任务将在 cProfile/tracemalloc 下运行")
+    
+    def profiled(self, func):
+        """
+        包装任务函数：开启了单次剖析时，第一个开始运行的任务在剖析下运行
+        cProfile 只记录开启它的线程，所以由任务自己在所在线程中开启
+        """
+        def run(job, *args):
+            with self.profile_lock:
+                profile, self.profile_pending = self.profile_pending, False
+            if not profile:
+                return func(job, *args)
+            prefix = os.path.abspath(time.strftime("profile_%Y%m%d_%H%M%S"))
+            with profile_run(prefix) as paths:
+                result = func(job, *args)
+            self.root.after(0, lambda: self.metrics_label.config(text=f"剖析结果: {paths['report']}"))
+            return result
+        return run
     
-    def update_result(self, text):
-        self.text_area.delete(1.0, tk.END)
-        self.text_area.insert(tk.END, text)
+    def update_result(self, result):
+        """
+        在结果显示区显示结果
+        :param result: 字符串或 ResultSource
+        """
+        self.text_area.set_source(result)
     
     def show_matplotlib_figure(self, figure):
         # 清除现有图形
@@ -552,6 +716,7 @@ class NLPApp:
             widget.destroy()
         
         # 创建画布
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
         canvas = FigureCanvasTkAgg(figure, self.viz_frame)
         canvas.draw()
         canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
@@ -561,11 +726,12 @@ class NLPApp:
         for widget in self.viz_frame.winfo_children():
             widget.destroy()
         
-        # 加载并显示图像
-        img = Image.open(image_path)
+        # 加载并显示图像，也可以直接传入内存中的 PIL 图像
+        from PIL import Image, ImageTk
+        img = image_path if isinstance(image_path, Image.Image) else Image.open(image_path)
         # 调整图像大小以适应框架
         width, height = self.viz_frame.winfo_width(), self.viz_frame.winfo_height()
-        if width > 1 and height > 1:  # 确保框架已经被正确调整大小
+        if width > 1 and height > 1 and img.size != (width, height):  # 确保框架已经被正确调整大小
             img = img.resize((width, height), Image.Resampling.LANCZOS)
         
         photo = ImageTk.PhotoImage(img)
@@ -589,25 +755,29 @@ class NLPApp:
    - 分词: 将文本分割成单词
    - 词频统计: 计算词语出现频率
    - 词性标注: 标注词语的词性
+   - 关键词提取: 按 TF-IDF 权重列出关键词，IDF 由打开过的文档逐步积累
+   - 检索: 在本次打开过的文档中查找词语或短语的上下文，或用 曹操&许昌 查找同句共现
 
 3. 实体提取:
    - 提取人名: 识别并提取文本中的人名
    - 提取地名: 识别并提取文本中的地名
    - 提取武器: 识别并提取文本中的武器名称
+   - 快速识别人名/地名: 不做完整词性标注，只对含姓氏或地名后缀的片段标注，速度快数倍，但约一成人名、地名会漏掉（基准语料上召回率约 89%）
 
 4. 可视化:
-   - 生成柱状图: 显示词频统计结果
+   - 生成柱状图: 显示关键词权重（取消"按关键词权重绘图"时显示词频）
    - 生成词云: 创建词云可视化
    - 生成关系图: 显示实体之间的关系
 """
-        self.text_area.delete(1.0, tk.END)
-        self.text_area.insert(tk.END, help_text)
+        self.update_result(help_text)
 
 # 主程序
 def main():
     root = tk.Tk()
     app = NLPApp(root)
     root.mainloop()
+    app.scheduler.shutdown()
+    app.save_keyword_index()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,206 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+class Job:
+    """
+    调度器中的一个任务
+    任务函数的第一个参数是任务本身，通过 report 报告进度，并在其中检查是否已被取消
+    """
+
+    def __init__(self, scheduler, key, func, deps, label):
+        self.scheduler = scheduler
+        self.key = key
+        self.func = func
+        self.deps = list(deps)
+        self.label = label
+        self.future = Future()
+        self._cancel = threading.Event()
+        self._callbacks = []
+        self._started = False
+        self._finished = False
+        self._last_report = 0.0
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def done(self):
+        return self._finished
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def check(self):
+        """任务已被取消时抛出 JobCancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.label)
+
+    def report(self, done, total=None):
+        """
+        报告进度，同时检查取消标志；界面更新按时间间隔节流
+        :param done: 已完成量
+        :param total: 总量
+        """
+        self.check()
+        now = time.monotonic()
+        if now - self._last_report >= self.scheduler.progress_interval or (total and done >= total):
+            self._last_report = now
+            self.scheduler._report(self, done, total)
+
+
+# 后台任务调度器
+class TaskScheduler:
+    """
+    固定大小的线程池，负责界面发起的后台任务
+    - 键相同且仍在进行中的任务只执行一次，回调合并到同一任务上
+    - 任务可以依赖其他任务，依赖全部成功后才开始，结果按顺序作为参数传入
+    - 取消是协作式的：任务在 report/check 处退出，尚未开始的任务直接结束
+    - 回调和进度通过 dispatch 转交给界面线程执行
+    """
+
+    def __init__(self, max_workers=2, dispatch=None, on_progress=None, progress_interval=0.1):
+        """
+        :param max_workers: 最多同时运行的任务数
+        :param dispatch: 把回调转交给界面线程的函数，如 lambda f: root.after(0, f)
+        :param on_progress: 进度回调 on_progress(任务, 已完成量, 总量)
+        :param progress_interval: 进度回调的最小间隔（秒）
+        """
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='nlp-task')
+        self._dispatch = dispatch or (lambda callback: callback())
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, deps=(), on_done=None, on_error=None, label=None):
+        """
+        提交任务；同键任务仍在进行中时直接复用
+        :param key: 任务键，相同的键表示相同的工作
+        :param func: 任务函数 func(任务, *依赖结果)
+        :param deps: 依赖的任务列表
+        :param on_done: 成功回调 on_done(结果)
+        :param on_error: 失败或取消回调 on_error(异常)
+        :param label: 在状态栏中显示的任务名称
+        :return: Job
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            created = job is None or job.cancelled
+            if created:
+                job = Job(self, key, func, deps, label or str(key))
+                self._jobs[key] = job
+            job._callbacks.append((on_done, on_error))
+        if created:
+            self._wait_deps(job)
+        return job
+
+    def _wait_deps(self, job):
+        remaining = [len(job.deps)]
+        lock = threading.Lock()
+
+        def dep_done(future):
+            with lock:
+                remaining[0] -= 1
+                ready = remaining[0] == 0
+            if future.cancelled() or future.exception() is not None:
+                error = JobCancelled(job.label) if future.cancelled() else future.exception()
+                self._finish(job, error=error)
+            elif ready:
+                self._start(job)
+
+        if not job.deps:
+            self._start(job)
+        for dep in job.deps:
+            dep.future.add_done_callback(dep_done)
+
+    def _start(self, job):
+        with self._lock:
+            if job.done() or job._started:
+                return
+            job._started = True
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            job.check()
+            result = job.func(job, *[dep.result() for dep in job.deps])
+        except BaseException as e:
+            self._finish(job, error=e)
+        else:
+            self._finish(job, result=result)
+
+    def _finish(self, job, result=None, error=None):
+        with self._lock:
+            if job._finished:
+                return
+            job._finished = True
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+            callbacks = job._callbacks
+            job._callbacks = []
+        # 在锁外完成 future，依赖它的任务会在回调中被启动
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+        for on_done, on_error in callbacks:
+            if error is None and on_done is not None:
+                self._dispatch(lambda on_done=on_done: on_done(result))
+            elif error is not None and on_error is not None:
+                self._dispatch(lambda on_error=on_error: on_error(error))
+
+    def _report(self, job, done, total):
+        if self.on_progress is not None:
+            self._dispatch(lambda: self.on_progress(job, done, total))
+
+    def cancel(self, key):
+        """
+        取消指定任务
+        :param key: 任务键
+        :return: 是否找到了进行中的任务
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+        if job is None:
+            return False
+        self._cancel_job(job)
+        return True
+
+    def cancel_where(self, predicate):
+        """
+        取消键满足条件的进行中任务
+        :param predicate: 判断函数 predicate(任务键)
+        :return: 取消的任务数
+        """
+        with self._lock:
+            jobs = [job for key, job in self._jobs.items() if predicate(key)]
+        for job in jobs:
+            self._cancel_job(job)
+        return len(jobs)
+
+    def cancel_all(self):
+        """取消全部进行中的任务"""
+        return self.cancel_where(lambda key: True)
+
+    def _cancel_job(self, job):
+        job._cancel.set()
+        with self._lock:
+            started = job._started
+        if not started:
+            self._finish(job, error=JobCancelled(job.label))
+
+    def pending(self):
+        """进行中的任务列表"""
+        with self._lock:
+            return list(self._jobs.values())
+
+    def shutdown(self, wait=False):
+        """取消全部任务并关闭线程池"""
+        self.cancel_all()
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,546 @@
+import os
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from 文本处理 import TokenCorpus, stream_pos_tagging
+from 性能监控 import instrument
+
+
+_FORMAT_VERSION = 1
+
+# 每条倒排记录的字段数：文档、词位置、字符偏移、句号
+_FIELDS = 4
+
+# 解码后的倒排表缓存的词数
+_CACHE_TERMS = 4096
+
+# 倒排记录：各字段为等长数组，按 (文档, 词位置) 排序
+Postings = namedtuple('Postings', ['doc', 'position', 'offset', 'sentence'])
+
+# 关键词上下文（KWIC）
+Concordance = namedtuple('Concordance', ['document', 'offset', 'sentence', 'left', 'match', 'right'])
+
+
+def varint_encode(values):
+    """
+    向量化的 LEB128 变长编码：每字节 7 位数据，最高位为 1 表示后面还有字节
+    :param values: 非负整数数组
+    :return: uint8 数组
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        nbytes += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.concatenate(([0], np.cumsum(nbytes)[:-1]))
+    owner = np.repeat(np.arange(len(values)), nbytes)
+    byte_index = np.arange(int(nbytes.sum())) - starts[owner]
+    out = ((values[owner] >> (np.uint64(7) * byte_index.astype(np.uint64))) & np.uint64(0x7F)).astype(np.uint8)
+    out[byte_index < nbytes[owner] - 1] |= 0x80
+    return out
+
+
+def varint_decode(data):
+    """
+    varint_encode 的逆运算
+    :param data: uint8 数组
+    :return: uint64 数组
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    if not len(data):
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    owner = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = ((np.arange(len(data)) - starts[owner]) * 7).astype(np.uint64)
+    return np.add.reduceat((data & 0x7F).astype(np.uint64) << shift, starts)
+
+
+def _sorted_contains(keys, queries):
+    """在已排序的 keys 中查找 queries，二分查找，不对大数组排序"""
+    index = np.searchsorted(keys, queries)
+    found = index < len(keys)
+    found[found] = keys[index[found]] == queries[found]
+    return found
+
+
+def _unique_sorted(keys):
+    """已排序数组去重"""
+    if not len(keys):
+        return keys
+    keep = np.ones(len(keys), dtype=bool)
+    keep[1:] = keys[1:] != keys[:-1]
+    return keys[keep]
+
+
+def _segment_cumsum(values, new_segment):
+    """分段前缀和：new_segment 为 True 处重新开始累加"""
+    total = np.cumsum(values)
+    start = np.maximum.accumulate(np.where(new_segment, np.arange(len(values)), 0))
+    return total - total[start] + values[start]
+
+
+# 倒排表分段
+class _Segment:
+    """
+    一组文档建立的倒排表，建立后不再修改
+    - 倒排表按词连续存放，各字段在同一文档内做差分后用变长字节编码压缩
+    - 保留各文档的词ID序列，用于拼出上下文和合并分段
+    - 文档被删除或替换时只做标记，查询时过滤，合并分段时丢弃
+    """
+
+    def __init__(self, names, doc_ptr, tokens, sentences, offsets, term_ptr, blob):
+        self.names = names
+        self.doc_ptr = doc_ptr
+        self.tokens = tokens
+        self.sentences = sentences
+        self.offsets = offsets
+        self.term_ptr = term_ptr
+        self.blob = blob
+        self.deleted = np.zeros(len(names), dtype=bool)
+
+    @property
+    def size(self):
+        """词数（含已删除的文档）"""
+        return len(self.tokens)
+
+    @property
+    def dead_size(self):
+        """已删除文档的词数"""
+        lengths = np.diff(self.doc_ptr)
+        return int(lengths[self.deleted].sum())
+
+    def documents(self):
+        """
+        未删除的文档
+        :return: [(文档名, 词ID数组, 句号数组)]
+        """
+        ptr = self.doc_ptr
+        return [(name, self.tokens[ptr[i]:ptr[i + 1]], self.sentences[ptr[i]:ptr[i + 1]])
+                for i, name in enumerate(self.names) if not self.deleted[i]]
+
+    @classmethod
+    def build(cls, documents, word_length):
+        """
+        :param documents: [(文档名, 词ID数组, 句号数组)]
+        :param word_length: 词表中各词的字符数
+        :return: _Segment
+        """
+        names = [name for name, _, _ in documents]
+        lengths = np.array([len(tokens) for _, tokens, _ in documents], dtype=np.int64)
+        doc_ptr = np.concatenate(([0], np.cumsum(lengths)))
+        empty = np.zeros(0, dtype=np.int64)
+        tokens = np.concatenate([tokens for _, tokens, _ in documents] or [np.zeros(0, dtype=np.int32)])
+        sentences = np.concatenate([sentences for _, _, sentences in documents] or [empty]).astype(np.int64)
+        if not len(tokens):
+            # 没有任何词时所有词的倒排表都为空
+            return cls(names, doc_ptr, tokens, sentences, empty, np.zeros(len(word_length) + 1, dtype=np.int64),
+                       np.zeros(0, dtype=np.uint8))
+
+        # 字符偏移：文档内词长的前缀和
+        doc_of = np.repeat(np.arange(len(documents), dtype=np.int64), lengths)
+        new_doc = np.zeros(len(tokens), dtype=bool)
+        new_doc[doc_ptr[:-1][lengths > 0]] = True
+        lengths_of = word_length[tokens]
+        offsets = _segment_cumsum(lengths_of, new_doc) - lengths_of
+        position = np.arange(len(tokens), dtype=np.int64) - doc_ptr[doc_of]
+
+        # 按词稳定排序，同一词内保持 (文档, 位置) 的先后顺序
+        order = np.argsort(tokens, kind='stable')
+        term = tokens[order]
+        counts = np.bincount(term, minlength=len(word_length))
+        fields = np.stack([doc_of[order], position[order], offsets[order], sentences[order]], axis=1)
+
+        # 差分：新词的第一条记录保留原值；文档内的后续记录只记与前一条的差
+        new_term = np.ones(len(term), dtype=bool)
+        new_term[1:] = term[1:] != term[:-1]
+        deltas = fields.copy()
+        deltas[1:, 0] -= np.where(new_term[1:], 0, fields[:-1, 0])
+        same_doc = ~new_term[1:] & (deltas[1:, 0] == 0)
+        deltas[1:, 1:] -= np.where(same_doc[:, None], fields[:-1, 1:], 0)
+        blob = varint_encode(deltas.ravel())
+
+        # 每个词的字节范围：按记录切分编码结果，没有出现的词字节范围为空
+        value_end = np.flatnonzero(blob < 0x80) + 1
+        record_end = value_end[_FIELDS - 1::_FIELDS]
+        term_ptr = np.concatenate(([0], record_end[np.cumsum(counts) - 1]))
+        term_ptr[1:][counts == 0] = 0
+        term_ptr = np.maximum.accumulate(term_ptr)
+        return cls(names, doc_ptr, tokens, sentences, offsets, term_ptr, blob)
+
+    def postings(self, term_id):
+        """
+        :param term_id: 全局词ID
+        :return: 本段内的 (文档, 词位置, 字符偏移, 句号) 数组，已过滤删除的文档
+        """
+        if term_id + 1 >= len(self.term_ptr):
+            # 建立本段之后才出现的词
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, empty
+        start, stop = self.term_ptr[term_id], self.term_ptr[term_id + 1]
+        deltas = varint_decode(self.blob[start:stop]).astype(np.int64).reshape(-1, _FIELDS)
+        doc = np.cumsum(deltas[:, 0])
+        new_segment = np.ones(len(doc), dtype=bool)
+        new_segment[1:] = deltas[1:, 0] != 0
+        fields = (doc,) + tuple(_segment_cumsum(deltas[:, i], new_segment) for i in range(1, _FIELDS))
+        if self.deleted.any():
+            keep = ~self.deleted[doc]
+            fields = tuple(field[keep] for field in fields)
+        return fields
+
+
+# 位置倒排索引
+class InvertedIndex:
+    """
+    由分词/词性标注结果建立的位置倒排索引：词 -> (文档, 字符偏移, 句号)
+    - 倒排表分段存放：新加入的文档在下一次查询前建成一个新的分段，已有分段不重建
+    - 大小相近的相邻分段合并，分段数保持在文档总量的对数级别；被删除的词数超过一半时整体重建
+    - 查询时只解码涉及的词，解码结果按 LRU 缓存
+    - 保留各文档的词ID序列，KWIC 上下文和句子文本直接由词拼出，不需要原文
+    """
+
+    def __init__(self):
+        self.vocab = []
+        self._word_index = {}
+        self._segments = []
+        self._pending = OrderedDict()     # 尚未建立倒排表的文档名 -> (全局词ID数组, 句号数组)
+        self._located = {}                # 已建立倒排表的文档名 -> (分段, 段内文档序号)
+        self._refresh_names()
+
+    def _refresh_names(self):
+        """重新计算全局文档编号：各分段的文档依次编号（含已删除的文档）"""
+        self.names = [name for segment in self._segments for name in segment.names]
+        self._bases = np.cumsum([0] + [len(segment.names) for segment in self._segments])
+        self._cache = OrderedDict()
+
+    def __len__(self):
+        return len(self._located) + len(self._pending)
+
+    def __contains__(self, name):
+        return name in self._located or name in self._pending
+
+    def add_document(self, name, corpus):
+        """
+        添加或替换一篇文档
+        :param name: 文档名（如文件路径或章节名）
+        :param corpus: TokenCorpus，或 [(词, 词性)] 标注结果
+        """
+        if not isinstance(corpus, TokenCorpus):
+            corpus = TokenCorpus.from_tagged(corpus)
+        word_index = self._word_index
+        remap = np.empty(len(corpus.vocab), dtype=np.int32)
+        for i, word in enumerate(corpus.vocab):
+            word_id = word_index.get(word)
+            if word_id is None:
+                word_id = word_index[word] = len(self.vocab)
+                self.vocab.append(word)
+            remap[i] = word_id
+        self.remove_document(name)
+        self._pending[name] = (remap[corpus.ids], corpus.sentence_ids())
+
+    def add_text(self, name, text):
+        """
+        对文本做词性标注后添加
+        :param name: 文档名
+        :param text: 文本内容或文本块可迭代对象
+        """
+        self.add_document(name, TokenCorpus.from_tagged(stream_pos_tagging(text)))
+
+    def remove_document(self, name):
+        if self._pending.pop(name, None) is not None:
+            return True
+        located = self._located.pop(name, None)
+        if located is None:
+            return False
+        segment, local = located
+        segment.deleted[local] = True
+        self._cache = OrderedDict()
+        return True
+
+    def _word_length(self):
+        return np.fromiter(map(len, self.vocab), dtype=np.int64, count=len(self.vocab))
+
+    def _replace_segments(self, old, documents):
+        """用 documents 建立的新分段替换 old 中的分段（追加在末尾）"""
+        segment = _Segment.build(documents, self._word_length())
+        self._segments = [s for s in self._segments if all(s is not o for o in old)] + [segment]
+        for local, name in enumerate(segment.names):
+            self._located[name] = (segment, local)
+
+    @instrument('index_build', count=None)
+    def _flush(self):
+        """为待加入的文档建立新分段，并按需合并分段"""
+        if self._pending:
+            self._replace_segments([], [(name,) + data for name, data in self._pending.items()])
+            self._pending.clear()
+            # 最新的分段不小于前一个的一半时合并两者，类似二进制计数器的进位
+            while len(self._segments) > 1 and self._segments[-1].size * 2 >= self._segments[-2].size:
+                old = self._segments[-2:]
+                self._replace_segments(old, old[0].documents() + old[1].documents())
+        if self._mostly_dead():
+            self._compact()
+        self._refresh_names()
+
+    def _compact(self):
+        """把全部文档合并为一个分段"""
+        old = list(self._segments)
+        documents = [doc for segment in old for doc in segment.documents()]
+        documents += [(name,) + data for name, data in self._pending.items()]
+        self._pending.clear()
+        self._replace_segments(old, documents)
+
+    @instrument('index_compact', count=None)
+    def build(self):
+        """把全部文档重建为一个分段，去掉已删除文档占用的空间"""
+        self._compact()
+        self._refresh_names()
+
+    def _mostly_dead(self):
+        dead = sum(segment.dead_size for segment in self._segments)
+        return dead * 2 > sum(segment.size for segment in self._segments)
+
+    def _ensure_built(self):
+        if self._pending or self._mostly_dead():
+            self._flush()
+
+    def _locate(self, doc):
+        """全局文档编号 -> (分段, 段内文档序号)"""
+        index = int(np.searchsorted(self._bases, doc, side='right')) - 1
+        return self._segments[index], doc - int(self._bases[index])
+
+    def term_id(self, term):
+        return self._word_index.get(term)
+
+    def postings(self, term):
+        """
+        查询词的全部出现位置
+        :param term: 词语
+        :return: Postings
+        """
+        self._ensure_built()
+        term_id = self._word_index.get(term)
+        if term_id is None or not self._segments:
+            empty = np.zeros(0, dtype=np.int64)
+            return Postings(empty, empty, empty, empty)
+        cached = self._cache.get(term_id)
+        if cached is not None:
+            self._cache.move_to_end(term_id)
+            return cached
+        parts = [segment.postings(term_id) for segment in self._segments]
+        # 分段按文档编号先后排列，拼接后仍按 (文档, 位置) 有序
+        doc = np.concatenate([part[0] + base for part, base in zip(parts, self._bases.tolist())])
+        result = Postings(doc, *(np.concatenate([part[i] for part in parts]) for i in range(1, _FIELDS)))
+        self._cache[term_id] = result
+        if len(self._cache) > _CACHE_TERMS:
+            self._cache.popitem(last=False)
+        return result
+
+    def lookup(self, term):
+        """
+        :param term: 词语
+        :return: [(文档名, 字符偏移, 句号)]
+        """
+        postings = self.postings(term)
+        names = self.names
+        return [(names[doc], offset, sentence) for doc, offset, sentence
+                in zip(postings.doc.tolist(), postings.offset.tolist(), postings.sentence.tolist())]
+
+    def count(self, term):
+        """词的总出现次数"""
+        return len(self.postings(term).doc)
+
+    def documents(self, term):
+        """
+        :param term: 词语
+        :return: {文档名: 出现次数}
+        """
+        docs, counts = np.unique(self.postings(term).doc, return_counts=True)
+        return {self.names[doc]: count for doc, count in zip(docs.tolist(), counts.tolist())}
+
+    def _terms(self, query):
+        if isinstance(query, str):
+            if query in self._word_index:
+                return [query]
+            import jieba
+            return [word for word in jieba.lcut(query) if word.strip()]
+        return list(query)
+
+    def phrase(self, words):
+        """
+        查询连续出现的词序列
+        :param words: 词语列表；也可以是字符串，不在词表中时按 jieba 分词
+        :return: 短语首词的 Postings
+        """
+        words = self._terms(words)
+        if not words:
+            return self.postings('')
+        lists = [self.postings(word) for word in words]
+        # 以出现次数最少的词为锚点，在其他词的有序键中二分查找
+        anchor = min(range(len(words)), key=lambda i: len(lists[i].doc))
+        start = (lists[anchor].doc << 32) | (lists[anchor].position - anchor)
+        keep = lists[anchor].position >= anchor
+        for i, postings in enumerate(lists):
+            if i != anchor and keep.any():
+                keep &= _sorted_contains((postings.doc << 32) | postings.position, start + i)
+        start = start[keep]
+        first = lists[0]
+        found = np.searchsorted((first.doc << 32) | first.position, start)
+        return Postings(*(field[found] for field in first))
+
+    def matches(self, query):
+        """
+        查询词语或短语
+        :param query: 词语、词语列表或短语字符串
+        :return: (词语列表, 首词的 Postings)
+        """
+        words = self._terms(query)
+        return words, self.postings(words[0]) if len(words) == 1 else self.phrase(words)
+
+    def co_mentions(self, a, b, window=0):
+        """
+        查询两个词在同一句（或相距不超过 window 句）中出现的位置
+        :param a: 词语
+        :param b: 词语
+        :param window: 允许相隔的句数
+        :return: [(文档名, a 所在句号, b 所在句号)]
+        """
+        pa, pb = self.postings(a), self.postings(b)
+        # 倒排表按 (文档, 位置) 排序，(文档, 句号) 键也已有序
+        keys_a = _unique_sorted((pa.doc << 32) | pa.sentence)
+        keys_b = _unique_sorted((pb.doc << 32) | pb.sentence)
+        if window == 0:
+            if len(keys_a) > len(keys_b):
+                hits = keys_b[_sorted_contains(keys_a, keys_b)]
+            else:
+                hits = keys_a[_sorted_contains(keys_b, keys_a)]
+            pairs = zip(hits.tolist(), hits.tolist())
+        else:
+            # 与 a 的每一句距离最近的、不早于 (句号 - window) 的 b 句
+            index = np.searchsorted(keys_b, keys_a - window)
+            found = index < len(keys_b)
+            nearest = keys_b[np.minimum(index, len(keys_b) - 1)] if len(keys_b) else keys_a
+            found &= (nearest <= keys_a + window) & (nearest >> 32 == keys_a >> 32)
+            pairs = zip(keys_a[found].tolist(), nearest[found].tolist())
+        mask = (1 << 32) - 1
+        return [(self.names[key_a >> 32], key_a & mask, key_b & mask) for key_a, key_b in pairs]
+
+    def _join(self, doc, start, stop):
+        segment, local = self._locate(doc)
+        base = segment.doc_ptr[local]
+        vocab = self.vocab
+        return ''.join(vocab[i] for i in segment.tokens[base + start:base + stop].tolist())
+
+    def _doc_length(self, doc):
+        segment, local = self._locate(doc)
+        return int(segment.doc_ptr[local + 1] - segment.doc_ptr[local])
+
+    def sentence_text(self, document, sentence):
+        """
+        由词序列拼出一句话
+        :param document: 文档名，或全局文档编号
+        :param sentence: 句号
+        :return: 句子文本
+        """
+        self._ensure_built()
+        if isinstance(document, int):
+            segment, local = self._locate(document)
+        else:
+            segment, local = self._located[document]
+        base, end = segment.doc_ptr[local], segment.doc_ptr[local + 1]
+        sentences = segment.sentences[base:end]
+        start = base + np.searchsorted(sentences, sentence, side='left')
+        stop = base + np.searchsorted(sentences, sentence, side='right')
+        return ''.join(self.vocab[i] for i in segment.tokens[start:stop].tolist())
+
+    def kwic(self, query, width=15, limit=100):
+        """
+        关键词上下文索引（KWIC）
+        :param query: 词语、词语列表或短语字符串
+        :param width: 左右两侧各保留的字符数
+        :param limit: 最多返回的条数
+        :return: [Concordance]，上下文中的换行替换为空格
+        """
+        words, postings = self.matches(query)
+        match = ''.join(words)
+        result = []
+        for doc, position, offset, sentence in zip(*(field[:limit].tolist() for field in postings)):
+            length = self._doc_length(doc)
+            # 每个词至少一个字符，向两侧各取 width 个词足以覆盖 width 个字符
+            left = self._join(doc, max(position - width, 0), position)[-width:]
+            right = self._join(doc, position + len(words), min(position + len(words) + width, length))[:width]
+            # 上下文跨行时换成空格，每条结果占一行
+            left, right = left.replace('\n', ' '), right.replace('\n', ' ')
+            result.append(Concordance(self.names[doc], offset, sentence, left, match, right))
+        return result
+
+    def save(self, path):
+        """
+        原子地写出索引（.npz，不使用 pickle），写出前合并为一个分段
+        :param path: 文件路径
+        """
+        if len(self._segments) != 1 or self._pending or any(s.deleted.any() for s in self._segments):
+            self.build()
+        segment = self._segments[0]
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            np.savez(f, version=np.array([_FORMAT_VERSION]),
+                     vocab=np.array(self.vocab, dtype=np.str_), names=np.array(segment.names, dtype=np.str_),
+                     doc_ptr=segment.doc_ptr, tokens=segment.tokens, sentences=segment.sentences,
+                     offsets=segment.offsets, term_ptr=segment.term_ptr, blob=segment.blob)
+        os.replace(temp_file, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        读取索引
+        :param path: 文件路径
+        :return: InvertedIndex
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version'][0]) != _FORMAT_VERSION:
+                raise ValueError(f"索引格式不兼容: {path}")
+            index = cls()
+            index.vocab = data['vocab'].tolist()
+            index._word_index = {word: i for i, word in enumerate(index.vocab)}
+            segment = _Segment(data['names'].tolist(), data['doc_ptr'], data['tokens'], data['sentences'],
+                               data['offsets'], data['term_ptr'], data['blob'])
+        index._segments = [segment]
+        for local, name in enumerate(segment.names):
+            index._located[name] = (segment, local)
+        index._refresh_names()
+        return index
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="查询位置倒排索引")
+    parser.add_argument('index', help="索引文件（批处理的 index 分析项生成的 index.npz）")
+    parser.add_argument('query', help="词语或短语")
+    parser.add_argument('--with', dest='other', default=None, help="查询与该词在同一句（或 --window 句以内）共同出现的位置")
+    parser.add_argument('--window', type=int, default=0, help="共现时允许相隔的句数")
+    parser.add_argument('--width', type=int, default=15, help="上下文字符数")
+    parser.add_argument('--limit', type=int, default=50, help="最多显示的条数")
+    args = parser.parse_args(argv)
+
+    index = InvertedIndex.load(args.index)
+    if args.other:
+        passages = index.co_mentions(args.query, args.other, args.window)
+        print(f"共 {len(passages)} 处")
+        for document, sentence, other in passages[:args.limit]:
+            text = index.sentence_text(document, sentence)
+            if other != sentence:
+                text += ' … ' + index.sentence_text(document, other)
+            print(f"{document}\t{sentence}\t{text.strip()}")
+    else:
+        rows = index.kwic(args.query, args.width, args.limit)
+        print(f"共 {len(index.matches(args.query)[1].doc)} 处")
+        for row in rows:
+            print(f"{row.document}\t{row.offset}\t{row.left:>{args.width}}【{row.match}】{row.right}")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,369 @@
+import os
+import re
+from array import array
+
+import numpy as np
+
+from 性能监控 import instrument
+
+
+# IDF 索引的默认存放位置
+DEFAULT_IDF_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'nlp_system', 'idf_index.npz')
+
+_FORMAT_VERSION = 1
+
+# 至少包含一个汉字或字母，且不是纯数字
+_CANDIDATE = re.compile(r'[一-鿿A-Za-z]')
+
+# 常见的虚词和代词；单字词由长度条件排除
+STOP_WORDS = frozenset("""
+我们 你们 他们 她们 它们 咱们 自己 什么 怎么 怎样 这个 那个 这些 那些 这样 那样 这里 那里 这么 那么
+一个 一些 一样 一般 一起 一直 一面 一边 一时 不是 就是 还是 只是 但是 可是 而且 并且 或者 因为 所以
+如果 虽然 然后 然而 于是 因此 不过 已经 可以 不能 没有 不会 只有 还有 只要 以后 之后 以前 之前 之间
+起来 出来 下来 上来 过来 回来 进来 时候 今天 现在 如此 如何 为何 为了 对于 关于 由于 以及 其中 其他
+非常 十分 特别 所有 每个 各种 任何 别人 大家 有些 有的 许多 很多 不少 甚至 仍然 依然 便是 乃是 只见
+却说 且说 说道 问道 听得 不知 不可 不得 不敢 何不 如今 正是 原来 果然 忽然 一齐 些许
+""".split())
+
+
+def is_candidate(word, stop_words=STOP_WORDS, min_chars=2):
+    """
+    判断词语能否作为关键词：排除标点、空白、数字、单字词和停用词
+    :param word: 词语
+    :param stop_words: 停用词集合
+    :param min_chars: 最少字符数
+    :return: bool
+    """
+    return len(word) >= min_chars and word not in stop_words and _CANDIDATE.search(word) is not None
+
+
+def load_stop_words(path):
+    """
+    读取停用词文件，每行一个词
+    :param path: 文件路径
+    :return: 停用词集合（包含内置停用词）
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return STOP_WORDS | {line.strip() for line in f if line.strip()}
+
+
+def _pack_strings(strings):
+    """字符串列表编码为 (偏移数组, UTF-8 字节数组)"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+
+def _unpack_strings(offsets, blob):
+    data = blob.tobytes()
+    return [data[start:stop].decode('utf-8') for start, stop in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+
+# 语料级 IDF 索引
+class IDFIndex:
+    """
+    由自己的文档集合增量构建的文档频率表
+    每篇文档按 doc_id 登记其不重复词ID；同一 doc_id 再次加入时先减去旧版本，文档修改后重复导入不会重复计数
+    """
+
+    def __init__(self):
+        self.vocab = []
+        self._word_index = {}
+        self._df = np.zeros(0, dtype=np.int64)
+        self._docs = {}          # doc_id -> 不重复词ID数组
+
+    def __len__(self):
+        return len(self._docs)
+
+    @property
+    def n_docs(self):
+        return len(self._docs)
+
+    @property
+    def df(self):
+        """各词的文档频率，下标为词ID"""
+        return self._df
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def _term_ids(self, terms):
+        word_index = self._word_index
+        ids = array('i')
+        for term in terms:
+            term_id = word_index.get(term)
+            if term_id is None:
+                term_id = word_index[term] = len(self.vocab)
+                self.vocab.append(term)
+            ids.append(term_id)
+        if len(self.vocab) > len(self._df):
+            self._df = np.concatenate([self._df, np.zeros(len(self.vocab) - len(self._df), dtype=np.int64)])
+        return np.unique(np.frombuffer(ids, dtype=np.int32))
+
+    def add_document(self, doc_id, terms):
+        """
+        登记一篇文档
+        :param doc_id: 文档标识（如文件路径）
+        :param terms: 文档中的词语（可重复，如词频 Counter 的键或分词结果）
+        :return: 文档中的不重复词数
+        """
+        self.remove_document(doc_id)
+        ids = self._term_ids(terms)
+        self._df[ids] += 1
+        self._docs[doc_id] = ids
+        return len(ids)
+
+    def remove_document(self, doc_id):
+        """
+        移除一篇文档
+        :param doc_id: 文档标识
+        :return: 是否存在该文档
+        """
+        ids = self._docs.pop(doc_id, None)
+        if ids is None:
+            return False
+        self._df[ids] -= 1
+        return True
+
+    def idf(self, terms=None):
+        """
+        平滑 IDF: ln((1 + N) / (1 + df)) + 1
+        :param terms: 词语列表；为 None 时返回整个词表的 IDF
+        :return: float64 数组，不在索引中的词按 df=0 计算
+        """
+        n = self.n_docs
+        if terms is None:
+            df = self.df
+        else:
+            ids = np.fromiter((self._word_index.get(term, -1) for term in terms), dtype=np.int64,
+                              count=len(terms))
+            df = np.zeros(len(ids), dtype=np.int64)
+            known = ids >= 0
+            df[known] = self._df[ids[known]]
+        return np.log((1.0 + n) / (1.0 + df)) + 1.0
+
+    def save(self, path=DEFAULT_IDF_PATH):
+        """
+        原子地写出索引
+        :param path: 文件路径（.npz）
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        vocab_offsets, vocab_blob = _pack_strings(self.vocab)
+        doc_ids = list(self._docs)
+        doc_offsets, doc_blob = _pack_strings(doc_ids)
+        term_ptr = np.zeros(len(doc_ids) + 1, dtype=np.int64)
+        np.cumsum([len(self._docs[doc_id]) for doc_id in doc_ids], out=term_ptr[1:])
+        terms = np.concatenate([self._docs[doc_id] for doc_id in doc_ids]) if doc_ids else np.zeros(0, np.int32)
+        temp_file = f"{path}.{os.getpid()}.tmp"
+        with open(temp_file, 'wb') as f:
+            np.savez(f, version=np.array([_FORMAT_VERSION]), df=self.df,
+                     vocab_offsets=vocab_offsets, vocab_blob=vocab_blob,
+                     doc_offsets=doc_offsets, doc_blob=doc_blob, term_ptr=term_ptr, terms=terms)
+        os.replace(temp_file, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_IDF_PATH):
+        """
+        读取索引
+        :param path: 文件路径
+        :return: IDFIndex
+        """
+        with np.load(path, allow_pickle=False) as data:
+            if int(data['version'][0]) != _FORMAT_VERSION:
+                raise ValueError(f"IDF 索引格式不兼容: {path}")
+            index = cls()
+            index.vocab = _unpack_strings(data['vocab_offsets'], data['vocab_blob'])
+            index._word_index = {word: i for i, word in enumerate(index.vocab)}
+            index._df = data['df'].astype(np.int64)
+            term_ptr = data['term_ptr']
+            terms = data['terms']
+            for i, doc_id in enumerate(_unpack_strings(data['doc_offsets'], data['doc_blob'])):
+                index._docs[doc_id] = terms[term_ptr[i]:term_ptr[i + 1]].copy()
+        return index
+
+    @classmethod
+    def open(cls, path=DEFAULT_IDF_PATH):
+        """读取索引，文件不存在或已损坏时返回空索引"""
+        try:
+            return cls.load(path)
+        except (OSError, ValueError, KeyError):
+            return cls()
+
+
+# 稀疏文档-词矩阵
+class DocumentTermMatrix:
+    """
+    CSR 格式的文档-词频矩阵：indptr、indices（列即词表下标）、data（词频）
+    由 count_word_frequency 的结果构建，对所有文档一次性向量化地计算 TF-IDF 并取前K个
+    """
+
+    def __init__(self, vocab, indptr, indices, data, doc_ids=None):
+        """
+        :param vocab: 列对应的词表
+        :param indptr: 行指针，长度为文档数 + 1
+        :param indices: 各非零项的列号
+        :param data: 各非零项的词频
+        :param doc_ids: 各行的文档标识
+        """
+        self.vocab = vocab
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.data = np.asarray(data, dtype=np.float64)
+        self.doc_ids = list(doc_ids) if doc_ids is not None else list(range(len(self.indptr) - 1))
+
+    @classmethod
+    def from_counts(cls, counts_list, doc_ids=None, candidate=is_candidate):
+        """
+        由各文档的词频构建矩阵
+        :param counts_list: 词频 Counter（或 {词: 频次}、[(词, 频次)]）的序列
+        :param doc_ids: 文档标识序列
+        :param candidate: 词语筛选函数，为 None 时保留全部词
+        :return: DocumentTermMatrix
+        """
+        vocab = []
+        word_index = {}
+        indptr = array('q', [0])
+        indices = array('i')
+        data = array('d')
+        for counts in counts_list:
+            items = counts.items() if hasattr(counts, 'items') else counts
+            for word, count in items:
+                if candidate is not None and not candidate(word):
+                    continue
+                column = word_index.get(word)
+                if column is None:
+                    column = word_index[word] = len(vocab)
+                    vocab.append(word)
+                indices.append(column)
+                data.append(count)
+            indptr.append(len(indices))
+        return cls(vocab, np.frombuffer(indptr, dtype=np.int64), np.frombuffer(indices, dtype=np.int32),
+                   np.frombuffer(data, dtype=np.float64), doc_ids)
+
+    @property
+    def shape(self):
+        return len(self.indptr) - 1, len(self.vocab)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def _rows(self):
+        """每个非零项所在的行号"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.indptr))
+
+    def document_frequency(self):
+        """
+        各列出现的文档数
+        :return: int64 数组
+        """
+        return np.bincount(self.indices, minlength=len(self.vocab))
+
+    def tfidf(self, idf, sublinear=False):
+        """
+        计算各非零项的 TF-IDF 权重：TF 为词频除以文档的候选词总数
+        :param idf: 与 vocab 对应的 IDF 数组
+        :param sublinear: 使用 1 + ln(tf) 抑制高频词
+        :return: 与 data 对应的权重数组
+        """
+        rows = self._rows()
+        totals = np.bincount(rows, weights=self.data, minlength=len(self))
+        tf = np.log(self.data) + 1.0 if sublinear else self.data
+        return tf / np.maximum(totals[rows], 1.0) * np.asarray(idf)[self.indices]
+
+    @instrument('keywords', count=lambda result: sum(map(len, result)))
+    def top_k(self, idf, k=20, sublinear=False):
+        """
+        对所有文档同时取权重最高的前K个词
+        :param idf: 与 vocab 对应的 IDF 数组
+        :param k: 每篇文档的关键词数
+        :param sublinear: 使用 1 + ln(tf) 抑制高频词
+        :return: 每篇文档的 [(词, 权重)] 列表，按权重降序
+        """
+        scores = self.tfidf(idf, sublinear)
+        rows = self._rows()
+        # 同权重时按词在文档中首次出现的顺序
+        order = np.lexsort((np.arange(len(scores)), -scores, rows))
+        rank = np.arange(len(order)) - self.indptr[rows[order]]
+        keep = order[rank < k]
+        vocab = self.vocab
+        words = [vocab[i] for i in self.indices[keep].tolist()]
+        weights = scores[keep].tolist()
+        bounds = np.searchsorted(rows[keep], np.arange(len(self) + 1))
+        return [list(zip(words[start:stop], weights[start:stop]))
+                for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+
+
+# 关键词提取
+class KeywordExtractor:
+    """
+    以持久化的 IDF 索引为基础的 TF-IDF 关键词提取
+    - 处理过的文档登记到索引中，IDF 随文档集合逐步积累
+    - 索引只有少量文档时 IDF 区分度有限，排序主要取决于停用词过滤后的词频
+    """
+
+    def __init__(self, index_path=DEFAULT_IDF_PATH, stop_words=STOP_WORDS, min_chars=2):
+        """
+        :param index_path: IDF 索引文件路径，为 None 时只在内存中使用
+        :param stop_words: 停用词集合
+        :param min_chars: 关键词的最少字符数
+        """
+        self.index_path = index_path
+        self.stop_words = stop_words
+        self.min_chars = min_chars
+        self._index = None
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = IDFIndex.open(self.index_path) if self.index_path else IDFIndex()
+        return self._index
+
+    def candidate(self, word):
+        return is_candidate(word, self.stop_words, self.min_chars)
+
+    def add_documents(self, documents, save=True):
+        """
+        把文档登记到 IDF 索引
+        :param documents: (文档标识, 词频) 可迭代对象
+        :param save: 登记后写回索引文件
+        :return: 登记的文档数
+        """
+        index = self.index
+        n = 0
+        for doc_id, counts in documents:
+            words = counts.keys() if hasattr(counts, 'keys') else (word for word, _ in counts)
+            index.add_document(doc_id, [word for word in words if self.candidate(word)])
+            n += 1
+        if save and self.index_path:
+            index.save(self.index_path)
+        return n
+
+    def extract_many(self, counts_list, top_k=20, doc_ids=None, learn=False, sublinear=False):
+        """
+        批量提取关键词
+        :param counts_list: 各文档的词频（count_word_frequency 的结果）
+        :param top_k: 每篇文档的关键词数
+        :param doc_ids: 各文档的标识，learn 为 True 时必须提供
+        :param learn: 先把这些文档登记到 IDF 索引
+        :param sublinear: 使用 1 + ln(tf) 抑制高频词
+        :return: 每篇文档的 [(词, 权重)] 列表
+        """
+        counts_list = list(counts_list)
+        if learn:
+            self.add_documents(zip(doc_ids, counts_list))
+        matrix = DocumentTermMatrix.from_counts(counts_list, doc_ids, self.candidate)
+        return matrix.top_k(self.index.idf(matrix.vocab), top_k, sublinear)
+
+    def extract(self, counts, top_k=20, doc_id=None, learn=True, sublinear=False):
+        """
+        提取一篇文档的关键词
+        :param counts: 词频 Counter
+        :param top_k: 关键词数
+        :param doc_id: 文档标识；提供且 learn 为 True 时把该文档登记到索引
+        :param learn: 是否登记到索引
+        :param sublinear: 使用 1 + ln(tf) 抑制高频词
+        :return: [(词, 权重)]，按权重降序
+        """
+        learn = learn and doc_id is not None
+        return self.extract_many([counts], top_k, [doc_id], learn, sublinear)[0]
@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from 文本处理 import segment_text, count_word_frequency, pos_tagging, analyze_text, init_worker
+from 实体提取 import get_dict_matcher
+from 词典管理 import ensure_user_dict
+
+
+# 只允许监听本机地址
+LOCAL_HOSTS = ('127.0.0.1', 'localhost', '::1')
+
+OPERATIONS = ('segment', 'pos', 'frequency', 'entities')
+
+_HTTP_STATUS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    413: 'Payload Too Large', 500: 'Internal Server Error',
+    503: 'Service Unavailable', 504: 'Gateway Timeout',
+}
+
+# 工作进程中的武器词典路径
+_weapon_dict = None
+
+
+def _init_service_worker(user_dict, weapon_dict):
+    """工作进程初始化：常驻加载 jieba、自定义词典和武器词典"""
+    global _weapon_dict
+    init_worker(user_dict)
+    if weapon_dict and os.path.exists(weapon_dict):
+        ensure_user_dict(weapon_dict)
+        get_dict_matcher(weapon_dict, 'weapon')
+        _weapon_dict = weapon_dict
+    import jieba.posseg
+    jieba.posseg.lcut('预热')
+
+
+def run_operation(op, text, params):
+    """
+    执行单个分析请求（在工作进程中运行）
+    :param op: 分析类型
+    :param text: 文本内容
+    :param params: 请求参数
+    :return: 可 JSON 序列化的结果
+    """
+    if op == 'segment':
+        return segment_text(text)
+    if op == 'pos':
+        return [(word, pos) for word, pos in pos_tagging(text)]
+    if op == 'frequency':
+        return count_word_frequency(segment_text(text), top_n=params.get('top_n') or 50)
+    if op == 'entities':
+        top_n = params.get('top_n')
+        analysis = analyze_text(text, keep_tokens=False)
+        result = {
+            'names': analysis.name_counts.most_common(top_n),
+            'locations': analysis.location_counts.most_common(top_n),
+        }
+        if _weapon_dict:
+            weapons = get_dict_matcher(_weapon_dict, 'weapon').count(text).get('weapon')
+            result['weapons'] = weapons.most_common(top_n) if weapons else []
+        return result
+    raise ValueError(f"未知的分析类型: {op}")
+
+
+def run_batch(jobs):
+    """
+    在工作进程中依次执行一批请求，单个请求出错不影响同批其他请求
+    :param jobs: [(分析类型, 文本, 参数)]
+    :return: [(是否成功, 结果或错误信息)]
+    """
+    results = []
+    for op, text, params in jobs:
+        try:
+            results.append((True, run_operation(op, text, params)))
+        except Exception as e:
+            results.append((False, str(e)))
+    return results
+
+
+class ServiceBusy(Exception):
+    """等待队列已满"""
+
+
+# 请求微批处理
+class BatchDispatcher:
+    """
+    把并发到达的请求合并成小批次提交到进程池
+    - 等待队列有上限，队列满时立即拒绝（背压）
+    - 同时在途的批次数不超过工作进程数
+    """
+
+    def __init__(self, executor, workers, max_batch=32, max_delay=0.005, max_pending=1000):
+        """
+        :param executor: 进程池
+        :param workers: 工作进程数
+        :param max_batch: 每批最多请求数
+        :param max_delay: 凑批的最长等待时间（秒）
+        :param max_pending: 等待队列上限
+        """
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = asyncio.Queue(max_pending)
+        self._slots = asyncio.Semaphore(workers)
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def submit(self, op, text, params, timeout=None):
+        """
+        提交请求并等待结果
+        :param op: 分析类型
+        :param text: 文本内容
+        :param params: 请求参数
+        :param timeout: 超时秒数
+        :return: 分析结果
+        """
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((op, text, params, future))
+        except asyncio.QueueFull:
+            raise ServiceBusy()
+        # 超时后 future 被取消，尚未执行的请求会在凑批时被丢弃
+        return await asyncio.wait_for(future, timeout)
+
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            batch = [job for job in batch if not job[3].done()]
+            if not batch:
+                continue
+            await self._slots.acquire()
+            loop.create_task(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self.executor, run_batch, [(op, text, params) for op, text, params, _ in batch])
+        except Exception as e:
+            results = [(False, str(e))] * len(batch)
+        finally:
+            self._slots.release()
+        for (_, _, _, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(ValueError(value))
+
+
+# 本地分析服务
+class AnalysisService:
+    """
+    常驻的本地 HTTP 分析服务，保持 jieba 和词典在工作进程中预热
+    POST /segment、/pos、/frequency、/entities，请求体为 JSON: {"text": "...", "top_n": 20}
+    GET /health 返回服务状态
+    """
+
+    def __init__(self, workers=None, user_dict=None, weapon_dict=None, timeout=30.0,
+                 max_batch=32, max_delay=0.005, max_pending=1000, max_body=16 << 20):
+        """
+        :param workers: 工作进程数
+        :param user_dict: 自定义词典路径
+        :param weapon_dict: 武器词典路径
+        :param timeout: 单个请求的超时秒数
+        :param max_batch: 每批最多请求数
+        :param max_delay: 凑批的最长等待时间（秒）
+        :param max_pending: 等待队列上限
+        :param max_body: 请求体大小上限（字节）
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.user_dict = user_dict
+        self.weapon_dict = weapon_dict
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.executor = None
+        self.dispatcher = None
+
+    async def start(self, host='127.0.0.1', port=8765, unix_path=None):
+        """
+        启动服务
+        :param host: 监听地址，只允许本机地址
+        :param port: 监听端口
+        :param unix_path: Unix 套接字路径，给出时忽略 host/port
+        :return: asyncio.Server
+        """
+        if unix_path is None and host not in LOCAL_HOSTS:
+            raise ValueError(f"服务只能监听本机地址: {host}")
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_service_worker,
+            initargs=(self.user_dict, self.weapon_dict)
+        )
+        # 预先启动全部工作进程，第一个请求不必等待初始化
+        await asyncio.gather(*[
+            asyncio.get_running_loop().run_in_executor(self.executor, run_batch, [])
+            for _ in range(self.workers)
+        ])
+        self.dispatcher = BatchDispatcher(self.executor, self.workers, self.max_batch,
+                                          self.max_delay, self.max_pending)
+        self.dispatcher.start()
+        if unix_path:
+            return await asyncio.start_unix_server(self._handle, path=unix_path)
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def close(self):
+        if self.dispatcher:
+            await self.dispatcher.stop()
+        if self.executor:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await _read_request(reader, self.max_body)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._route(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                _write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except ValueError as e:
+            _write_response(writer, 413 if 'too large' in str(e) else 400, {'error': str(e)}, False)
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body):
+        op = path.strip('/').split('?')[0]
+        if op == 'health':
+            return 200, {'status': 'ok', 'workers': self.workers}
+        if op not in OPERATIONS:
+            return 404, {'error': f"未知的接口: {path}"}
+        if method != 'POST':
+            return 405, {'error': "请使用 POST"}
+        try:
+            params = json.loads(body.decode('utf-8') or '{}')
+            text = params.pop('text')
+        except (ValueError, KeyError, AttributeError):
+            return 400, {'error': "请求体应为包含 text 字段的 JSON"}
+
+        start = time.perf_counter()
+        try:
+            result = await self.dispatcher.submit(op, text, params, self.timeout)
+        except ServiceBusy:
+            return 503, {'error': "服务繁忙，请稍后重试"}
+        except asyncio.TimeoutError:
+            return 504, {'error': "请求超时"}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+        return 200, {'result': result, 'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)}
+
+
+async def _read_request(reader, max_body):
+    """
+    读取一个 HTTP/1.1 请求
+    :return: (方法, 路径, 头部字典, 请求体)，连接关闭时返回 None
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, _ = line.decode('latin-1').split(' ', 2)
+    except ValueError:
+        raise ValueError("bad request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get('content-length', 0))
+    if length > max_body:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), path, headers, body
+
+
+def _write_response(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    head = (
+        f"HTTP/1.1 {status} {_HTTP_STATUS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode('latin-1') + body)
+
+
+async def serve(args):
+    service = AnalysisService(args.workers, args.user_dict, args.weapon_dict, args.timeout,
+                              args.max_batch, args.max_delay_ms / 1000, args.max_pending)
+    server = await service.start(args.host, args.port, args.unix)
+    address = args.unix or f"http://{args.host}:{args.port}"
+    print(f"分析服务已启动: {address}（{service.workers} 个工作进程）", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="常驻的本地中文文本分析服务")
+    parser.add_argument('--host', default='127.0.0.1', help="监听地址（仅限本机）")
+    parser.add_argument('--port', type=int, default=8765, help="监听端口")
+    parser.add_argument('--unix', default=None, help="改为监听 Unix 套接字")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="工作进程数，默认为CPU核数")
+    parser.add_argument('--user-dict', default=None, help="自定义词典路径")
+    parser.add_argument('--weapon-dict', default='weapon_dict.txt', help="武器词典路径")
+    parser.add_argument('--timeout', type=float, default=30.0, help="单个请求的超时秒数")
+    parser.add_argument('--max-batch', type=int, default=32, help="每批最多请求数")
+    parser.add_argument('--max-delay-ms', type=float, default=5.0, help="凑批的最长等待毫秒数")
+    parser.add_argument('--max-pending', type=int, default=1000, help="等待队列上限，超出时返回 503")
+    args = parser.parse_args(argv)
+    if args.host not in LOCAL_HOSTS:
+        parser.error(f"服务只能监听本机地址: {args.host}")
+    if not os.path.exists(args.weapon_dict):
+        args.weapon_dict = None
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from 性能监控 import instrument
+
+
+# 关系图默认最多绘制的节点数
+MAX_GRAPH_NODES = 300
+
+# 超过该节点数时使用分层布局，须小于 MAX_GRAPH_NODES，否则默认参数下不会用到
+LARGE_GRAPH_NODES = 200
+
+
+# 柱状图可视化
+@instrument('bar_chart', output_file='output_file', count=None)
+def visualize_bar_chart(data, title, xlabel, ylabel, output_file=None):
+    """
+    生成柱状图
+    :param data: 数据字典 {标签: 值}
+    :param title: 图表标题
+    :param xlabel: x轴标签
+    :param ylabel: y轴标签
+    :param output_file: 输出文件路径
+    """
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 8))
+    plt.bar(data.keys(), data.values())
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+
+    if output_file:
+        plt.savefig(output_file)
+    plt.show()
+
+
+# 词云可视化
+@instrument('wordcloud', output_file='output_file', count=None)
+def generate_wordcloud(word_freq, output_file=None, background_color='white'):
+    """
+    生成词云
+    :param word_freq: 词频字典 {词: 频率}
+    :param output_file: 输出文件路径
+    :param background_color: 背景颜色
+    """
+    import matplotlib.pyplot as plt
+
+    # 使用中文字体渲染，结果按词频表缓存
+    wordcloud = render_wordcloud(word_freq, (800, 600), background_color)
+
+    plt.figure(figsize=(10, 8))
+    plt.imshow(wordcloud, interpolation='bilinear')
+    plt.axis('off')
+
+    if output_file:
+        plt.savefig(output_file)
+    plt.show()
+
+
+# 关系图可视化
+@instrument('relationship_graph', output_file='output_file', count=None)
+def visualize_relationship_graph(relationships, output_file=None, min_weight=None, k_core=None,
+                                 max_nodes=MAX_GRAPH_NODES):
+    """
+    生成关系图
+    :param relationships: 关系列表 [(实体1, 实体2, 权重)]
+    :param output_file: 输出文件路径
+    :param min_weight: 删除权重低于该值的边
+    :param k_core: 只保留 k-core
+    :param max_nodes: 最多绘制的节点数（按加权度保留）
+    """
+    import matplotlib.pyplot as plt
+    import networkx as nx
+
+    G = nx.Graph()
+
+    # 添加节点和边
+    for source, target, weight in relationships:
+        G.add_edge(source, target, weight=weight)
+
+    # 布局前裁剪，保证大图可读且布局可在合理时间内完成
+    G = reduce_graph(G, min_weight, k_core, max_nodes)
+
+    # 计算节点大小，基于度中心性
+    degree = dict(nx.degree(G))
+    node_size = [degree[n] * 20 for n in G]
+
+    plt.figure(figsize=(12, 10))
+    pos = layout_cache.layout(G, seed=42)
+    nx.draw_networkx_nodes(G, pos, node_size=node_size, node_color='skyblue')
+    nx.draw_networkx_edges(G, pos, width=1, alpha=0.5)
+    nx.draw_networkx_labels(G, pos, font_size=10, font_family='SimHei')
+    plt.axis('off')
+
+    if output_file:
+        plt.savefig(output_file)
+    plt.show()
+
+
+# 关系图裁剪
+def reduce_graph(G, min_weight=None, k_core=None, max_nodes=None):
+    """
+    在布局前裁剪关系图
+    :param G: networkx 图
+    :param min_weight: 删除权重低于该值的边
+    :param k_core: 只保留 k-core（每个节点至少有 k 个邻居）
+    :param max_nodes: 只保留加权度最高的前N个节点
+    :return: 裁剪后的新图
+    """
+    import networkx as nx
+
+    H = G.copy()
+    if min_weight is not None:
+        H.remove_edges_from([(u, v) for u, v, w in H.edges(data='weight', default=1) if w < min_weight])
+    if k_core:
+        H.remove_edges_from(nx.selfloop_edges(H))
+        H = nx.k_core(H, k_core).copy()
+    if max_nodes and H.number_of_nodes() > max_nodes:
+        strength = dict(H.degree(weight='weight'))
+        top = sorted(strength, key=strength.get, reverse=True)[:max_nodes]
+        H = H.subgraph(top).copy()
+    H.remove_nodes_from([n for n, d in list(H.degree()) if d == 0])
+    return H
+
+
+def graph_signature(G):
+    """
+    计算图结构指纹（节点与带权边），用作布局缓存键
+    :param G: networkx 图
+    :return: 十六进制指纹字符串
+    """
+    digest = hashlib.sha1()
+    for node in sorted(map(str, G.nodes())):
+        digest.update(node.encode('utf-8') + b'\0')
+    edges = sorted(tuple(sorted((str(u), str(v)))) + (w,) for u, v, w in G.edges(data='weight', default=1))
+    digest.update(repr(edges).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def fast_force_layout(G, pos=None, iterations=50, seed=42, grid_size=16, block=4096):
+    """
+    向量化的近似力导向布局（Fruchterman-Reingold）
+    斥力按网格近似：每个节点只与各非空网格的质心作用，单次迭代 O(节点数 * 网格数)；
+    引力沿边计算。适用于 spring_layout 过慢的大图
+    :param G: networkx 图
+    :param pos: 初始位置字典，缺失的节点随机放置
+    :param iterations: 迭代次数
+    :param seed: 随机种子
+    :param grid_size: 每个方向上的网格数
+    :param block: 计算斥力时每批处理的节点数，限制临时数组大小
+    :return: 节点位置字典，坐标范围 [-1, 1]
+    """
+    nodes = list(G)
+    n = len(nodes)
+    if n == 0:
+        return {}
+    index = {node: i for i, node in enumerate(nodes)}
+    rng = np.random.default_rng(seed)
+    X = rng.uniform(-1, 1, (n, 2))
+    if pos:
+        for node, p in pos.items():
+            if node in index:
+                X[index[node]] = p
+    edge_list = [(index[u], index[v], w) for u, v, w in G.edges(data='weight', default=1) if u != v]
+    edges = np.array([(u, v) for u, v, _ in edge_list], dtype=np.intp).reshape(-1, 2)
+    weights = np.array([w for _, _, w in edge_list], dtype=float)
+
+    k = 2 / np.sqrt(n)
+    temperature = 0.2
+    cooling = temperature / (iterations + 1)
+    cells = grid_size * grid_size
+    for _ in range(iterations):
+        lo = X.min(axis=0)
+        span = X.max(axis=0) - lo + 1e-9
+        cell = np.minimum(((X - lo) / span * grid_size).astype(np.intp), grid_size - 1)
+        cell_id = cell[:, 0] * grid_size + cell[:, 1]
+        mass = np.bincount(cell_id, minlength=cells)
+        occupied = mass > 0
+        centers = np.stack([np.bincount(cell_id, X[:, 0], cells),
+                            np.bincount(cell_id, X[:, 1], cells)], axis=1)[occupied]
+        mass = mass[occupied]
+        centers /= mass[:, None]
+
+        disp = np.empty_like(X)
+        for start in range(0, n, block):
+            delta = X[start:start + block, None, :] - centers[None, :, :]
+            dist2 = np.maximum((delta ** 2).sum(axis=2), 1e-4)
+            disp[start:start + block] = (k * k * mass[None, :, None] * delta / dist2[..., None]).sum(axis=1)
+
+        if len(edges):
+            delta = X[edges[:, 0]] - X[edges[:, 1]]
+            dist = np.sqrt((delta ** 2).sum(axis=1))
+            force = delta * (dist * weights / k)[:, None]
+            np.add.at(disp, edges[:, 0], -force)
+            np.add.at(disp, edges[:, 1], force)
+
+        length = np.maximum(np.sqrt((disp ** 2).sum(axis=1)), 1e-9)
+        X += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    X -= X.mean(axis=0)
+    X /= max(np.abs(X).max(), 1e-9)
+    return dict(zip(nodes, X))
+
+
+def hierarchical_layout(G, seed=42, core_nodes=100, iterations=30):
+    """
+    大图分层布局：先对加权度最高的核心节点做完整的力导向布局，
+    其余节点放在已定位邻居的重心附近，最后用近似力导向布局对整图做少量迭代微调
+    :param G: networkx 图
+    :param seed: 随机种子
+    :param core_nodes: 核心节点数
+    :param iterations: 整图微调的迭代次数
+    :return: 节点位置字典
+    """
+    import networkx as nx
+
+    rng = np.random.default_rng(seed)
+    strength = dict(G.degree(weight='weight'))
+    order = sorted(G, key=strength.get, reverse=True)
+    core = G.subgraph(order[:core_nodes])
+    pos = nx.spring_layout(core, seed=seed)
+    for node in order[core_nodes:]:
+        placed = [pos[n] for n in G[node] if n in pos]
+        if placed:
+            center = np.mean(placed, axis=0)
+        else:
+            center = rng.uniform(-1, 1, 2)
+        pos[node] = center + rng.normal(0, 0.05, 2)
+    return fast_force_layout(G, pos=pos, iterations=iterations, seed=seed)
+
+
+class GraphLayoutCache:
+    """
+    关系图布局缓存
+    - 图结构不变时直接返回上次的位置
+    - 图结构有小的改动时，以上次的位置作为初始值，只做少量迭代
+    """
+
+    def __init__(self, max_entries=16, refine_iterations=15):
+        """
+        :param max_entries: 最多缓存的布局个数
+        :param refine_iterations: 增量布局时的迭代次数
+        """
+        self.max_entries = max_entries
+        self.refine_iterations = refine_iterations
+        self._layouts = OrderedDict()
+        self._last_pos = {}
+        # 界面的多个后台任务可能同时绘图
+        self._lock = threading.Lock()
+
+    def layout(self, G, seed=42):
+        """
+        计算或复用图布局
+        :param G: networkx 图
+        :param seed: 随机种子
+        :return: 节点位置字典
+        """
+        import networkx as nx
+
+        key = graph_signature(G)
+        with self._lock:
+            return self._layout(G, key, seed, nx)
+
+    def _layout(self, G, key, seed, nx):
+        pos = self._layouts.get(key)
+        if pos is not None:
+            self._layouts.move_to_end(key)
+        else:
+            initial = {n: self._last_pos[n] for n in G if n in self._last_pos}
+            if initial and len(initial) >= 0.5 * len(G):
+                if len(G) > LARGE_GRAPH_NODES:
+                    pos = fast_force_layout(G, pos=initial, iterations=self.refine_iterations, seed=seed)
+                else:
+                    pos = nx.spring_layout(G, pos=initial, iterations=self.refine_iterations, seed=seed)
+            elif len(G) > LARGE_GRAPH_NODES:
+                pos = hierarchical_layout(G, seed=seed)
+            else:
+                pos = nx.spring_layout(G, seed=seed)
+            self._layouts[key] = pos
+            if len(self._layouts) > self.max_entries:
+                self._layouts.popitem(last=False)
+        self._last_pos = pos
+        return pos
+
+    def clear(self):
+        """清空缓存的布局"""
+        with self._lock:
+            self._layouts.clear()
+            self._last_pos = {}
+
+
+# 全局布局缓存，重复绘制同一关系图时复用
+layout_cache = GraphLayoutCache()
+
+
+# 词云渲染缓存：相同词频表和渲染参数直接返回已生成的图像
+_wordcloud_cache = OrderedDict()
+_wordcloud_cache_size = 8
+_wordcloud_objects = OrderedDict()
+_wordcloud_objects_size = 4
+_mask_cache = {}
+_wordcloud_lock = threading.Lock()
+
+
+def freq_fingerprint(word_freq):
+    """
+    计算词频表指纹
+    :param word_freq: 词频字典 {词: 频率}
+    :return: 十六进制指纹字符串
+    """
+    items = sorted(word_freq.items(), key=lambda x: (-x[1], x[0]))
+    return hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+
+
+def load_mask(mask_path):
+    """
+    读取并缓存词云形状遮罩
+    :param mask_path: 遮罩图片路径
+    :return: numpy 数组
+    """
+    mask = _mask_cache.get(mask_path)
+    if mask is None:
+        from PIL import Image
+        mask = _mask_cache[mask_path] = np.array(Image.open(mask_path))
+    return mask
+
+
+@instrument('wordcloud_render', count=None)
+def render_wordcloud(word_freq, size=(800, 600), background_color='white',
+                     font_path='simhei.ttf', mask_path=None, max_words=200):
+    """
+    直接在内存中按目标尺寸渲染词云，不经过 matplotlib 和临时文件
+    :param word_freq: 词频字典 {词: 频率}
+    :param size: 输出图像尺寸 (宽, 高)
+    :param background_color: 背景颜色
+    :param font_path: 中文字体路径
+    :param mask_path: 形状遮罩图片路径
+    :param max_words: 最多显示的词数
+    :return: PIL.Image
+    """
+    from wordcloud import WordCloud
+
+    params = (tuple(size), background_color, font_path, mask_path, max_words)
+    key = (freq_fingerprint(word_freq),) + params
+    # WordCloud 对象在渲染时会修改自身状态，多个线程需串行使用
+    with _wordcloud_lock:
+        image = _wordcloud_cache.get(key)
+        if image is not None:
+            _wordcloud_cache.move_to_end(key)
+            return image
+
+        # 相同参数复用同一个 WordCloud 对象及其遮罩；参数含窗口尺寸，只保留最近使用的几个
+        wordcloud = _wordcloud_objects.get(params)
+        if wordcloud is not None:
+            _wordcloud_objects.move_to_end(params)
+        else:
+            wordcloud = _wordcloud_objects[params] = WordCloud(
+                font_path=font_path,
+                background_color=background_color,
+                width=size[0],
+                height=size[1],
+                mask=load_mask(mask_path) if mask_path else None,
+                max_words=max_words
+            )
+            if len(_wordcloud_objects) > _wordcloud_objects_size:
+                _wordcloud_objects.popitem(last=False)
+        image = wordcloud.generate_from_frequencies(word_freq).to_image()
+
+        _wordcloud_cache[key] = image
+        if len(_wordcloud_cache) > _wordcloud_cache_size:
+            _wordcloud_cache.popitem(last=False)
+        return image
@@ -0,0 +1,322 @@
+import hashlib
+import re
+import zlib
+from array import array
+from collections import Counter
+from itertools import accumulate
+
+import numpy as np
+
+from 文本处理 import SENTENCE_DELIMITERS, POS_TAGS, AnalysisResult, TokenCorpus, stream_pos_tagging
+from 性能监控 import instrument
+
+
+# 段落（含换行符）
+_PARAGRAPH = re.compile(r'[^\n]*\n|[^\n]+')
+
+# 句子（含句末标点）
+_SENTENCE = re.compile(f'[^{SENTENCE_DELIMITERS}]*[{SENTENCE_DELIMITERS}]+|[^{SENTENCE_DELIMITERS}]+')
+
+
+# 按段落切分文档
+def split_blocks(text, max_block=1 << 12):
+    """
+    将文档切分为段落块，块拼接后与原文完全一致
+    超长段落按句子再切分，切分点由句子内容决定，编辑只影响所在的句子组
+    :param text: 文本内容
+    :param max_block: 段落超过该字符数时按句子切分
+    :return: 文本块列表
+    """
+    blocks = []
+    for paragraph in _PARAGRAPH.findall(text):
+        if len(paragraph) <= max_block:
+            blocks.append(paragraph)
+            continue
+        start = 0
+        for match in _SENTENCE.finditer(paragraph):
+            end = match.end()
+            # 平均约 8 个句子切一次；切分与否只取决于句子本身，不受前文长度影响
+            if zlib.crc32(match.group().encode('utf-8')) & 7 == 0 or end - start >= max_block * 4:
+                blocks.append(paragraph[start:end])
+                start = end
+        if start < len(paragraph):
+            blocks.append(paragraph[start:])
+    return blocks
+
+
+def iter_blocks(chunks, max_block=1 << 12):
+    """
+    对字符串或文本块序列逐块切分段落，结果与对拼接后的全文调用 split_blocks 相同
+    跨越文本块边界的段落先缓存，遇到换行后再切分，只有未处理的段落留在内存中
+    :param chunks: 文本内容，或文本块可迭代对象（如 iter_file_chunks 的结果）
+    :param max_block: 段落超过该字符数时按句子切分
+    :return: 文本块生成器
+    """
+    if isinstance(chunks, str):
+        yield from split_blocks(chunks, max_block)
+        return
+    carry = ''
+    for chunk in chunks:
+        buffer = carry + chunk
+        cut = buffer.rfind('\n') + 1
+        if cut:
+            yield from split_blocks(buffer[:cut], max_block)
+        carry = buffer[cut:]
+    if carry:
+        yield from split_blocks(carry, max_block)
+
+
+def block_fingerprint(block):
+    """
+    计算文本块的内容指纹
+    :param block: 文本块
+    :return: SHA-1 摘要（bytes）
+    """
+    return hashlib.sha1(block.encode('utf-8')).digest()
+
+
+# 增量分析
+class IncrementalAnalyzer:
+    """
+    以段落块为单位缓存词性标注结果
+    文档更新时只对新增或修改过的块重新分词和标注，
+    词频和人名/地名/武器统计减去消失块的计数、加上新块的计数
+    """
+
+    def __init__(self, weapons=None, max_block=1 << 12):
+        """
+        :param weapons: 武器名集合
+        :param max_block: 段落超过该字符数时按句子切分
+        """
+        self.weapons = frozenset(weapons or ())
+        self.max_block = max_block
+        self.vocab = []
+        self.tags = list(POS_TAGS)
+        self._word_index = {}
+        self._tag_index = {tag: i for i, tag in enumerate(POS_TAGS)}
+        self._blocks = {}        # 指纹 -> (词ID数组, 词性ID数组)
+        self._order = []         # 当前文档中各块的指纹
+        self.word_freq = Counter()
+        self.name_counts = Counter()
+        self.location_counts = Counter()
+        self.weapon_counts = Counter()
+        self._corpus = None
+
+    def __len__(self):
+        return len(self._order)
+
+    def _encode(self, words_pos):
+        """将标注结果编码为词ID数组和词性ID数组"""
+        word_index = self._word_index
+        tag_index = self._tag_index
+        ids = array('i')
+        pos_ids = array('B')
+        for word, tag in words_pos:
+            word_id = word_index.get(word)
+            if word_id is None:
+                word_id = word_index[word] = len(self.vocab)
+                self.vocab.append(word)
+            tag_id = tag_index.get(tag)
+            if tag_id is None:
+                if len(self.tags) > 0xFF:
+                    raise ValueError("词性种类超过 256 个，无法按 uint8 存储")
+                tag_id = tag_index[tag] = len(self.tags)
+                self.tags.append(tag)
+            ids.append(word_id)
+            pos_ids.append(tag_id)
+        return np.frombuffer(ids, dtype=np.int32), np.frombuffer(pos_ids, dtype=np.uint8)
+
+    def _split_tagged(self, lengths, words_pos, progress=None):
+        """
+        按各块的字符长度把连续的标注结果切回每个块
+        :param lengths: 各块的字符数
+        :param progress: 进度回调 progress(已完成字符数, 总字符数)，每完成一块调用一次
+        :return: 每块的 (词ID数组, 词性ID数组)，有词跨越块边界时返回 None
+        """
+        total = sum(lengths)
+        bounds = accumulate(lengths)
+        bound = next(bounds, None)
+        results = []
+        block = []
+        offset = 0
+        for word, tag in words_pos:
+            if bound is None:
+                return None
+            block.append((word, tag))
+            offset += len(word)
+            if offset >= bound:
+                if offset > bound:
+                    return None
+                results.append(self._encode(block))
+                block = []
+                if progress is not None:
+                    progress(offset, total)
+                bound = next(bounds, None)
+        if bound is not None:
+            return None
+        return results
+
+    def _tag_blocks(self, texts, segmenter=None, progress=None):
+        """对一组文本块做词性标注，每块的结果互相独立"""
+        if segmenter is not None:
+            words_pos = segmenter.iter_pos_tagging(texts)
+        else:
+            words_pos = stream_pos_tagging(texts)
+        results = self._split_tagged([len(text) for text in texts], words_pos, progress)
+        if results is None:
+            # 并行分片强制切断了没有边界的超长文本，退回逐块标注
+            results = []
+            total = sum(len(text) for text in texts)
+            done = 0
+            for text in texts:
+                results.append(self._encode(stream_pos_tagging(text)))
+                done += len(text)
+                if progress is not None:
+                    progress(done, total)
+        return results
+
+    def _entity_filters(self):
+        """各统计项及其在语料上的筛选条件"""
+        tag_ids = lambda tag: [self._tag_index[tag]] if tag in self._tag_index else []
+        weapon_ids = [self._word_index[w] for w in self.weapons if w in self._word_index]
+        return [
+            (self.word_freq, None, None),
+            (self.name_counts, 'pos', tag_ids('nr')),
+            (self.location_counts, 'pos', tag_ids('ns')),
+            (self.weapon_counts, 'ids', weapon_ids),
+        ]
+
+    def _bincount(self, blocks, field, values):
+        size = len(self.vocab)
+        if not blocks:
+            return np.zeros(size, dtype=np.int64)
+        ids = np.concatenate([block[0] for block in blocks])
+        if field == 'pos':
+            ids = ids[np.isin(np.concatenate([block[1] for block in blocks]), values)]
+        elif field == 'ids':
+            ids = ids[np.isin(ids, values)]
+        return np.bincount(ids, minlength=size)
+
+    def _apply(self, added, removed):
+        """
+        把块的增减反映到各计数器上
+        :param added: 新增块列表（同一块出现多次时重复列出）
+        :param removed: 移除块列表
+        """
+        vocab = self.vocab
+        for counter, field, values in self._entity_filters():
+            if field is not None and not values:
+                continue
+            delta = self._bincount(added, field, values) - self._bincount(removed, field, values)
+            for word_id in np.flatnonzero(delta).tolist():
+                word = vocab[word_id]
+                count = counter[word] + int(delta[word_id])
+                if count > 0:
+                    counter[word] = count
+                else:
+                    del counter[word]
+
+    def _commit(self, keys, texts_by_key, results):
+        """登记新块的标注结果，并按新旧块序列的差异更新计数"""
+        for key, result in zip(texts_by_key, results):
+            self._blocks[key] = result
+        old = Counter(self._order)
+        new = Counter(keys)
+        added = [self._blocks[key] for key, n in (new - old).items() for _ in range(n)]
+        removed = [self._blocks[key] for key, n in (old - new).items() for _ in range(n)]
+        self._apply(added, removed)
+        for key in old.keys() - new.keys():
+            del self._blocks[key]
+        self._order = keys
+        self._corpus = None
+
+    @instrument('incremental_update', text_arg='text', count=None)
+    def update(self, text, segmenter=None, parallel_min_chars=0, progress=None):
+        """
+        分析新版本的文档，只处理发生变化的块
+        :param text: 文本内容，或文本块可迭代对象（如 iter_file_chunks 的结果），只有变化的块会保留在内存中
+        :param segmenter: 可选的 ParallelSegmenter，变化量较大时用于并行标注
+        :param parallel_min_chars: 变化的字符数达到该值时才使用 segmenter
+        :param progress: 进度回调 progress(已完成字符数, 总字符数)；回调抛出异常时中止，已有状态保持不变
+        :return: (重新标注的块数, 总块数)
+        """
+        keys = []
+        pending = {}
+        for block in iter_blocks(text, self.max_block):
+            key = block_fingerprint(block)
+            keys.append(key)
+            if key not in self._blocks and key not in pending:
+                pending[key] = block
+        if pending:
+            texts = list(pending.values())
+            if segmenter is not None and sum(map(len, texts)) < parallel_min_chars:
+                segmenter = None
+            results = self._tag_blocks(texts, segmenter, progress)
+        else:
+            results = []
+        self._commit(keys, pending, results)
+        return len(pending), len(keys)
+
+    def load(self, text, words_pos):
+        """
+        用已有的整篇标注结果（如结果缓存）初始化各块，不重新标注
+        :param text: 文本内容，或文本块可迭代对象
+        :param words_pos: 与 text 对应的标注结果 [(词, 词性)]
+        """
+        keys = []
+        lengths = []
+        for block in iter_blocks(text, self.max_block):
+            keys.append(block_fingerprint(block))
+            lengths.append(len(block))
+        results = self._split_tagged(lengths, words_pos)
+        if results is None:
+            raise ValueError("标注结果与文本不一致")
+        self._blocks = {}
+        self._order = []
+        for counter in (self.word_freq, self.name_counts, self.location_counts, self.weapon_counts):
+            counter.clear()
+        unique = {}
+        for key, result in zip(keys, results):
+            unique.setdefault(key, result)
+        self._commit(keys, unique, list(unique.values()))
+
+    def load_corpus(self, corpus, words_per_chunk=1 << 14):
+        """
+        用已有的 TokenCorpus（如结果缓存）初始化各块，原文由词语拼接得到，不需要再读取文件
+        :param corpus: 带词性的 TokenCorpus
+        :param words_per_chunk: 每次拼接的词数
+        """
+        words = corpus.words
+        chunks = (''.join(words[start:start + words_per_chunk])
+                  for start in range(0, len(words), words_per_chunk))
+        self.load(chunks, corpus.words_pos)
+
+    @property
+    def corpus(self):
+        """当前文档的 TokenCorpus，按块顺序拼接，文档未变时复用"""
+        if self._corpus is None:
+            blocks = [self._blocks[key] for key in self._order]
+            if blocks:
+                ids = np.concatenate([block[0] for block in blocks])
+                pos_ids = np.concatenate([block[1] for block in blocks])
+            else:
+                ids = np.zeros(0, dtype=np.int32)
+                pos_ids = np.zeros(0, dtype=np.uint8)
+            self._corpus = TokenCorpus(list(self.vocab), ids, list(self.tags), pos_ids)
+        return self._corpus
+
+    def result(self):
+        """
+        当前文档的分析结果
+        :return: AnalysisResult，计数器为当前统计的副本
+        """
+        corpus = self.corpus
+        result = AnalysisResult()
+        result.corpus = corpus
+        result.words = corpus.words
+        result.words_pos = corpus.words_pos
+        result.word_freq = Counter(self.word_freq)
+        result.name_counts = Counter(self.name_counts)
+        result.location_counts = Counter(self.location_counts)
+        result.weapon_counts = Counter(self.weapon_counts)
+        return result
@@ -0,0 +1,572 @@
+import os
+from collections import Counter, deque
+
+import numpy as np
+
+from 文本处理 import TokenCorpus, _as_chunks
+from 词典管理 import load_dict_words
+from 性能监控 import instrument
+from 结果导出 import export_counts
+
+
+# 统计并保存人名
+@instrument('names', output_file='output_file', count=lambda counts: sum(counts.values()))
+def extract_and_save_names(words_pos, output_file, fmt=None):
+    """
+    提取并保存人名
+    :param words_pos: 词性标注结果，可以是 pos_tagging 返回的惰性生成器或 TokenCorpus
+    :param output_file: 输出文件路径
+    :param fmt: 导出格式 tsv/csv/parquet/arrow，默认由扩展名推断
+    :return: 人名词频字典
+    """
+    if isinstance(words_pos, TokenCorpus):
+        name_counts = words_pos.entity_counts('nr')
+    else:
+        name_counts = Counter(word for word, pos in words_pos if pos == 'nr')
+
+    export_counts(name_counts, output_file, fmt, column='name')
+
+    return name_counts
+
+
+# 统计并保存地名
+@instrument('locations', output_file='output_file', count=lambda counts: sum(counts.values()))
+def extract_and_save_locations(words_pos, output_file, fmt=None):
+    """
+    提取并保存地名
+    :param words_pos: 词性标注结果，可以是 pos_tagging 返回的惰性生成器或 TokenCorpus
+    :param output_file: 输出文件路径
+    :param fmt: 导出格式 tsv/csv/parquet/arrow，默认由扩展名推断
+    :return: 地名词频字典
+    """
+    if isinstance(words_pos, TokenCorpus):
+        location_counts = words_pos.entity_counts('ns')
+    else:
+        location_counts = Counter(word for word, pos in words_pos if pos == 'ns')
+
+    export_counts(location_counts, output_file, fmt, column='location')
+
+    return location_counts
+
+
+# 统计并保存武器名
+@instrument('weapons', text_arg='text', output_file='output_file', count=lambda counts: sum(counts.values()))
+def extract_and_save_weapons(text, weapon_dict, output_file, fmt=None):
+    """
+    提取并保存武器名
+    直接用武器词典编译的自动机扫描原文，不依赖分词结果
+    :param text: 文本内容，或文本块可迭代对象（如 iter_file_chunks 的结果）
+    :param weapon_dict: 武器词典路径
+    :param output_file: 输出文件路径
+    :param fmt: 导出格式 tsv/csv/parquet/arrow，默认由扩展名推断
+    :return: 武器词频字典
+    """
+    matcher = get_dict_matcher(weapon_dict, 'weapon')
+    weapon_counts = matcher.count(text).get('weapon', Counter())
+
+    # 保存结果
+    save_entity_counts(weapon_counts, output_file, fmt, column='weapon')
+
+    return weapon_counts
+
+
+# 快速实体识别：常见单姓与复姓
+SURNAMES = (
+    '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程'
+    '苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛'
+    '郝龚邵万钱严覃武戴莫孔向汤常温康施文牛樊葛邢安齐易乔伍庞颜倪庄聂章鲁岳翟殷詹申欧耿关兰'
+    '焦俞左柳甘祝包宁尚符舒阮柯纪梅童凌毕单季裴霍涂成苗谷盛曲翁冉骆蓝路游辛靳管柴蒙鲍华喻祁'
+    '蒲房滕屈饶解牟艾尤阳时穆农司卓古吉缪简车项连芦麦褚娄窦戚岑景党宫费卜冷晏席卫米柏宗瞿桂'
+    '全佟应臧闵苟邬边卞姬师和仇栾隋商刁沙荣巫寇桑郎甄丛仲虞敖巩明佘池查麻苑迟邝燕'
+)
+COMPOUND_SURNAMES = ('欧阳', '司马', '上官', '诸葛', '东方', '令狐', '慕容', '独孤', '公孙', '长孙',
+                     '皇甫', '尉迟', '西门', '南宫', '宇文', '端木', '夏侯', '轩辕', '司徒', '百里')
+
+# 地名常见的结尾字
+PLACE_SUFFIXES = '省市县区州府郡镇乡村庄屯寨堡城关山岭峰岗谷河江湖海溪泉岛港湾洲寺庙宫观殿楼阁桥门'
+
+# 快速模式对应的实体类别与词性
+FAST_ENTITY_TAGS = {'name': 'nr', 'location': 'ns'}
+
+
+class FastEntityExtractor:
+    """
+    快速人名/地名提取，只在少量候选窗口上做词性标注
+    - 先做不带 HMM 的普通分词（只查词典和最大概率路径），比 pseg.cut 快数倍
+    - 多字词直接按词典词性计数（自定义词典中标注为 nr/ns 的词同样计入），与 pseg 对词典词的标注一致
+    - 连续的单字组成的片段就是 pseg 需要用 HMM 判断的部分；只有含姓氏或地名后缀的片段作为候选窗口，
+      交给 pseg 标注，其余片段视为不含实体
+    这是以召回率换速度的近似：窗口脱离上下文单独标注，加上不含姓氏/后缀规则的未登录实体被跳过，
+    结果并不与完整词性标注一致。在基准语料上以 pseg 为基准，准确率约 1.0，人名召回率约 0.89、地名约 0.89，
+    具体文本上的召回率和准确率可用 compare_entity_modes 评估
+    """
+
+    def __init__(self, surnames=SURNAMES, compound_surnames=COMPOUND_SURNAMES, place_suffixes=PLACE_SUFFIXES,
+                 context=None):
+        """
+        :param surnames: 单姓字符集
+        :param compound_surnames: 复姓列表
+        :param place_suffixes: 地名后缀字符集
+        :param context: 候选字前后保留的字数；为 None 时整个单字片段作为窗口（召回率最高，但仍低于完整标注）
+        """
+        self.surnames = frozenset(surnames)
+        self.compound_surnames = tuple(compound_surnames)
+        self.place_suffixes = frozenset(place_suffixes)
+        self.context = context
+        self.windows = 0
+        self.window_chars = 0
+
+    def _windows(self, run):
+        """
+        单字片段中的候选窗口：姓氏后还有字时可能是人名，后缀前还有字时可能是地名
+        :param run: 连续单字组成的片段
+        :return: 窗口文本列表；context 为 None 时整个片段作为一个窗口
+        """
+        n = len(run)
+        spans = []
+        for i, char in enumerate(run):
+            if char in self.surnames and i < n - 1:
+                spans.append((i, i + 3))
+            if char in self.place_suffixes and i > 0:
+                spans.append((i - 3, i + 1))
+        for surname in self.compound_surnames:
+            i = run.find(surname)
+            while 0 <= i < n - 2:
+                spans.append((i, i + 4))
+                i = run.find(surname, i + 1)
+        if not spans:
+            return []
+        if self.context is None:
+            return [run]
+        # 扩展上下文并合并重叠的窗口
+        spans.sort()
+        windows = []
+        start, end = spans[0]
+        for s, e in spans[1:]:
+            if s - self.context <= end + self.context:
+                end = max(end, e)
+            else:
+                windows.append(run[max(0, start - self.context):end + self.context])
+                start, end = s, e
+        windows.append(run[max(0, start - self.context):end + self.context])
+        return windows
+
+    def _spot(self, chunk, word_tag, counts, windows):
+        """分词并登记词典实体，返回候选窗口"""
+        import jieba
+
+        run = []
+
+        def flush():
+            if len(run) > 1:
+                windows.extend(self._windows(''.join(run)))
+            elif run:
+                # 单独的一个单字与 pseg 一样按词典词性
+                label = word_tag.get(run[0])
+                if label in counts:
+                    counts[label][run[0]] += 1
+            run.clear()
+
+        for word in jieba.cut(chunk, HMM=False):
+            if len(word) == 1 and '\u4e00' <= word <= '\u9fd5':
+                run.append(word)
+                continue
+            flush()
+            label = word_tag.get(word)
+            if label in counts:
+                counts[label][word] += 1
+        flush()
+
+    @instrument('fast_entities', text_arg='text', count=lambda counts: sum(sum(c.values()) for c in counts.values()))
+    def count(self, text, labels=('name', 'location')):
+        """
+        统计人名和地名
+        :param text: 文本内容，或文本块可迭代对象（如 iter_file_chunks 的结果）
+        :param labels: 要统计的类别，取自 FAST_ENTITY_TAGS
+        :return: {类别: Counter({实体: 次数})}
+        """
+        import jieba.posseg as pseg
+
+        pseg.dt.makesure_userdict_loaded()
+        tags = {FAST_ENTITY_TAGS[label]: label for label in labels}
+        # 词 -> 类别，只保留需要统计的词性
+        word_tag = {word: tags[tag] for word, tag in pseg.dt.word_tag_tab.items() if tag in tags}
+        counts = {label: Counter() for label in labels}
+        for chunk in _as_chunks(text):
+            windows = []
+            self._spot(chunk, word_tag, counts, windows)
+            if not windows:
+                continue
+            self.windows += len(windows)
+            self.window_chars += sum(map(len, windows))
+            # 换行不会出现在窗口内，各窗口在 pseg 中相互独立，合并后一次标注
+            for pair in pseg.cut('\n'.join(windows)):
+                label = tags.get(pair.flag)
+                if label is not None:
+                    counts[label][pair.word] += 1
+        return counts
+
+
+# 快速模式与词性标注模式的比较
+def compare_entity_modes(text, labels=('name', 'location'), extractor=None):
+    """
+    以完整词性标注（pos == 'nr' / 'ns'）的结果为基准，评估快速模式的召回率、准确率和耗时
+    快速模式是近似结果，召回率一般低于 1（基准语料上约 0.89）
+    计数按实体出现次数计算（多重集合的交集）
+    :param text: 文本内容或文本块序列，会被遍历两次，不能是生成器
+    :param labels: 要比较的类别
+    :param extractor: FastEntityExtractor，默认使用内置的姓氏表和后缀规则
+    :return: {类别: {'reference', 'fast', 'matched', 'precision', 'recall', 'f1'}}，
+             另有 '_timing': {'pos_seconds', 'fast_seconds', 'speedup', 'windows', 'window_chars', 'chars'}
+    """
+    import time
+    import jieba.posseg as pseg
+
+    tags = {FAST_ENTITY_TAGS[label]: label for label in labels}
+    extractor = extractor or FastEntityExtractor()
+
+    start = time.perf_counter()
+    reference = {label: Counter() for label in labels}
+    chars = 0
+    for chunk in _as_chunks(text):
+        chars += len(chunk)
+        for pair in pseg.cut(chunk):
+            label = tags.get(pair.flag)
+            if label is not None:
+                reference[label][pair.word] += 1
+    pos_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = extractor.count(text, labels)
+    fast_seconds = time.perf_counter() - start
+
+    report = {}
+    for label in labels:
+        ref_total = sum(reference[label].values())
+        fast_total = sum(fast[label].values())
+        matched = sum((reference[label] & fast[label]).values())
+        precision = matched / fast_total if fast_total else 1.0
+        recall = matched / ref_total if ref_total else 1.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        report[label] = {
+            'reference': ref_total, 'fast': fast_total, 'matched': matched,
+            'precision': round(precision, 4), 'recall': round(recall, 4), 'f1': round(f1, 4),
+        }
+    report['_timing'] = {
+        'pos_seconds': round(pos_seconds, 3),
+        'fast_seconds': round(fast_seconds, 3),
+        'speedup': round(pos_seconds / fast_seconds, 2) if fast_seconds else None,
+        'windows': extractor.windows,
+        'window_chars': extractor.window_chars,
+        'chars': chars,
+    }
+    return report
+
+
+# 保存实体词频
+@instrument('save_entities', output_file='output_file', count=None)
+def save_entity_counts(counts, output_file, fmt=None, column='entity'):
+    """
+    按频次降序保存实体词频，按块缓冲写出
+    :param counts: 实体词频字典 {实体: 频次}
+    :param output_file: 输出文件路径
+    :param fmt: 导出格式 tsv/csv/parquet/arrow，默认由扩展名推断
+    :param column: 实体列的列名
+    """
+    export_counts(counts, output_file, fmt, column=column)
+
+
+# 基于 Aho-Corasick 自动机的多词典匹配
+class EntityMatcher:
+    """
+    由一个或多个实体词典编译而成的多模式匹配自动机
+    直接扫描原始文本，时间复杂度与文本长度线性相关，不依赖分词结果
+    """
+
+    def __init__(self):
+        self._goto = [{}]     # 状态转移表
+        self._fail = [0]      # 失败指针
+        self._own = [()]      # 以各状态结尾的词 (词长, 词, 类别)
+        self._output = [()]   # 各状态命中的全部词，含失败链上的后缀词，build 时由 _own 重新计算
+        self._built = True
+        self.size = 0
+        self.max_length = 0   # 最长的词长，决定匹配流中的候选何时可以确定
+
+    def add_word(self, word, label='entity'):
+        """
+        添加一个实体词
+        :param word: 实体词
+        :param label: 实体类别，如 'weapon'
+        """
+        if not word:
+            return
+        state = 0
+        for char in word:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append(())
+                self._output.append(())
+            state = next_state
+        entry = (len(word), word, label)
+        if entry not in self._own[state]:
+            self._own[state] += (entry,)
+            self.size += 1
+            self.max_length = max(self.max_length, len(word))
+        self._built = False
+
+    def add_lexicon(self, words, label):
+        """
+        批量添加同一类别的实体词
+        :param words: 实体词可迭代对象
+        :param label: 实体类别
+        """
+        for word in words:
+            self.add_word(word, label)
+
+    @classmethod
+    def from_dicts(cls, dict_paths):
+        """
+        由多个词典文件构建自动机
+        :param dict_paths: {类别: 词典路径}
+        :return: EntityMatcher
+        """
+        matcher = cls()
+        for label, dict_path in dict_paths.items():
+            matcher.add_lexicon(load_dict_words(dict_path), label)
+        matcher.build()
+        return matcher
+
+    def build(self):
+        """按广度优先顺序计算失败指针，并合并后缀状态的输出"""
+        goto, fail, own = self._goto, self._fail, self._own
+        output = self._output = list(own)
+        queue = deque(goto[0].values())
+        for state in queue:
+            fail[state] = 0
+            output[state] = tuple(sorted(own[state], reverse=True))
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[next_state] = goto[f].get(char, 0)
+                # 输出按词长降序，保证最长匹配排在前面
+                output[next_state] = tuple(sorted(
+                    own[next_state] + output[fail[next_state]], reverse=True))
+        self._built = True
+
+    def iter_matches(self, text):
+        """
+        扫描文本，产出所有（可能重叠的）匹配
+        文本块之间保留自动机状态，跨块的实体也能被识别
+        :param text: 文本内容或文本块可迭代对象
+        :return: 匹配生成器 (起始偏移, 结束偏移, 实体词, 类别)
+        """
+        if not self._built:
+            self.build()
+        goto, fail, output = self._goto, self._fail, self._output
+        if isinstance(text, str):
+            text = (text,)
+        state = 0
+        base = 0
+        for chunk in text:
+            for i, char in enumerate(chunk):
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                if output[state]:
+                    end = base + i + 1
+                    for length, word, label in output[state]:
+                        yield end - length, end, word, label
+            base += len(chunk)
+
+    def find_entities(self, text, overlapping=False):
+        """
+        查找文本中的实体及其字符偏移
+        :param text: 文本内容或文本块可迭代对象
+        :param overlapping: 是否保留重叠匹配；默认按最左最长原则去除重叠
+        :return: 匹配列表 [(起始偏移, 结束偏移, 实体词, 类别)]
+        """
+        return list(self._iter_entities(text, overlapping))
+
+    def _iter_entities(self, text, overlapping=False):
+        matches = self.iter_matches(text)
+        if overlapping:
+            return matches
+        return _leftmost_longest(matches, self.max_length)
+
+    def count(self, text, overlapping=False):
+        """
+        统计各类别实体的出现次数
+        :param text: 文本内容或文本块可迭代对象
+        :param overlapping: 是否统计重叠匹配
+        :return: {类别: Counter({实体词: 次数})}
+        """
+        counts = {}
+        # 逐个消费匹配，不保留整篇文本的匹配列表
+        for _, _, word, label in self._iter_entities(text, overlapping):
+            counts.setdefault(label, Counter())[word] += 1
+        return counts
+
+
+def _leftmost_longest(matches, max_length):
+    """
+    从按结束位置产出的匹配流中逐个选出互不重叠的最左最长匹配
+    结束于 end 之后的匹配起点都不早于 end - max_length，起点早于它的候选已经可以确定，
+    因此只需缓存与当前位置重叠的候选
+    :param matches: 按结束偏移非降序的匹配可迭代对象
+    :param max_length: 匹配的最大长度
+    :return: 匹配生成器
+    """
+    key = lambda m: (m[0], m[0] - m[1])
+    pending = []
+    last_end = 0
+    for match in matches:
+        limit = match[1] - max_length
+        while pending:
+            best = min(pending, key=key)
+            if best[0] >= limit:
+                break
+            yield best
+            last_end = best[1]
+            pending = [m for m in pending if m[0] >= last_end]
+        if match[0] >= last_end:
+            pending.append(match)
+    pending.sort(key=key)
+    for match in pending:
+        if match[0] >= last_end:
+            yield match
+            last_end = match[1]
+
+
+# 已编译自动机缓存，词典文件未修改时直接复用
+_matcher_cache = {}
+
+
+def get_dict_matcher(dict_path, label):
+    """
+    获取由单个词典编译的自动机，按文件路径、修改时间和大小缓存
+    :param dict_path: 词典文件路径
+    :param label: 实体类别
+    :return: EntityMatcher
+    """
+    stat = os.stat(dict_path)
+    key = (os.path.abspath(dict_path), label)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _matcher_cache.get(key)
+    if cached is None or cached[0] != signature:
+        cached = (signature, EntityMatcher.from_dicts({label: dict_path}))
+        _matcher_cache[key] = cached
+    return cached[1]
+
+
+# 人名相关词性：nr 人名，nrfg/nrt 为 jieba 对部分人名、音译名的细分
+PERSON_TAGS = ('nr', 'nrfg', 'nrt')
+
+
+def _pair_offsets(keys, max_span=0):
+    """
+    生成键值相差不超过 max_span 的全部实体出现对（同句时键为句号，滑动窗口时键为词位置）
+    第 i 个与第 i+d 个元素按偏移 d 逐轮向量化比较，轮数只取决于同一范围内的最大实体数
+    :param keys: 每次实体出现的句号或词位置（已排序）
+    :param max_span: 允许的最大键值差
+    :return: (左下标数组, 右下标数组)
+    """
+    left, right = [], []
+    n = len(keys)
+    for d in range(1, n):
+        i = np.arange(n - d)
+        keep = keys[d:] - keys[:-d] <= max_span
+        if not keep.any():
+            break
+        i = i[keep]
+        left.append(i)
+        right.append(i + d)
+    if not left:
+        empty = np.array([], dtype=np.intp)
+        return empty, empty
+    return np.concatenate(left), np.concatenate(right)
+
+
+# 实体共现统计
+def cooccurrence_counts(corpus, entity_tags=PERSON_TAGS, entity_words=None, window=None,
+                        top_entities=None):
+    """
+    统计实体共现次数，结果以稀疏 COO 形式（行、列、权重三个数组）返回
+    :param corpus: 带词性的 TokenCorpus，或词性标注结果 [(词, 词性)]
+    :param entity_tags: 视为实体的词性
+    :param entity_words: 额外视为实体的词语集合（如武器词表）
+    :param window: 为 None 时以句子为共现范围（每句每对实体计一次）；否则为滑动窗口的词数
+    :param top_entities: 只保留出现次数最多的前N个实体
+    :return: (实体名列表, 行下标数组, 列下标数组, 权重数组)，行下标小于列下标
+    """
+    if not isinstance(corpus, TokenCorpus):
+        corpus = TokenCorpus.from_tagged(corpus)
+    mask = corpus.tag_mask(*entity_tags)
+    if entity_words:
+        mask |= corpus.word_mask(entity_words)
+    positions = np.flatnonzero(mask)
+    entity_ids, entity_index, entity_freq = np.unique(
+        corpus.ids[positions], return_inverse=True, return_counts=True)
+
+    if top_entities and len(entity_ids) > top_entities:
+        keep_entities = np.argsort(-entity_freq, kind='stable')[:top_entities]
+        remap = np.full(len(entity_ids), -1)
+        remap[keep_entities] = np.arange(len(keep_entities))
+        entity_index = remap[entity_index]
+        keep = entity_index >= 0
+        positions, entity_index = positions[keep], entity_index[keep]
+        entity_ids = entity_ids[keep_entities]
+
+    n_entities = len(entity_ids)
+    names = [corpus.vocab[i] for i in entity_ids]
+    if not n_entities:
+        empty = np.array([], dtype=np.int64)
+        return names, empty, empty, empty
+    if window is None:
+        sentence_id = corpus.sentence_ids()[positions]
+        # 同一句中同一实体只计一次
+        occurrence = np.unique(sentence_id.astype(np.int64) * n_entities + entity_index)
+        members = occurrence % n_entities
+        left, right = _pair_offsets(occurrence // n_entities)
+    else:
+        members = entity_index
+        left, right = _pair_offsets(positions, window)
+
+    a, b = members[left], members[right]
+    distinct = a != b
+    a, b = a[distinct], b[distinct]
+    codes = np.minimum(a, b).astype(np.int64) * n_entities + np.maximum(a, b)
+    codes, weights = np.unique(codes, return_counts=True)
+    return names, codes // n_entities, codes % n_entities, weights
+
+
+# 共现关系抽取
+@instrument('relationships')
+def extract_relationships(corpus, entity_tags=PERSON_TAGS, entity_words=None, window=None,
+                          min_weight=1, top_k=None, top_entities=None):
+    """
+    从词性标注结果中抽取实体共现关系，可直接用于 visualize_relationship_graph
+    :param corpus: 带词性的 TokenCorpus，或词性标注结果 [(词, 词性)]
+    :param entity_tags: 视为实体的词性，默认为人名
+    :param entity_words: 额外视为实体的词语集合
+    :param window: 为 None 时按句子统计共现；否则为滑动窗口的词数
+    :param min_weight: 最小共现次数
+    :param top_k: 只保留权重最高的前K条关系
+    :param top_entities: 只保留出现次数最多的前N个实体
+    :return: 关系列表 [(实体1, 实体2, 权重)]，按权重降序
+    """
+    names, rows, cols, weights = cooccurrence_counts(
+        corpus, entity_tags, entity_words, window, top_entities)
+    keep = weights >= min_weight
+    rows, cols, weights = rows[keep], cols[keep], weights[keep]
+    order = np.argsort(-weights, kind='stable')
+    if top_k:
+        order = order[:top_k]
+    return [(names[rows[i]], names[cols[i]], int(weights[i])) for i in order]
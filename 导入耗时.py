@@ -0,0 +1,62 @@
+import json
+import subprocess
+import sys
+
+
+# 各模块冷启动导入耗时预算（秒）
+IMPORT_BUDGETS = {
+    '文本处理': 0.4,
+    '实体提取': 0.4,
+    '词典管理': 0.3,
+    '结果缓存': 0.4,
+}
+
+# 只做文本处理时不应加载的可视化/数据表依赖
+HEAVY_MODULES = ('matplotlib', 'wordcloud', 'networkx', 'pandas', 'PIL', 'jieba.posseg')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+# 测量模块导入耗时
+def measure_import(module, repeat=3):
+    """
+    在全新的解释器进程中测量模块导入耗时，取多次中的最小值
+    :param module: 模块名
+    :param repeat: 重复次数
+    :return: (耗时秒数, 被连带加载的重量级模块列表)
+    """
+    best = None
+    loaded = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if best is None or result['seconds'] < best:
+            best = result['seconds']
+        loaded = result['loaded']
+    return best, loaded
+
+
+def main():
+    failed = False
+    for module, budget in IMPORT_BUDGETS.items():
+        seconds, loaded = measure_import(module)
+        ok = seconds <= budget and not loaded
+        failed = failed or not ok
+        status = "通过" if ok else "超出预算"
+        print(f"{module}: {seconds * 1000:.0f} ms (预算 {budget * 1000:.0f} ms) {status}")
+        if loaded:
+            print(f"  连带加载了: {', '.join(loaded)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
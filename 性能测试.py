@@ -0,0 +1,448 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from collections import Counter
+from itertools import accumulate
+
+import jieba
+import numpy as np
+
+from 文本处理 import segment_text, pos_tagging, count_word_frequency, iter_file_chunks, TokenCorpus
+from 实体提取 import (extract_and_save_names, extract_and_save_locations, extract_and_save_weapons,
+                  extract_relationships, FastEntityExtractor, FAST_ENTITY_TAGS)
+from 词典管理 import ensure_user_dict
+
+
+STAGES = ('segment', 'pos', 'frequency', 'names', 'locations', 'fast_entities', 'weapons', 'relationship_graph')
+
+# 合成武器名用的字
+_WEAPON_HEADS = '青龙偃月丈八蛇矛方天画戟雌雄双股倚天屠龙玄铁七星宝雕弓银枪金背大环赤焰寒霜紫电流星'
+_WEAPON_TAILS = '刀剑枪戟矛弓斧锤鞭棍'
+
+_SIZE = re.compile(r'^\s*([0-9.]+)\s*([KMG]?)B?\s*$', re.IGNORECASE)
+
+
+def parse_size(text):
+    """
+    解析 10KB、500MB、1GB 形式的大小
+    :param text: 大小字符串
+    :return: 字节数
+    """
+    match = _SIZE.match(text)
+    if not match:
+        raise ValueError(f"无法解析的大小: {text}")
+    number, unit = match.groups()
+    return int(float(number) * {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}[unit.upper()])
+
+
+# 合成语料用的词表
+def load_lexicon(vocab_size=20000, entity_pool=2000):
+    """
+    从 jieba 自带词典中按词频取常用词，以及标注为人名(nr)/地名(ns)的词，不需要联网
+    :param vocab_size: 常用词个数
+    :param entity_pool: 人名、地名各取的个数
+    :return: (常用词列表, 词频列表, 人名列表, 地名列表)
+    """
+    common, names, locations = [], [], []
+    with jieba.get_dict_file() as f:
+        for line in f:
+            parts = line.decode('utf-8').split()
+            if len(parts) != 3:
+                continue
+            word, freq, tag = parts[0], int(parts[1]), parts[2]
+            if tag == 'nr':
+                names.append((freq, word))
+            elif tag == 'ns':
+                locations.append((freq, word))
+            elif tag != 'x':
+                common.append((freq, word))
+    # 同频次按词排序，保证结果只取决于词典内容
+    common = sorted(common, key=lambda x: (-x[0], x[1]))[:vocab_size]
+    names = [w for _, w in sorted(names, key=lambda x: (-x[0], x[1]))[:entity_pool]]
+    locations = [w for _, w in sorted(locations, key=lambda x: (-x[0], x[1]))[:entity_pool]]
+    return [w for _, w in common], [f for f, _ in common], names, locations
+
+
+def make_weapons(dict_size, seed=0):
+    """
+    生成确定的合成武器名
+    :param dict_size: 武器名个数
+    :param seed: 随机种子
+    :return: 武器名列表
+    """
+    rng = random.Random(seed)
+    weapons = set()
+    limit = len(_WEAPON_HEADS) ** 3 * len(_WEAPON_TAILS)
+    while len(weapons) < min(dict_size, limit):
+        head = ''.join(rng.choice(_WEAPON_HEADS) for _ in range(rng.randint(2, 3)))
+        weapons.add(head + rng.choice(_WEAPON_TAILS))
+    return sorted(weapons)
+
+
+# 确定性的合成中文语料
+def generate_corpus(path, size, seed=42, entity_density=0.05, dict_size=1000, vocab_size=20000):
+    """
+    生成指定大小（UTF-8 字节数）的合成语料和对应的武器词典；相同参数生成的文件逐字节相同
+    :param path: 语料输出路径，武器词典写到 <path>.weapons.txt
+    :param size: 语料大小（字节）
+    :param seed: 随机种子
+    :param entity_density: 实体（人名/地名/武器）占词数的比例
+    :param dict_size: 武器词典的词条数
+    :param vocab_size: 常用词个数
+    :return: (语料路径, 武器词典路径)
+    """
+    dict_path = path + '.weapons.txt'
+    if os.path.exists(path) and os.path.exists(dict_path):
+        return path, dict_path
+
+    rng = random.Random(seed)
+    common, freqs, names, locations = load_lexicon(vocab_size)
+    cum_weights = list(accumulate(freqs))
+    weapons = make_weapons(dict_size, seed)
+    entity_pools = [names] * 5 + [locations] * 3 + [weapons] * 2
+
+    with open(dict_path, 'w', encoding='utf-8') as f:
+        for weapon in weapons:
+            f.write(f"{weapon} 10 n\n")
+
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    written = 0
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        while written < size:
+            sentences = []
+            for _ in range(rng.randint(3, 8)):
+                n = rng.randint(6, 18)
+                tokens = rng.choices(common, cum_weights=cum_weights, k=n)
+                for i in range(n):
+                    if rng.random() < entity_density:
+                        tokens[i] = rng.choice(rng.choice(entity_pools))
+                cut = rng.randint(2, n - 2)
+                sentences.append(''.join(tokens[:cut]) + '，' + ''.join(tokens[cut:]) + rng.choice('。。。！？；'))
+            paragraph = ''.join(sentences) + '\n'
+            data = paragraph.encode('utf-8')
+            f.write(paragraph)
+            written += len(data)
+    os.replace(temp_file, path)
+    return path, dict_path
+
+
+def _current_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakRSS:
+    """在后台线程中定期采样常驻内存，记录一个阶段内的峰值"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _current_rss())
+
+    def __enter__(self):
+        self.peak = _current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss())
+
+
+def summarize(latencies, chars, tokens, seconds, peak_rss):
+    """
+    汇总一个阶段的测量结果
+    :param latencies: 每次调用的耗时（秒）
+    :param chars: 处理的字符数
+    :param tokens: 处理的词数
+    :param seconds: 计时的总耗时
+    :param peak_rss: 峰值常驻内存（字节）
+    :return: 结果字典
+    """
+    latency_ms = np.asarray(latencies) * 1000
+    return {
+        'calls': len(latencies),
+        'chars': chars,
+        'tokens': tokens,
+        'seconds': round(seconds, 6),
+        'chars_per_sec': round(chars / seconds, 1) if seconds else None,
+        'tokens_per_sec': round(tokens / seconds, 1) if seconds else None,
+        'latency_ms': {
+            'p50': round(float(np.percentile(latency_ms, 50)), 3),
+            'p90': round(float(np.percentile(latency_ms, 90)), 3),
+            'p99': round(float(np.percentile(latency_ms, 99)), 3),
+            'max': round(float(latency_ms.max()), 3),
+        } if len(latency_ms) else None,
+        'peak_rss_mb': round(peak_rss / (1 << 20), 1),
+    }
+
+
+def _chunk_stage(stage, corpus_path, weapon_dict, chunk_size, out_dir, quality=None):
+    """
+    逐块运行一个阶段，只对被测函数计时；准备输入（如词频统计所需的分词结果）不计时
+    :param quality: fast_entities 阶段累计与完整词性标注比较的实体数 {类别: Counter(reference, fast, matched)}
+    :return: (每块耗时, 字符数, 词数)
+    """
+    latencies = []
+    chars = tokens = 0
+    out_file = os.path.join(out_dir, f"{stage}.txt")
+    extractor = FastEntityExtractor()
+    for chunk in iter_file_chunks(corpus_path, chunk_size):
+        if stage == 'frequency':
+            prepared = segment_text(chunk)
+        elif stage in ('names', 'locations', 'fast_entities'):
+            prepared = pos_tagging(chunk)
+        else:
+            prepared = chunk
+
+        start = time.perf_counter()
+        if stage == 'segment':
+            count = len(segment_text(prepared))
+        elif stage == 'pos':
+            count = len(pos_tagging(prepared))
+        elif stage == 'frequency':
+            count_word_frequency(prepared)
+            count = len(prepared)
+        elif stage == 'names':
+            extract_and_save_names(prepared, out_file)
+            count = len(prepared)
+        elif stage == 'locations':
+            extract_and_save_locations(prepared, out_file)
+            count = len(prepared)
+        elif stage == 'fast_entities':
+            counts = extractor.count(chunk)
+            count = len(prepared)
+        elif stage == 'weapons':
+            count = sum(extract_and_save_weapons(prepared, weapon_dict, out_file).values())
+        latencies.append(time.perf_counter() - start)
+        if stage == 'fast_entities' and quality is not None:
+            for label, tag in FAST_ENTITY_TAGS.items():
+                reference = Counter(word for word, pos in prepared if pos == tag)
+                totals = quality.setdefault(label, Counter())
+                totals['reference'] += sum(reference.values())
+                totals['fast'] += sum(counts[label].values())
+                totals['matched'] += sum((reference & counts[label]).values())
+        chars += len(chunk)
+        tokens += count
+    return latencies, chars, tokens
+
+
+def _graph_stage(corpus_path, chunk_size, out_dir, graph_chars, repeat):
+    """
+    先由语料前 graph_chars 个字符统计人名共现关系（不计时），再重复绘制关系图
+    :return: (每次绘制耗时, 0, 边数)
+    """
+    from 可视化 import visualize_relationship_graph, layout_cache
+
+    pairs = Counter()
+    chars = 0
+    for chunk in iter_file_chunks(corpus_path, chunk_size):
+        corpus = TokenCorpus.from_tagged(pos_tagging(chunk))
+        for e1, e2, weight in extract_relationships(corpus):
+            pairs[(e1, e2)] += weight
+        chars += len(chunk)
+        if chars >= graph_chars:
+            break
+    relationships = [(e1, e2, w) for (e1, e2), w in pairs.most_common()]
+
+    latencies = []
+    out_file = os.path.join(out_dir, 'relationship.png')
+    logging.getLogger('matplotlib.font_manager').setLevel(logging.ERROR)
+    with warnings.catch_warnings():
+        # 测试机器上没有中文字体时忽略缺字警告
+        warnings.simplefilter('ignore', UserWarning)
+        for _ in range(repeat):
+            # 每次都清空布局缓存，测的是冷启动的布局和绘制耗时
+            layout_cache.clear()
+            start = time.perf_counter()
+            visualize_relationship_graph(relationships, out_file)
+            latencies.append(time.perf_counter() - start)
+    return latencies, 0, len(relationships)
+
+
+def run_stage(stage, corpus_path, weapon_dict, chunk_size=1 << 16, graph_chars=1 << 22, graph_repeat=3):
+    """
+    测量一个阶段
+    :param stage: 阶段名，见 STAGES
+    :param corpus_path: 语料路径
+    :param weapon_dict: 武器词典路径
+    :param chunk_size: 每次调用处理的字符数，延迟分位数按调用统计
+    :param graph_chars: 关系图阶段用于统计共现的字符数
+    :param graph_repeat: 关系图的重复绘制次数
+    :return: 结果字典
+    """
+    with tempfile.TemporaryDirectory() as out_dir, PeakRSS() as rss:
+        wall = time.perf_counter()
+        quality = {}
+        if stage == 'relationship_graph':
+            latencies, chars, tokens = _graph_stage(corpus_path, chunk_size, out_dir, graph_chars, graph_repeat)
+        else:
+            latencies, chars, tokens = _chunk_stage(stage, corpus_path, weapon_dict, chunk_size, out_dir, quality)
+        wall = time.perf_counter() - wall
+    result = summarize(latencies, chars, tokens, sum(latencies), rss.peak)
+    result['wall_seconds'] = round(wall, 3)
+    # 快速实体识别相对完整词性标注（nr/ns）的准确率和召回率
+    for label, totals in quality.items():
+        result[label] = {
+            'precision': round(totals['matched'] / totals['fast'], 4) if totals['fast'] else 1.0,
+            'recall': round(totals['matched'] / totals['reference'], 4) if totals['reference'] else 1.0,
+        }
+    return result
+
+
+def run_benchmark(sizes, stages=STAGES, seed=42, entity_density=0.05, dict_size=1000,
+                  workdir='bench_data', chunk_size=1 << 16, graph_chars=1 << 22, graph_repeat=3,
+                  log=None):
+    """
+    对每种语料大小生成（或复用）语料并依次测量各阶段
+    :param sizes: 语料大小列表（字节）
+    :param stages: 要测量的阶段
+    :param seed: 随机种子
+    :param entity_density: 实体占词数的比例
+    :param dict_size: 武器词典词条数
+    :param workdir: 语料存放目录，相同参数的语料会被复用
+    :param log: 进度输出函数
+    :return: 结果字典
+    """
+    log = log or (lambda message: None)
+    os.makedirs(workdir, exist_ok=True)
+    jieba.setLogLevel(60)
+    # 预先加载词典和词性标注模型，避免计入第一个阶段
+    jieba.initialize()
+    pos_tagging('预热')
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'jieba': jieba.__version__,
+            'numpy': np.__version__,
+            'seed': seed,
+            'entity_density': entity_density,
+            'dict_size': dict_size,
+            'chunk_size': chunk_size,
+        },
+        'runs': [],
+    }
+    for size in sizes:
+        name = f"corpus_{size}_s{seed}_e{entity_density}_d{dict_size}.txt"
+        log(f"生成语料: {name}")
+        corpus_path, weapon_dict = generate_corpus(os.path.join(workdir, name), size, seed,
+                                                   entity_density, dict_size)
+        # 与界面一致：武器词典同时作为分词的自定义词典
+        ensure_user_dict(weapon_dict)
+        run = {'size': size, 'corpus': name, 'stages': {}}
+        for stage in stages:
+            log(f"  {stage} ...")
+            try:
+                run['stages'][stage] = run_stage(stage, corpus_path, weapon_dict, chunk_size,
+                                                 graph_chars, graph_repeat)
+            except ImportError as e:
+                # 可视化依赖未安装时跳过该阶段
+                run['stages'][stage] = {'skipped': str(e)}
+        report['runs'].append(run)
+    return report
+
+
+def compare(report, baseline, threshold=0.1):
+    """
+    与基准结果比较吞吐量
+    :param report: 本次结果
+    :param baseline: 基准结果
+    :param threshold: 吞吐量下降超过该比例时视为退化
+    :return: 退化列表 [(大小, 阶段, 基准值, 本次值)]
+    """
+    def rate(stage):
+        # 关系图阶段没有字符数，用每秒处理的边数
+        return stage.get('chars_per_sec') or stage.get('tokens_per_sec')
+
+    old_runs = {run['size']: run for run in baseline.get('runs', [])}
+    regressions = []
+    for run in report['runs']:
+        old = old_runs.get(run['size'])
+        if old is None:
+            continue
+        for stage, result in run['stages'].items():
+            before = old['stages'].get(stage, {})
+            if 'skipped' in result or 'skipped' in before or not before:
+                continue
+            if rate(before) and rate(result) < rate(before) * (1 - threshold):
+                regressions.append((run['size'], stage, rate(before), rate(result)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="文本处理各阶段的性能基准测试")
+    parser.add_argument('--sizes', default='10KB,1MB', help="语料大小列表，如 10KB,1MB,100MB,1GB")
+    parser.add_argument('--stages', default=','.join(STAGES), help="要测量的阶段")
+    parser.add_argument('--seed', type=int, default=42, help="随机种子")
+    parser.add_argument('--entity-density', type=float, default=0.05, help="实体占词数的比例")
+    parser.add_argument('--dict-size', type=int, default=1000, help="武器词典词条数")
+    parser.add_argument('--workdir', default='bench_data', help="合成语料存放目录")
+    parser.add_argument('--chunk-size', type=int, default=1 << 16, help="每次调用处理的字符数")
+    parser.add_argument('--graph-chars', type=int, default=1 << 22, help="关系图阶段统计共现的字符数")
+    parser.add_argument('--graph-repeat', type=int, default=3, help="关系图重复绘制次数")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="结果 JSON 路径")
+    parser.add_argument('--compare', default=None, help="与之比较的基准结果 JSON")
+    parser.add_argument('--threshold', type=float, default=0.1, help="吞吐量下降超过该比例时视为退化")
+    args = parser.parse_args(argv)
+
+    stages = [s for s in args.stages.split(',') if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"未知的阶段: {', '.join(sorted(unknown))}")
+
+    report = run_benchmark(
+        [parse_size(s) for s in args.sizes.split(',')], stages, args.seed, args.entity_density,
+        args.dict_size, args.workdir, args.chunk_size, args.graph_chars, args.graph_repeat,
+        log=lambda message: print(message, file=sys.stderr)
+    )
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for run in report['runs']:
+        print(f"{run['corpus']}:")
+        for stage, result in run['stages'].items():
+            if 'skipped' in result:
+                print(f"  {stage:<20} 跳过 ({result['skipped']})")
+                continue
+            print(f"  {stage:<20} {result['chars_per_sec'] or 0:>12.0f} 字/秒 "
+                  f"{result['tokens_per_sec'] or 0:>12.0f} 词/秒 "
+                  f"p99 {result['latency_ms']['p99']:>9.1f} ms  峰值内存 {result['peak_rss_mb']} MB")
+            for label in FAST_ENTITY_TAGS:
+                if label in result:
+                    print(f"  {'':<20} {label}: 相对完整词性标注 准确率 {result[label]['precision']:.2%} "
+                          f"召回率 {result[label]['recall']:.2%}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for size, stage, before, after in regressions:
+            print(f"退化: {size} 字节 {stage}: {before:.0f} -> {after:.0f} /秒")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
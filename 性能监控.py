@@ -0,0 +1,385 @@
+import cProfile
+import functools
+import inspect
+import io
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Windows 没有 resource 模块，不记录进程内存最高值
+    resource = None
+
+
+def max_rss_mb():
+    """
+    进程常驻内存的历史最高值
+    :return: MB；没有 resource 模块（Windows）时为 None
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss 在 macOS 上以字节为单位，在 Linux 上以 KB 为单位
+    return round(max_rss / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+# 结构化日志：每条记录是一行 JSON
+metrics_logger = logging.getLogger('nlp.metrics')
+metrics_logger.propagate = False
+
+
+class StageRecord:
+    """一次阶段调用的测量结果"""
+
+    __slots__ = ('stage', 'start', 'wall', 'cpu', 'tokens', 'chars', 'bytes_read',
+                 'bytes_written', 'max_rss', 'py_peak', 'error')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.start = time.time()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.tokens = None
+        self.chars = None
+        self.bytes_read = None
+        self.bytes_written = None
+        self.max_rss = None
+        self.py_peak = None
+        self.error = None
+
+    def as_dict(self):
+        return {
+            'ts': round(self.start, 3),
+            'stage': self.stage,
+            'wall_ms': round(self.wall * 1000, 3),
+            'cpu_ms': round(self.cpu * 1000, 3),
+            'tokens': self.tokens,
+            'chars': self.chars,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'max_rss_mb': self.max_rss,
+            'py_peak_mb': self.py_peak,
+            'error': self.error,
+        }
+
+
+# 各阶段的测量与汇总
+class Instrumentation:
+    """
+    记录每个阶段的墙钟时间、CPU 时间（当前线程）、处理的词数和字符数、读写字节数和峰值内存
+    - 汇总结果通过 metrics() 读取
+    - 每条记录写入结构化 JSON 日志，并通知订阅者（如界面状态栏）
+    - max_rss 是阶段结束时进程常驻内存的历史最高值（ru_maxrss），不是该阶段自身的峰值；Windows 上为 None
+    - 开启 tracemalloc 时，py_peak 为该阶段执行期间 Python 分配的峰值（进程内所有线程），嵌套阶段互不覆盖
+    """
+
+    def __init__(self, history=1000):
+        """
+        :param history: 保留的最近记录条数
+        """
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._recent = deque(maxlen=history)
+        self._subscribers = []
+        self._traced = []  # 正在执行且需要记录 Python 分配峰值的阶段
+
+    @contextmanager
+    def stage(self, name):
+        """
+        测量一段代码，可在代码块中补充 tokens/chars/bytes_read/bytes_written 等字段
+        :param name: 阶段名
+        :return: StageRecord
+        """
+        record = StageRecord(name)
+        if not self.enabled:
+            yield record
+            return
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            self._enter_traced(record)
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        try:
+            yield record
+        except BaseException as e:
+            record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record.wall += time.perf_counter() - wall
+            record.cpu += time.thread_time() - cpu
+            if tracing:
+                self._exit_traced(record)
+            self.add(record)
+
+    def _fold_peak(self):
+        """
+        把上次重置以来的 tracemalloc 峰值计入所有进行中的阶段，再重置峰值
+        tracemalloc 只有一个全局峰值，嵌套或并发的阶段各自保存重置前的峰值，结束时取最大值
+        """
+        peak = tracemalloc.get_traced_memory()[1]
+        for active in self._traced:
+            active.py_peak = max(active.py_peak or 0, peak)
+        tracemalloc.reset_peak()
+
+    def _enter_traced(self, record):
+        with self._lock:
+            self._fold_peak()
+            record.py_peak = tracemalloc.get_traced_memory()[0]
+            self._traced.append(record)
+
+    def _exit_traced(self, record):
+        with self._lock:
+            self._fold_peak()
+            self._traced.remove(record)
+        record.py_peak = round(record.py_peak / (1 << 20), 2)
+
+    def add(self, record):
+        """登记一条记录并通知订阅者"""
+        record.max_rss = max_rss_mb()
+        with self._lock:
+            total = self._totals.get(record.stage)
+            if total is None:
+                total = self._totals[record.stage] = {
+                    'calls': 0, 'errors': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'max_wall_s': 0.0,
+                    'tokens': 0, 'chars': 0, 'bytes_read': 0, 'bytes_written': 0,
+                }
+            total['calls'] += 1
+            total['errors'] += record.error is not None
+            total['wall_s'] += record.wall
+            total['cpu_s'] += record.cpu
+            total['max_wall_s'] = max(total['max_wall_s'], record.wall)
+            for field in ('tokens', 'chars', 'bytes_read', 'bytes_written'):
+                total[field] += getattr(record, field) or 0
+            self._recent.append(record)
+            subscribers = list(self._subscribers)
+        if metrics_logger.handlers:
+            metrics_logger.info(json.dumps(record.as_dict(), ensure_ascii=False))
+        for callback in subscribers:
+            callback(record)
+
+    def metrics(self):
+        """
+        各阶段的汇总指标
+        :return: {阶段名: 指标字典}
+        """
+        with self._lock:
+            result = {}
+            for stage, total in self._totals.items():
+                total = dict(total)
+                wall = total['wall_s']
+                total['tokens_per_sec'] = round(total['tokens'] / wall, 1) if wall else None
+                total['chars_per_sec'] = round(total['chars'] / wall, 1) if wall else None
+                result[stage] = total
+            return result
+
+    def recent(self, n=None):
+        """
+        最近的记录
+        :param n: 条数
+        :return: 记录字典列表，按时间先后排列
+        """
+        with self._lock:
+            records = list(self._recent)
+        return [record.as_dict() for record in records[-n if n else 0:]]
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+            self._recent.clear()
+
+    def subscribe(self, callback):
+        """
+        订阅新记录
+        :param callback: callback(StageRecord)，在执行该阶段的线程中调用
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+
+# 全局实例
+instrumentation = Instrumentation()
+
+
+def get_metrics():
+    """各阶段的汇总指标"""
+    return instrumentation.metrics()
+
+
+def configure_log(log_path):
+    """
+    把每条记录以 JSON 行的形式追加写入日志文件
+    :param log_path: 日志文件路径，为 None 时关闭文件日志
+    """
+    for handler in list(metrics_logger.handlers):
+        metrics_logger.removeHandler(handler)
+        handler.close()
+    if log_path:
+        handler = logging.FileHandler(log_path, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        metrics_logger.addHandler(handler)
+        metrics_logger.setLevel(logging.INFO)
+
+
+def _default_count(result):
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return None
+
+
+def _one(item):
+    return 1
+
+
+def _timed_iter(record, iterator, count, chars):
+    """惰性结果在被消费时才计时，产出结束后（或消费方提前停止时）登记记录"""
+    try:
+        while True:
+            with _resumed(record):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            if count is not None:
+                record.tokens = (record.tokens or 0) + count(item)
+            if chars is not None:
+                record.chars = (record.chars or 0) + chars(item)
+            yield item
+    except GeneratorExit:
+        raise
+    except BaseException as e:
+        record.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        instrumentation.add(record)
+
+
+@contextmanager
+def _resumed(record):
+    wall = time.perf_counter()
+    cpu = time.thread_time()
+    try:
+        yield
+    finally:
+        record.wall += time.perf_counter() - wall
+        record.cpu += time.thread_time() - cpu
+
+
+def instrument(stage, text_arg=None, tokens_arg=None, input_file=None, output_file=None,
+               count=_default_count, item_count=_one, item_chars=None):
+    """
+    为函数加上阶段测量
+    :param stage: 阶段名
+    :param text_arg: 输入文本参数名，记录字符数
+    :param tokens_arg: 输入词序列参数名，以其长度作为词数
+    :param input_file: 输入文件参数名，记录读取的字节数
+    :param output_file: 输出文件参数名，调用结束后记录写入的字节数
+    :param count: 由返回值计算词数的函数
+    :param item_count: 返回生成器时，由每个产出项计算词数的函数，默认每项计 1
+    :param item_chars: 返回生成器时，由每个产出项计算字符数的函数
+    :return: 装饰器
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return func(*args, **kwargs)
+            arguments = signature.bind(*args, **kwargs).arguments
+            record = StageRecord(stage)
+            text = arguments.get(text_arg) if text_arg else None
+            if isinstance(text, str):
+                record.chars = len(text)
+            if tokens_arg:
+                record.tokens = _default_count(arguments.get(tokens_arg))
+            if input_file:
+                record.bytes_read = _file_size(arguments.get(input_file))
+
+            if inspect.isgeneratorfunction(func):
+                return _timed_iter(record, func(*args, **kwargs), item_count, item_chars)
+            # 与 stage() 相同的峰值登记，不会重置外层阶段的 py_peak
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                instrumentation._enter_traced(record)
+            with _resumed(record):
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    record.error = f"{type(e).__name__}: {e}"
+                    if tracing:
+                        instrumentation._exit_traced(record)
+                    instrumentation.add(record)
+                    raise
+            if tracing:
+                instrumentation._exit_traced(record)
+            if inspect.isgenerator(result):
+                return _timed_iter(record, result, item_count, item_chars)
+            if count is not None:
+                record.tokens = count(result)
+            if output_file:
+                record.bytes_written = _file_size(arguments.get(output_file))
+            instrumentation.add(record)
+            return result
+        return wrapper
+    return decorator
+
+
+# 单次运行的性能剖析
+@contextmanager
+def profile_run(output_prefix, top=30):
+    """
+    在当前线程中开启 cProfile 和 tracemalloc，结束后写出剖析结果
+    - <前缀>.prof: cProfile 原始数据，可用 snakeviz/pstats 查看
+    - <前缀>.txt: 按累计耗时排序的函数和分配最多的代码行
+    :param output_prefix: 输出文件路径前缀
+    :param top: 报告中列出的条数
+    :return: 结束后包含报告路径的字典
+    """
+    paths = {'profile': output_prefix + '.prof', 'report': output_prefix + '.txt'}
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield paths
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+
+        profiler.dump_stats(paths['profile'])
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(top)
+        with open(paths['report'], 'w', encoding='utf-8') as f:
+            f.write(f"Python 内存: 当前 {current / (1 << 20):.1f} MB, 峰值 {peak / (1 << 20):.1f} MB\n\n")
+            f.write("分配最多的代码行:\n")
+            for stat in snapshot.statistics('lineno')[:top]:
+                f.write(f"  {stat}\n")
+            f.write("\n")
+            f.write(stream.getvalue())
@@ -0,0 +1,396 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from 文本处理 import analyze_text, init_worker, iter_file_chunks
+from 实体提取 import FastEntityExtractor, get_dict_matcher
+from 词典管理 import ensure_user_dict
+from 性能监控 import configure_log
+from 结果导出 import TableWriter, export_counts, export_pos, export_tokens, read_table
+from 关键词提取 import DEFAULT_IDF_PATH, KeywordExtractor
+from 倒排索引 import InvertedIndex
+
+
+# 支持的分析项
+ANALYSES = ('segment', 'frequency', 'pos', 'names', 'locations', 'weapons', 'keywords', 'index')
+
+# 可以跨文件汇总的计数类分析项及其列名
+COUNT_COLUMNS = {
+    'frequency': 'word',
+    'names': 'name',
+    'locations': 'location',
+    'weapons': 'weapon',
+}
+
+# 人名/地名分析项及其在快速实体识别中的类别
+ENTITY_ANALYSES = {'names': 'name', 'locations': 'location'}
+
+# 需要完整词性标注结果的分析项
+TAGGED_ANALYSES = {'segment', 'frequency', 'pos', 'keywords', 'index'}
+
+PROGRESS_FILE = 'progress.jsonl'
+
+
+# 收集输入文件
+def collect_files(inputs, pattern='*.txt'):
+    """
+    展开目录、通配符和文件路径
+    :param inputs: 输入路径列表（目录、通配符或文件）
+    :param pattern: 目录中匹配的文件名模式
+    :return: 排序去重后的文件路径列表
+    """
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, '**', pattern), recursive=True))
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            files.update(glob.glob(item, recursive=True))
+    return sorted(os.path.abspath(f) for f in files if os.path.isfile(f))
+
+
+def output_name(file_path):
+    """
+    由输入路径生成唯一且稳定的输出文件名
+    :param file_path: 输入文件路径
+    :return: 输出文件名（不含扩展名）
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    digest = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:8]
+    return f"{stem}-{digest}"
+
+
+# 处理单个文件（在工作进程中运行）
+def process_file(file_path, analyses, output_dir, fmt='csv', weapon_dict=None, entity_mode='pos'):
+    """
+    对单个文件运行所选分析并写出结果
+    :param file_path: 输入文件路径
+    :param analyses: 分析项集合
+    :param output_dir: 输出目录
+    :param fmt: 输出格式 'csv'、'parquet' 或 'arrow'
+    :param weapon_dict: 武器词典路径
+    :param entity_mode: 人名/地名的提取方式，'pos' 完整词性标注，'fast' 只在候选窗口上标注
+    :return: 文件摘要字典
+    """
+    name = output_name(file_path)
+    summary = {'file': file_path, 'chars': None, 'tokens': 0}
+
+    def read_chunks():
+        # 分析时顺便统计字符数，不为计数再读一遍文件
+        chars = 0
+        for chunk in iter_file_chunks(file_path):
+            chars += len(chunk)
+            yield chunk
+        summary['chars'] = chars
+
+    def target(analysis_name):
+        target_dir = os.path.join(output_dir, analysis_name)
+        os.makedirs(target_dir, exist_ok=True)
+        return os.path.join(target_dir, f"{name}.{fmt}")
+
+    # 其他分析项已经需要完整标注时直接复用其人名/地名结果
+    fast_entities = entity_mode == 'fast' and not analyses & TAGGED_ANALYSES
+    # 结果直接从整数数组语料分块写出，不经过 DataFrame
+    if analyses & TAGGED_ANALYSES or (analyses & ENTITY_ANALYSES.keys() and not fast_entities):
+        analysis = analyze_text(read_chunks(), compact=True)
+        corpus = analysis.corpus
+        summary['tokens'] = len(corpus)
+        if 'segment' in analyses:
+            export_tokens(corpus, target('segment'), fmt)
+        if analyses & {'pos', 'index'}:
+            export_pos(corpus, target('pos'), fmt)
+        if analyses & {'frequency', 'keywords'}:
+            export_counts(analysis.word_freq, target('frequency'), fmt, column='word')
+        if 'names' in analyses:
+            export_counts(analysis.name_counts, target('names'), fmt, column='name')
+        if 'locations' in analyses:
+            export_counts(analysis.location_counts, target('locations'), fmt, column='location')
+    elif fast_entities and analyses & ENTITY_ANALYSES.keys():
+        selected = [name for name in ENTITY_ANALYSES if name in analyses]
+        counts = FastEntityExtractor().count(read_chunks(), [ENTITY_ANALYSES[n] for n in selected])
+        for analysis_name in selected:
+            export_counts(counts[ENTITY_ANALYSES[analysis_name]], target(analysis_name), fmt,
+                          column=COUNT_COLUMNS[analysis_name])
+
+    if 'weapons' in analyses and weapon_dict:
+        weapon_counts = get_dict_matcher(weapon_dict, 'weapon').count(
+            iter_file_chunks(file_path) if summary['chars'] is not None else read_chunks())
+        export_counts(weapon_counts.get('weapon', Counter()), target('weapons'), fmt, column='weapon')
+
+    if summary['chars'] is None:
+        # 没有任何分析项读取全文（如未提供武器词典）
+        summary['chars'] = sum(len(chunk) for chunk in iter_file_chunks(file_path))
+    return summary
+
+
+def load_progress(progress_path):
+    """
+    读取已完成文件记录
+    :param progress_path: 进度文件路径
+    :return: {文件路径: (大小, 修改时间, 已完成的分析项集合)}
+    """
+    done = {}
+    if not os.path.exists(progress_path):
+        return done
+    with open(progress_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 进程崩溃时最后一行可能不完整
+                continue
+            if record.get('status') == 'ok':
+                state = (record['size'], record['mtime'])
+                analyses = set(record.get('analyses', ()))
+                previous = done.get(record['file'])
+                # 同一版本文件多次运行时，合并各次完成的分析项
+                if previous is not None and previous[:2] == state:
+                    analyses |= previous[2]
+                done[record['file']] = state + (analyses,)
+            else:
+                done.pop(record['file'], None)
+    return done
+
+
+def _file_state(file_path):
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# 汇总各文件的计数类结果
+def aggregate_results(output_dir, analyses, fmt='csv', files=None):
+    """
+    合并已完成文件的词频/实体统计，写出汇总表
+    :param output_dir: 输出目录
+    :param analyses: 分析项集合
+    :param fmt: 输出格式
+    :param files: 本次的输入文件列表，只汇总进度文件中记录为已完成（且文件未再修改）的结果，
+                  目录中其他输入留下的旧结果不计入；为 None 时汇总目录中的全部结果
+    :return: {分析项: 汇总文件路径}
+    """
+    completed = None
+    if files is not None:
+        done = load_progress(os.path.join(output_dir, PROGRESS_FILE))
+        completed = {}
+        for file_path in files:
+            record = done.get(file_path)
+            if record is not None and record[:2] == _file_state(file_path):
+                completed[output_name(file_path)] = record[2]
+    outputs = {}
+    for analysis_name, column in COUNT_COLUMNS.items():
+        target_dir = os.path.join(output_dir, analysis_name)
+        if analysis_name not in analyses or not os.path.isdir(target_dir):
+            continue
+        if completed is None:
+            paths = [os.path.join(target_dir, name) for name in os.listdir(target_dir) if name.endswith('.' + fmt)]
+        else:
+            paths = [os.path.join(target_dir, f"{name}.{fmt}") for name, done_analyses in completed.items()
+                     if analysis_name in done_analyses]
+        total = Counter()
+        for path in paths:
+            if os.path.exists(path):
+                df = read_table(path, fmt)
+                total.update(dict(zip(df[column], df['count'])))
+        outputs[analysis_name] = export_counts(total, os.path.join(output_dir, f"all_{analysis_name}.{fmt}"),
+                                               fmt, column=column)
+    return outputs
+
+
+# 由各文件的词频表提取关键词
+def extract_keywords(output_dir, fmt='csv', top_k=20, index_path=DEFAULT_IDF_PATH):
+    """
+    先把所有文件的词频登记到 IDF 索引，再用稀疏文档-词矩阵对全部文件一次性计算 TF-IDF 并取前K个
+    :param output_dir: 输出目录
+    :param fmt: 输出格式
+    :param top_k: 每个文件的关键词数
+    :param index_path: IDF 索引文件路径，多次运行之间累积
+    :return: 关键词结果目录，没有词频表时返回 None
+    """
+    freq_dir = os.path.join(output_dir, 'frequency')
+    if not os.path.isdir(freq_dir):
+        return None
+    names = sorted(name[:-len(fmt) - 1] for name in os.listdir(freq_dir) if name.endswith('.' + fmt))
+    counts_list = []
+    for name in names:
+        df = read_table(os.path.join(freq_dir, f"{name}.{fmt}"), fmt)
+        counts_list.append(dict(zip(df['word'].astype(str), df['count'])))
+    results = KeywordExtractor(index_path).extract_many(counts_list, top_k, names, learn=True)
+
+    target_dir = os.path.join(output_dir, 'keywords')
+    os.makedirs(target_dir, exist_ok=True)
+    for name, keywords in zip(names, results):
+        export_counts(keywords, os.path.join(target_dir, f"{name}.{fmt}"), fmt,
+                      column='keyword', value_column='weight')
+    return target_dir
+
+
+# 由各文件的词性标注表建立位置倒排索引
+def build_index(output_dir, fmt='csv'):
+    """
+    把所有文件的标注结果合并为一个位置倒排索引，写入 output_dir/index.npz
+    :param output_dir: 输出目录
+    :param fmt: 输出格式
+    :return: 索引文件路径，没有标注结果时返回 None
+    """
+    pos_dir = os.path.join(output_dir, 'pos')
+    if not os.path.isdir(pos_dir):
+        return None
+    index = InvertedIndex()
+    for name in sorted(os.listdir(pos_dir)):
+        if name.endswith('.' + fmt):
+            df = read_table(os.path.join(pos_dir, name), fmt)
+            index.add_document(name[:-len(fmt) - 1], zip(df['word'].astype(str), df['pos'].astype(str)))
+    path = os.path.join(output_dir, 'index.npz')
+    index.save(path)
+    return path
+
+
+# 批量处理
+def run_batch(files, analyses, output_dir, jobs=None, fmt='csv', weapon_dict=None, user_dict=None,
+              log=print, metrics_log=None, entity_mode='pos'):
+    """
+    使用进程池批量处理文件，已完成的文件记录在进度文件中，中断后重新运行会跳过它们
+    :param files: 文件路径列表
+    :param analyses: 分析项集合
+    :param output_dir: 输出目录
+    :param jobs: 工作进程数
+    :param fmt: 输出格式 'csv'、'parquet' 或 'arrow'
+    :param weapon_dict: 武器词典路径
+    :param user_dict: 自定义词典路径（武器词典会一并加载）
+    :param log: 日志输出函数
+    :param metrics_log: 各阶段性能记录的 JSON 日志路径，所有工作进程追加写入同一文件
+    :param entity_mode: 人名/地名的提取方式 'pos' 或 'fast'
+    :return: (成功数, 失败数, 跳过数)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, PROGRESS_FILE)
+    done = load_progress(progress_path)
+    pending = []
+    for file_path in files:
+        record = done.get(file_path)
+        # 文件未修改且所需分析项都已完成时跳过
+        if record is None or record[:2] != _file_state(file_path) or not analyses <= record[2]:
+            pending.append(file_path)
+    skipped = len(files) - len(pending)
+    if skipped:
+        log(f"跳过已完成的 {skipped} 个文件")
+
+    jobs = jobs or os.cpu_count() or 1
+    ok = failed = 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                             initargs=(user_dict, weapon_dict, metrics_log)) as executor, \
+            open(progress_path, 'a', encoding='utf-8') as progress:
+        in_flight = {}
+        queue = iter(pending)
+        while True:
+            # 在途任务数有上限，避免一次提交十万个任务
+            for file_path in queue:
+                future = executor.submit(process_file, file_path, analyses, output_dir, fmt, weapon_dict,
+                                         entity_mode)
+                in_flight[future] = file_path
+                if len(in_flight) >= jobs * 4:
+                    break
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                file_path = in_flight.pop(future)
+                size, mtime = _file_state(file_path)
+                record = {'file': file_path, 'size': size, 'mtime': mtime, 'analyses': sorted(analyses)}
+                try:
+                    record.update(future.result())
+                    record['status'] = 'ok'
+                    ok += 1
+                except Exception as e:
+                    record.update(status='error', error=str(e))
+                    failed += 1
+                    log(f"处理失败: {file_path}: {e}")
+                progress.write(json.dumps(record, ensure_ascii=False) + '\n')
+                progress.flush()
+            log(f"进度: {ok + failed + skipped}/{len(files)}")
+    return ok, failed, skipped
+
+
+def _init_batch_worker(user_dict, weapon_dict, metrics_log=None):
+    """工作进程初始化：加载自定义词典，武器词典也作为自定义词典加载以保证武器名不被切碎"""
+    init_worker(user_dict)
+    if metrics_log:
+        configure_log(metrics_log)
+    if weapon_dict and os.path.exists(weapon_dict):
+        ensure_user_dict(weapon_dict)
+
+
+def write_summary(output_dir, fmt='csv'):
+    """
+    根据进度文件写出每个文件的处理摘要
+    :param output_dir: 输出目录
+    :param fmt: 输出格式
+    :return: 摘要文件路径
+    """
+    records = {}
+    with open(os.path.join(output_dir, PROGRESS_FILE), 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            records[record['file']] = record
+    columns = ['file', 'status', 'chars', 'tokens', 'size', 'error']
+    with TableWriter(os.path.join(output_dir, f"all_files.{fmt}"), columns, fmt) as writer:
+        writer.write_rows([record.get(column) for column in columns] for record in records.values())
+    return writer.path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="中文文本批量分析（无界面）")
+    parser.add_argument('inputs', nargs='+', help="输入目录、通配符或文件")
+    parser.add_argument('-o', '--output', default='output', help="输出目录")
+    parser.add_argument('-a', '--analyses', default='frequency,names,locations',
+                        help="分析项，逗号分隔: " + ','.join(ANALYSES))
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="工作进程数，默认为CPU核数")
+    parser.add_argument('-f', '--format', choices=('csv', 'parquet', 'arrow'), default='csv', help="输出格式")
+    parser.add_argument('--pattern', default='*.txt', help="目录中匹配的文件名模式")
+    parser.add_argument('--weapon-dict', default='weapon_dict.txt', help="武器词典路径")
+    parser.add_argument('--user-dict', default=None, help="自定义词典路径")
+    parser.add_argument('--top-k', type=int, default=20, help="每个文件的关键词数")
+    parser.add_argument('--idf-index', default=DEFAULT_IDF_PATH, help="IDF 索引文件路径，多次运行之间累积")
+    parser.add_argument('--entity-mode', choices=('pos', 'fast'), default='pos',
+                        help="人名/地名提取方式: pos 完整词性标注；fast 普通分词加候选窗口标注，更快但召回率较低（基准语料上约 0.89）")
+    parser.add_argument('--metrics-log', default=None, help="把各阶段的耗时、词数、读写字节数以 JSON 行写入该文件")
+    args = parser.parse_args(argv)
+
+    analyses = {a.strip() for a in args.analyses.split(',') if a.strip()}
+    unknown = analyses - set(ANALYSES)
+    if unknown:
+        parser.error(f"未知的分析项: {', '.join(sorted(unknown))}")
+    weapon_dict = args.weapon_dict if os.path.exists(args.weapon_dict) else None
+    if 'weapons' in analyses and not weapon_dict:
+        parser.error(f"武器词典文件不存在: {args.weapon_dict}")
+
+    files = collect_files(args.inputs, args.pattern)
+    if not files:
+        parser.error("没有找到输入文件")
+    log = lambda message: print(message, file=sys.stderr)
+    log(f"共 {len(files)} 个文件，分析项: {', '.join(sorted(analyses))}")
+
+    ok, failed, skipped = run_batch(files, analyses, args.output, args.jobs, args.format,
+                                    weapon_dict, args.user_dict, log, args.metrics_log, args.entity_mode)
+    write_summary(args.output, args.format)
+    for analysis_name, path in aggregate_results(args.output, analyses, args.format, files).items():
+        log(f"汇总结果 ({analysis_name}): {path}")
+    if 'keywords' in analyses:
+        log(f"关键词结果: {extract_keywords(args.output, args.format, args.top_k, args.idf_index)}")
+    if 'index' in analyses:
+        log(f"倒排索引: {build_index(args.output, args.format)}")
+    log(f"完成: 成功 {ok}，失败 {failed}，跳过 {skipped}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
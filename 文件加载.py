@@ -0,0 +1,142 @@
+import codecs
+import io
+import mmap
+import os
+from contextlib import contextmanager
+
+
+# 检测编码时在文件头、中、尾各取的样本字节数
+SAMPLE_BYTES = 1 << 16
+
+# 打开时为预览保留的开头字节数，各编码单个字符最多 4 字节
+PREVIEW_BYTES = 4096
+
+# 按字节顺序标记识别的编码
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def _samples(data, sample_bytes=SAMPLE_BYTES):
+    """文件头、中、尾的样本；中间和末尾的样本可能从半个字符开始"""
+    size = len(data)
+    if size <= sample_bytes * 3:
+        return [bytes(data)]
+    middle = size // 2
+    return [bytes(data[:sample_bytes]), bytes(data[middle:middle + sample_bytes]), bytes(data[-sample_bytes:])]
+
+
+def _is_utf8(sample, first):
+    if not first:
+        # 跳过从半个字符开始的续字节
+        sample = sample.lstrip(bytes(range(0x80, 0xC0)))
+    try:
+        # final=False：样本末尾被截断的字符不算错误
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+# 编码检测
+def detect_encoding(data, sample_bytes=SAMPLE_BYTES):
+    """
+    由文件内容的样本推断编码
+    - 有字节顺序标记时按标记
+    - 各样本都是合法的 UTF-8 时为 utf-8（纯 ASCII 也归为 utf-8）
+    - 否则按 gb18030 处理，它兼容 GBK 和 GB2312
+    :param data: 文件内容（bytes、mmap 或 memoryview）
+    :param sample_bytes: 每个样本的字节数
+    :return: 编码名
+    """
+    head = bytes(data[:4])
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+    samples = _samples(data, sample_bytes)
+    if all(_is_utf8(sample, i == 0) for i, sample in enumerate(samples)):
+        return 'utf-8'
+    return 'gb18030'
+
+
+# 内存映射的文本文件
+class MappedText:
+    """
+    以内存映射方式读取文本文件，打开时只读取样本检测编码，不解码全文
+    - preview 立即返回开头的若干字符
+    - iter_blocks 按字节块逐段解码，换行统一为 \\n（与文本模式 open 一致），内存占用与块大小相关
+    映射只在每次读取期间保持，其余时间不占用文件句柄，外部编辑器可以照常保存文件；
+    文件在打开后被修改时读取会报错，需要重新打开
+    可以像路径一样传给 os.path 系列函数
+    """
+
+    def __init__(self, path, encoding=None, errors='strict'):
+        """
+        :param path: 文件路径
+        :param encoding: 文件编码，为 None 时自动检测
+        :param errors: 解码错误的处理方式，如 'strict'、'replace'
+        """
+        self.path = os.fspath(path)
+        self.errors = errors
+        stat = os.stat(self.path)
+        self.size = stat.st_size
+        self._mtime = stat.st_mtime_ns
+        with self._mapped() as data:
+            self.encoding = encoding or detect_encoding(data)
+            self._head = bytes(data[:PREVIEW_BYTES])
+
+    @contextmanager
+    def _mapped(self):
+        """映射整个文件，退出时解除映射"""
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if (stat.st_size, stat.st_mtime_ns) != (self.size, self._mtime):
+                raise OSError(f"文件已被修改，请重新打开: {self.path}")
+            if not self.size:
+                # 空文件无法映射
+                yield b''
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield data
+
+    def __fspath__(self):
+        return self.path
+
+    def __repr__(self):
+        return f"MappedText({self.path!r}, encoding={self.encoding!r}, size={self.size})"
+
+    def _decoder(self, errors=None):
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors or self.errors)
+        return io.IncrementalNewlineDecoder(decoder, translate=True)
+
+    def iter_blocks(self, block_bytes=1 << 20):
+        """
+        逐段解码
+        :param block_bytes: 每次解码的字节数
+        :return: 文本块生成器，块的边界不一定在句子或段落处
+        """
+        decoder = self._decoder()
+        with self._mapped() as data:
+            for offset in range(0, self.size, block_bytes):
+                text = decoder.decode(data[offset:offset + block_bytes])
+                if text:
+                    yield text
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+    def preview(self, chars=200):
+        """
+        开头的若干字符，使用打开时读取的字节，不再访问文件
+        :param chars: 字符数，最多 PREVIEW_BYTES // 4
+        :return: 预览文本
+        """
+        # 预览不因个别坏字节或截断的末尾字符失败
+        text = self._decoder('replace').decode(self._head, final=False)
+        return text[:chars]
+
+    def read(self):
+        """解码全文（只在确实需要完整字符串时使用）"""
+        return ''.join(self.iter_blocks())
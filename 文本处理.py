@@ -0,0 +1,688 @@
+import heapq
+import math
+import os
+import re
+from array import array
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import jieba
+import numpy as np
+
+from 文件加载 import MappedText
+from 词典管理 import ensure_user_dict
+from 性能监控 import instrument
+from 结果导出 import export_pos
+
+
+# 句末标点，分块时优先在段落（换行）处切分，其次在句末切分
+SENTENCE_DELIMITERS = '。！？!?；;…'
+
+_SENTENCE_END = re.compile(f'[{SENTENCE_DELIMITERS}]')
+
+# jieba 词性标注集，编号固定以便用 uint8 存储；自定义词典中的其他词性追加在后面
+POS_TAGS = (
+    'x', 'a', 'ad', 'ag', 'an', 'b', 'bg', 'c', 'd', 'df', 'dg', 'e', 'en', 'eng',
+    'f', 'g', 'h', 'i', 'in', 'j', 'jn', 'k', 'l', 'ln', 'm', 'mg', 'mq',
+    'n', 'ng', 'nr', 'nrfg', 'nrt', 'ns', 'nt', 'nz', 'o', 'p', 'q', 'qe', 'qg',
+    'r', 'rg', 'rr', 'rz', 's', 't', 'tg', 'u', 'ud', 'ug', 'uj', 'ul', 'un', 'uv', 'uz',
+    'v', 'vd', 'vg', 'vi', 'vn', 'vq', 'w', 'y', 'yg', 'z', 'zg'
+)
+
+
+# 分词功能
+@instrument('segment', text_arg='text')
+def segment_text(text, user_dict=None):
+    """
+    对文本进行分词
+    :param text: 待分词文本
+    :param user_dict: 自定义词典路径
+    :return: 分词结果列表
+    """
+    if user_dict and os.path.exists(user_dict):
+        ensure_user_dict(user_dict)
+    words = list(jieba.cut(text))
+    return words
+
+
+# 词频统计功能
+@instrument('frequency', tokens_arg='word_list', count=None)
+def count_word_frequency(word_list, top_n=None, approximate=False, epsilon=1e-4):
+    """
+    统计词频
+    :param word_list: 分词后的列表，也可以是 stream_segment 产出的词语流或 TokenCorpus
+    :param top_n: 返回前N个高频词
+    :param approximate: 是否使用有界内存的近似统计（适用于无界的词语流）
+    :param epsilon: 近似统计的相对误差上限，频次低估量不超过 epsilon * 总词数
+    :return: 词频统计结果
+    """
+    if isinstance(word_list, TokenCorpus):
+        return word_list.word_frequency(top_n)
+    if approximate:
+        counter = FrequentItemsCounter(epsilon=epsilon)
+        counter.update(word_list)
+    else:
+        counter = Counter(word_list)
+    if top_n:
+        return counter.most_common(top_n)
+    return counter
+
+
+# 词性标注功能
+@instrument('pos', text_arg='text')
+def pos_tagging(text):
+    """
+    进行词性标注
+    :param text: 待标注文本，或文本块可迭代对象（如 iter_file_chunks 的结果）
+    :return: 标注结果列表 [(词, 词性)]；传入文本块时返回惰性生成器
+    """
+    if not isinstance(text, str):
+        return stream_pos_tagging(text)
+    import jieba.posseg as pseg
+    words_pos = list(pseg.cut(text))
+    return words_pos
+
+
+# 保存词性分类结果
+@instrument('save_pos', output_file='output_file', count=None)
+def save_pos_results(words_pos, output_file, fmt=None):
+    """
+    保存词性标注结果，按块缓冲写出
+    :param words_pos: 词性标注结果，可以是生成器或 TokenCorpus
+    :param output_file: 输出文件路径
+    :param fmt: 导出格式 tsv/csv/parquet/arrow，默认由扩展名推断（.txt 为制表符分隔）
+    """
+    export_pos(words_pos, output_file, fmt)
+
+
+def _find_boundary(buffer):
+    """
+    在缓冲区中查找最后一个可切分位置
+    :param buffer: 文本缓冲区
+    :return: 切分位置（不含边界之后的内容），找不到时返回0
+    """
+    cut = buffer.rfind('\n') + 1
+    if cut:
+        return cut
+    last = None
+    for last in _SENTENCE_END.finditer(buffer):
+        pass
+    return last.end() if last else 0
+
+
+# 按段落/句子边界分块
+def split_text_chunks(blocks, chunk_size=1 << 20):
+    """
+    将任意文本块序列重新整理为在段落或句子边界处切分的文本块
+    :param blocks: 文本块可迭代对象（如文件对象逐行读取的结果）
+    :param chunk_size: 单个文本块的目标字符数
+    :return: 文本块生成器
+    """
+    buffer = ''
+    for block in blocks:
+        buffer += block
+        if len(buffer) < chunk_size:
+            continue
+        cut = _find_boundary(buffer)
+        # 超长且没有任何边界的文本强制切分，保证内存占用有上限
+        if not cut and len(buffer) >= chunk_size * 4:
+            cut = len(buffer)
+        if cut:
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+
+# 流式读取文件
+@instrument('read_file', input_file='file_path', item_count=None, item_chars=len)
+def iter_file_chunks(file_path, chunk_size=1 << 20, encoding=None):
+    """
+    分块读取文本文件，每块在段落或句子边界处结束
+    :param file_path: 文件路径，或已打开的 MappedText
+    :param chunk_size: 单个文本块的目标字符数
+    :param encoding: 文件编码，为 None 时自动检测（UTF-8 / GB18030）
+    :return: 文本块生成器
+    """
+    document = file_path if isinstance(file_path, MappedText) else MappedText(file_path, encoding)
+    yield from split_text_chunks(document.iter_blocks(chunk_size), chunk_size)
+
+
+def _as_chunks(text):
+    """
+    将字符串或文本块序列统一为文本块可迭代对象
+    :param text: 字符串或文本块可迭代对象
+    :return: 文本块可迭代对象
+    """
+    if isinstance(text, str):
+        return (text,)
+    return text
+
+
+# 流式分词
+def stream_segment(chunks, user_dict=None):
+    """
+    对文本块序列逐块分词，惰性产出词语
+    :param chunks: 字符串或文本块可迭代对象
+    :param user_dict: 自定义词典路径
+    :return: 词语生成器
+    """
+    if user_dict and os.path.exists(user_dict):
+        ensure_user_dict(user_dict)
+    for chunk in _as_chunks(chunks):
+        yield from jieba.cut(chunk)
+
+
+# 流式词性标注
+def stream_pos_tagging(chunks):
+    """
+    对文本块序列逐块进行词性标注，惰性产出标注结果
+    :param chunks: 字符串或文本块可迭代对象
+    :return: 标注结果生成器 (词, 词性)
+    """
+    import jieba.posseg as pseg
+    for chunk in _as_chunks(chunks):
+        for pair in pseg.cut(chunk):
+            yield pair.word, pair.flag
+
+
+def _iter_slices(text, size):
+    """
+    按固定长度切片字符串，避免 splitlines 一次性复制整篇文本
+    :param text: 文本内容
+    :param size: 切片长度
+    :return: 文本切片生成器
+    """
+    for start in range(0, len(text), size):
+        yield text[start:start + size]
+
+
+# 进程池工作进程初始化：每个进程只加载一次 jieba 和自定义词典（优先读取预编译词典）
+def init_worker(user_dict):
+    jieba.initialize()
+    if user_dict and os.path.exists(user_dict):
+        ensure_user_dict(user_dict)
+
+
+def _segment_chunk(chunk):
+    return list(jieba.cut(chunk))
+
+
+def _pos_chunk(chunk):
+    import jieba.posseg as pseg
+    return [(pair.word, pair.flag) for pair in pseg.cut(chunk)]
+
+
+# 多进程并行分词/词性标注
+class ParallelSegmenter:
+    """
+    按段落将文本分片后交给进程池并行处理，结果按原文顺序返回
+    可作为上下文管理器使用，进程池在多次调用之间复用
+    """
+
+    def __init__(self, workers=None, user_dict=None, chunk_size=1 << 16, mp_context=None):
+        """
+        :param workers: 工作进程数，默认为CPU核数
+        :param user_dict: 自定义词典路径
+        :param chunk_size: 每个分片的目标字符数
+        :param mp_context: multiprocessing 上下文，默认使用平台默认方式
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.user_dict = user_dict
+        self.chunk_size = chunk_size
+        self.mp_context = mp_context
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self.mp_context,
+                initializer=init_worker,
+                initargs=(self.user_dict,)
+            )
+        return self._executor
+
+    def _shards(self, text):
+        if isinstance(text, str):
+            text = _iter_slices(text, self.chunk_size)
+        return split_text_chunks(text, self.chunk_size)
+
+    def _ordered_map(self, func, text):
+        """
+        按原文顺序产出每个分片的处理结果，同时在途分片数有上限，保证流式输入时内存可控
+        """
+        executor = self._get_executor()
+        window = self.workers * 2
+        pending = deque()
+        for shard in self._shards(text):
+            pending.append(executor.submit(func, shard))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def iter_segment(self, text):
+        """
+        并行分词，惰性产出词语
+        :param text: 文本内容或文本块可迭代对象
+        :return: 词语生成器
+        """
+        for words in self._ordered_map(_segment_chunk, text):
+            yield from words
+
+    def iter_pos_tagging(self, text):
+        """
+        并行词性标注，惰性产出标注结果
+        :param text: 文本内容或文本块可迭代对象
+        :return: 标注结果生成器 (词, 词性)
+        """
+        for words_pos in self._ordered_map(_pos_chunk, text):
+            yield from words_pos
+
+    def segment(self, text):
+        return list(self.iter_segment(text))
+
+    def pos_tagging(self, text):
+        return list(self.iter_pos_tagging(text))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def parallel_segment(text, user_dict=None, workers=None):
+    """
+    使用进程池并行分词
+    :param text: 待分词文本或文本块可迭代对象
+    :param user_dict: 自定义词典路径
+    :param workers: 工作进程数
+    :return: 分词结果列表（按原文顺序）
+    """
+    with ParallelSegmenter(workers, user_dict) as segmenter:
+        return segmenter.segment(text)
+
+
+def parallel_pos_tagging(text, user_dict=None, workers=None):
+    """
+    使用进程池并行词性标注
+    :param text: 待标注文本或文本块可迭代对象
+    :param user_dict: 自定义词典路径
+    :param workers: 工作进程数
+    :return: 标注结果列表 [(词, 词性)]（按原文顺序）
+    """
+    with ParallelSegmenter(workers, user_dict) as segmenter:
+        return segmenter.pos_tagging(text)
+
+
+# 一次遍历完成分词、词性标注、词频与实体统计
+class AnalysisResult:
+    """
+    单次 pseg.cut 遍历得到的全部分析结果
+    """
+
+    def __init__(self):
+        self.words = []             # 分词结果列表
+        self.words_pos = []         # 词性标注结果 [(词, 词性)]
+        self.word_freq = Counter()  # 词频
+        self.name_counts = Counter()      # 人名 (nr)
+        self.location_counts = Counter()  # 地名 (ns)
+        self.weapon_counts = Counter()    # 武器名
+        self.corpus = None                # 紧凑模式下的 TokenCorpus
+
+
+@instrument('analysis', text_arg='text', count=lambda result: sum(result.word_freq.values()))
+def analyze_text(text, weapons=None, user_dict=None, segmenter=None, keep_tokens=True, compact=False):
+    """
+    融合分析流程：只做一次词性标注遍历，同时得到分词、词性、词频和人名/地名/武器统计
+    注意分词结果来自 pseg.cut，个别未登录词的切分可能与 jieba.cut 略有不同
+    :param text: 文本内容或文本块可迭代对象
+    :param weapons: 武器名集合
+    :param user_dict: 自定义词典路径（武器词典也应在此传入，保证武器名被切成整词）
+    :param segmenter: 可选的 ParallelSegmenter，用于多进程处理大文本
+    :param keep_tokens: 是否保留完整的分词和标注列表，流式处理超大语料时可关闭
+    :param compact: 是否以 TokenCorpus 整数数组保存分词结果，统计改为向量化计算
+    :return: AnalysisResult
+    """
+    if segmenter is not None:
+        words_pos = segmenter.iter_pos_tagging(text)
+    else:
+        if user_dict and os.path.exists(user_dict):
+            ensure_user_dict(user_dict)
+        words_pos = stream_pos_tagging(text)
+
+    if compact:
+        return analyze_corpus(TokenCorpus.from_tagged(words_pos), weapons)
+    return analyze_tagged(words_pos, weapons, keep_tokens)
+
+
+def analyze_tagged(words_pos, weapons=None, keep_tokens=True):
+    """
+    由已有的词性标注结果一次性统计词频与人名/地名/武器
+    :param words_pos: 词性标注结果可迭代对象 [(词, 词性)]
+    :param weapons: 武器名集合
+    :param keep_tokens: 是否保留完整的分词和标注列表
+    :return: AnalysisResult
+    """
+    weapons = weapons or frozenset()
+    result = AnalysisResult()
+    words = result.words
+    tagged = result.words_pos
+    word_freq = result.word_freq
+    for word, pos in words_pos:
+        if keep_tokens:
+            words.append(word)
+            tagged.append((word, pos))
+        word_freq[word] += 1
+        if pos == 'nr':
+            result.name_counts[word] += 1
+        elif pos == 'ns':
+            result.location_counts[word] += 1
+        if word in weapons:
+            result.weapon_counts[word] += 1
+    return result
+
+
+def analyze_corpus(corpus, weapons=None):
+    """
+    由 TokenCorpus 向量化统计词频与人名/地名/武器
+    :param corpus: 带词性的 TokenCorpus
+    :param weapons: 武器名集合
+    :return: AnalysisResult，其中 words/words_pos 为语料的只读视图
+    """
+    result = AnalysisResult()
+    result.corpus = corpus
+    result.words = corpus.words
+    result.words_pos = corpus.words_pos
+    result.word_freq = corpus.word_frequency()
+    result.name_counts = corpus.entity_counts('nr')
+    result.location_counts = corpus.entity_counts('ns')
+    if weapons:
+        result.weapon_counts = corpus.word_counts(weapons)
+    return result
+
+
+class TokenView:
+    """
+    TokenCorpus 的只读序列视图，按需解码，支持 len/索引/切片/迭代
+    """
+
+    def __init__(self, corpus, with_pos=False):
+        self._corpus = corpus
+        self._with_pos = with_pos
+
+    def __len__(self):
+        return len(self._corpus)
+
+    def _item(self, index):
+        corpus = self._corpus
+        word = corpus.vocab[corpus.ids[index]]
+        if self._with_pos:
+            return word, corpus.tags[corpus.pos_ids[index]]
+        return word
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._item(index)
+
+    def __iter__(self):
+        vocab = self._corpus.vocab
+        if self._with_pos:
+            tags = self._corpus.tags
+            for word_id, pos_id in zip(self._corpus.ids.tolist(), self._corpus.pos_ids.tolist()):
+                yield vocab[word_id], tags[pos_id]
+        else:
+            for word_id in self._corpus.ids.tolist():
+                yield vocab[word_id]
+
+
+# 紧凑的整数数组语料表示
+class TokenCorpus:
+    """
+    词表中每个词只保存一次，文档以 int32 词ID 数组和 uint8 词性ID 数组连续存储
+    词频统计使用 bincount，按词性筛选实体使用向量化掩码
+    """
+
+    def __init__(self, vocab, ids, tags=None, pos_ids=None):
+        """
+        :param vocab: 词表列表，下标即词ID
+        :param ids: int32 词ID 数组
+        :param tags: 词性表列表，下标即词性ID；无词性时为 None
+        :param pos_ids: uint8 词性ID 数组；无词性时为 None
+        """
+        self.vocab = vocab
+        self.ids = np.asarray(ids, dtype=np.int32)
+        self.tags = tags
+        self.pos_ids = np.asarray(pos_ids, dtype=np.uint8) if pos_ids is not None else None
+        self._word_index = None
+
+    @classmethod
+    def from_words(cls, words):
+        """
+        由分词结果构建语料
+        :param words: 词语可迭代对象
+        :return: TokenCorpus
+        """
+        word_index = {}
+        ids = array('i')
+        for word in words:
+            word_id = word_index.get(word)
+            if word_id is None:
+                word_id = word_index[word] = len(word_index)
+            ids.append(word_id)
+        return cls(list(word_index), np.frombuffer(ids, dtype=np.int32))
+
+    @classmethod
+    def from_tagged(cls, words_pos):
+        """
+        由词性标注结果构建语料
+        :param words_pos: 词性标注结果可迭代对象 [(词, 词性)]
+        :return: TokenCorpus
+        """
+        word_index = {}
+        tag_index = {tag: i for i, tag in enumerate(POS_TAGS)}
+        ids = array('i')
+        pos_ids = array('B')
+        for word, tag in words_pos:
+            word_id = word_index.get(word)
+            if word_id is None:
+                word_id = word_index[word] = len(word_index)
+            tag_id = tag_index.get(tag)
+            if tag_id is None:
+                if len(tag_index) > 0xFF:
+                    raise ValueError("词性种类超过 256 个，无法按 uint8 存储")
+                tag_id = tag_index[tag] = len(tag_index)
+            ids.append(word_id)
+            pos_ids.append(tag_id)
+        return cls(list(word_index), np.frombuffer(ids, dtype=np.int32),
+                   list(tag_index), np.frombuffer(pos_ids, dtype=np.uint8))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def words(self):
+        return TokenView(self)
+
+    @property
+    def words_pos(self):
+        if self.pos_ids is None:
+            raise ValueError("语料中没有词性标注结果")
+        return TokenView(self, with_pos=True)
+
+    def word_id(self, word):
+        """
+        查询词ID
+        :param word: 词语
+        :return: 词ID，不在词表中时返回 None
+        """
+        if self._word_index is None:
+            self._word_index = {w: i for i, w in enumerate(self.vocab)}
+        return self._word_index.get(word)
+
+    def _counts_to_result(self, counts, top_n=None):
+        if top_n:
+            # 同频次按词首次出现的顺序排列，与 Counter.most_common 一致
+            top_n = min(top_n, int(np.count_nonzero(counts)))
+            if not top_n:
+                return []
+            top = np.argpartition(-counts, top_n - 1)[:top_n]
+            top = top[np.lexsort((top, -counts[top]))]
+            return [(self.vocab[i], int(counts[i])) for i in top]
+        nonzero = np.flatnonzero(counts)
+        return Counter(dict(zip([self.vocab[i] for i in nonzero], counts[nonzero].tolist())))
+
+    def word_frequency(self, top_n=None):
+        """
+        用 bincount 统计词频
+        :param top_n: 返回前N个高频词
+        :return: 与 count_word_frequency 相同：Counter 或 [(词, 频次)]
+        """
+        counts = np.bincount(self.ids, minlength=len(self.vocab))
+        return self._counts_to_result(counts, top_n)
+
+    def tag_mask(self, *tags):
+        """
+        生成词性掩码
+        :param tags: 一个或多个词性，如 'nr'
+        :return: 布尔数组
+        """
+        if self.pos_ids is None:
+            raise ValueError("语料中没有词性标注结果")
+        tag_ids = [i for i, tag in enumerate(self.tags) if tag in tags]
+        return np.isin(self.pos_ids, tag_ids)
+
+    def word_mask(self, words):
+        """
+        生成词语掩码
+        :param words: 词语集合
+        :return: 布尔数组
+        """
+        word_ids = [i for i in map(self.word_id, words) if i is not None]
+        return np.isin(self.ids, word_ids)
+
+    def sentence_ids(self):
+        """
+        每个词所在的句号：句末标点或换行之后开始新的一句
+        :return: int64 数组
+        """
+        sentence_end = self.word_mask(set(SENTENCE_DELIMITERS) | {'\n'})
+        return np.concatenate(([0], np.cumsum(sentence_end)[:-1])) if len(self.ids) else np.zeros(0, np.int64)
+
+    def entity_counts(self, *tags, top_n=None):
+        """
+        统计指定词性的词语频次
+        :param tags: 一个或多个词性，如 'nr'
+        :param top_n: 返回前N个
+        :return: Counter 或 [(词, 频次)]
+        """
+        counts = np.bincount(self.ids[self.tag_mask(*tags)], minlength=len(self.vocab))
+        return self._counts_to_result(counts, top_n)
+
+    def word_counts(self, words, top_n=None):
+        """
+        统计给定词语集合（如武器词表）中各词的频次
+        :param words: 词语集合
+        :param top_n: 返回前N个
+        :return: Counter 或 [(词, 频次)]
+        """
+        counts = np.bincount(self.ids[self.word_mask(words)], minlength=len(self.vocab))
+        return self._counts_to_result(counts, top_n)
+
+
+# 有界内存的近似高频词统计
+class FrequentItemsCounter:
+    """
+    Misra-Gries 高频项摘要：最多保留 2 * capacity 个计数器，内存与词表大小无关
+    估计频次是真实频次的下界，低估量不超过 error_bound（至多 total / (capacity + 1)）
+    摘要之间可以合并，便于多分片、多进程分别统计后汇总
+    """
+
+    def __init__(self, capacity=None, epsilon=None):
+        """
+        :param capacity: 保留的计数器个数 k
+        :param epsilon: 相对误差上限，未给出 capacity 时取 k = ceil(1 / epsilon)
+        """
+        if capacity is None:
+            capacity = math.ceil(1 / (epsilon or 1e-4))
+        self.capacity = capacity
+        self.total = 0
+        self.error_bound = 0
+        self._counts = {}
+
+    def _reduce(self, limit):
+        """计数器超过 limit 个时，所有计数减去第 capacity+1 大的计数，并丢弃不再为正的计数器"""
+        if len(self._counts) <= limit:
+            return
+        threshold = heapq.nlargest(self.capacity + 1, self._counts.values())[-1]
+        self.error_bound += threshold
+        self._counts = {word: count - threshold for word, count in self._counts.items()
+                        if count > threshold}
+
+    def update(self, words):
+        """
+        累加词语流
+        :param words: 词语可迭代对象，或 {词: 频次} 映射
+        """
+        counts = self._counts
+        limit = 2 * self.capacity
+        if hasattr(words, 'items'):
+            for word, count in words.items():
+                counts[word] = counts.get(word, 0) + count
+                self.total += count
+                if len(counts) > limit:
+                    self._reduce(self.capacity)
+                    counts = self._counts
+            return
+        total = 0
+        for word in words:
+            counts[word] = counts.get(word, 0) + 1
+            total += 1
+            if len(counts) > limit:
+                self._reduce(self.capacity)
+                counts = self._counts
+        self.total += total
+
+    def merge(self, other):
+        """
+        合并另一个摘要（如其他分片或进程的统计结果）
+        :param other: FrequentItemsCounter
+        :return: self
+        """
+        counts = self._counts
+        for word, count in other._counts.items():
+            counts[word] = counts.get(word, 0) + count
+        self.total += other.total
+        self.error_bound += other.error_bound
+        self._reduce(self.capacity)
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __getitem__(self, word):
+        return self._counts.get(word, 0)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def most_common(self, n=None):
+        """
+        :param n: 返回前N个高频词，与 Counter.most_common 接口一致
+        :return: [(词, 估计频次)]
+        """
+        if n is None:
+            return sorted(self._counts.items(), key=lambda x: x[1], reverse=True)
+        return heapq.nlargest(n, self._counts.items(), key=lambda x: x[1])
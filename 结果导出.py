@@ -0,0 +1,363 @@
+import csv
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+
+
+# 导出格式及其扩展名
+# tsv 与早期版本的输出一致（制表符分隔、无表头）；csv 带表头；parquet 和 arrow（Arrow IPC 文件，即 Feather v2）需要 pyarrow
+EXPORT_FORMATS = {
+    'tsv': '.tsv',
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+_EXTENSION_FORMATS = {
+    '.txt': 'tsv',
+    '.tsv': 'tsv',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+    '.ipc': 'arrow',
+}
+
+# 列式格式
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+# 每个缓冲块的行数
+CHUNK_ROWS = 1 << 16
+
+_job_counter = itertools.count(1)
+_job_lock = threading.Lock()
+
+
+def format_of(path, default='tsv'):
+    """
+    由扩展名推断导出格式
+    :param path: 文件路径
+    :param default: 无法识别扩展名时使用的格式
+    :return: 格式名
+    """
+    return _EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def extension_of(fmt):
+    """
+    :param fmt: 格式名
+    :return: 扩展名（含点）
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    return EXPORT_FORMATS[fmt]
+
+
+def job_output_dir(root='output'):
+    """
+    为一次任务创建独立的输出目录，同时运行的任务不会互相覆盖结果
+    :param root: 输出根目录
+    :return: 形如 root/20240101-120000-<进程号>-<序号> 的目录路径
+    """
+    with _job_lock:
+        seq = next(_job_counter)
+    path = os.path.join(root, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{seq}")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _import_pyarrow(fmt):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError(f"导出 {fmt} 格式需要安装 pyarrow: pip install pyarrow") from None
+    return pa
+
+
+# 分块缓冲的表格写出器
+class TableWriter:
+    """
+    逐行或逐列追加数据，缓冲满 chunk_rows 行后整块写出
+    - tsv/csv: 每块一次写入
+    - parquet: 每块一个 row group
+    - arrow: 每块一个 record batch
+    写出到临时文件，close 时原子替换目标文件；出错或中途退出时删除临时文件
+    """
+
+    def __init__(self, path, columns, fmt=None, chunk_rows=CHUNK_ROWS, append=False):
+        """
+        :param path: 输出文件路径
+        :param columns: 列名列表
+        :param fmt: 导出格式，默认由扩展名推断
+        :param chunk_rows: 每块的行数
+        :param append: 追加到已有文件末尾（仅 tsv/csv；列式格式的文件写完后不能再追加）
+        """
+        self.path = path
+        self.columns = list(columns)
+        self.fmt = fmt or format_of(path)
+        if self.fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {self.fmt}")
+        self.chunk_rows = chunk_rows
+        self.rows_written = 0
+        self._rows = []
+        self._writer = None
+        self._schema = None
+        self._file = None
+
+        if self.fmt in COLUMNAR_FORMATS:
+            if append:
+                raise ValueError(f"{self.fmt} 格式不支持追加到已有文件，请在同一个写出器中连续写入")
+            self._pa = _import_pyarrow(self.fmt)
+        append = append and os.path.exists(path)
+        self._target = path if append else f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._append = append
+        if self.fmt not in COLUMNAR_FORMATS:
+            self._file = open(self._target, 'a' if append else 'w', encoding='utf-8', newline='',
+                              buffering=1 << 20)
+            if self.fmt == 'csv':
+                self._csv = csv.writer(self._file)
+                if not (append and os.path.getsize(path)):
+                    self._csv.writerow(self.columns)
+
+    def write_row(self, *row):
+        self._rows.append(row)
+        if len(self._rows) >= self.chunk_rows:
+            self.flush()
+
+    def write_rows(self, rows):
+        """
+        :param rows: 行的可迭代对象，可以是生成器
+        """
+        rows = iter(rows)
+        while True:
+            self._rows.extend(itertools.islice(rows, self.chunk_rows - len(self._rows)))
+            if len(self._rows) < self.chunk_rows:
+                return
+            self.flush()
+
+    def write_columns(self, columns):
+        """
+        直接写出一整块列数据，不经过逐行缓冲
+        :param columns: 与列名顺序一致的列序列（列表、numpy 数组或 pyarrow 数组）
+        """
+        self.flush()
+        if not len(columns[0]):
+            return
+        if self.fmt in COLUMNAR_FORMATS:
+            pa = self._pa
+            arrays = [column if isinstance(column, pa.Array) else pa.array(column) for column in columns]
+            self._write_table(pa.Table.from_arrays(arrays, names=self.columns))
+        else:
+            columns = [column.tolist() if isinstance(column, np.ndarray) else column for column in columns]
+            if self.fmt == 'tsv':
+                # 整列先转成字符串，逐行只需一次 join
+                columns = [column if isinstance(column[0], str) else list(map(str, column)) for column in columns]
+            self._write_text(list(zip(*columns)))
+
+    def flush(self):
+        """写出缓冲区中的行"""
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        if self.fmt in COLUMNAR_FORMATS:
+            columns = list(zip(*rows))
+            self._write_table(self._pa.Table.from_arrays([self._pa.array(c) for c in columns],
+                                                         names=self.columns))
+        else:
+            self._write_text(rows)
+
+    def _write_text(self, rows):
+        if self.fmt == 'csv':
+            self._csv.writerows(rows)
+        else:
+            if not all(isinstance(value, str) for value in rows[0]):
+                rows = [tuple(map(str, row)) for row in rows]
+            self._file.write('\n'.join(map('\t'.join, rows)) + '\n')
+        self.rows_written += len(rows)
+
+    def _write_table(self, table):
+        if self._writer is None:
+            self._open_columnar(table.schema)
+        elif table.schema != self._schema:
+            table = table.cast(self._schema)
+        if self.fmt == 'parquet':
+            self._writer.write_table(table)
+        else:
+            self._writer.write(table)
+        self.rows_written += table.num_rows
+
+    def _open_columnar(self, schema):
+        self._schema = schema
+        if self.fmt == 'parquet':
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self._target, schema, compression='zstd')
+        else:
+            # 与 Feather v2 的默认设置一致，使用 lz4 压缩
+            options = self._pa.ipc.IpcWriteOptions(compression='lz4')
+            self._writer = self._pa.ipc.new_file(self._target, schema, options=options)
+
+    def close(self):
+        """写出剩余数据并替换目标文件"""
+        try:
+            self.flush()
+            if self.fmt in COLUMNAR_FORMATS and self._writer is None:
+                # 没有数据时也写出只有表头的文件
+                pa = self._pa
+                self._open_columnar(pa.schema([(name, pa.string()) for name in self.columns]))
+        except BaseException:
+            self.abort()
+            raise
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+        if not self._append:
+            os.replace(self._target, self.path)
+        return self.path
+
+    def abort(self):
+        """放弃写出，删除临时文件"""
+        for handle in (self._file, self._writer):
+            if handle is not None:
+                try:
+                    handle.close()
+                except Exception:
+                    pass
+        self._file = self._writer = None
+        if not self._append and os.path.exists(self._target):
+            os.remove(self._target)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _vocab_column(values, fmt, pa=None):
+    """词表（或词性表）转换为按ID取值用的数组"""
+    if fmt in COLUMNAR_FORMATS:
+        return pa.array(values, type=pa.string())
+    return np.array(values, dtype=object)
+
+
+def _take(table, ids, fmt, pa=None):
+    if fmt in COLUMNAR_FORMATS:
+        return table.take(pa.array(ids))
+    return table[ids].tolist()
+
+
+def _export_corpus(corpus, writer, with_pos, progress=None):
+    """按块从 TokenCorpus 的ID数组向量化地取出词和词性"""
+    fmt = writer.fmt
+    pa = getattr(writer, '_pa', None)
+    vocab = _vocab_column(corpus.vocab, fmt, pa)
+    tags = _vocab_column(corpus.tags, fmt, pa) if with_pos else None
+    total = len(corpus)
+    for start in range(0, total, writer.chunk_rows):
+        stop = min(start + writer.chunk_rows, total)
+        columns = [_take(vocab, corpus.ids[start:stop], fmt, pa)]
+        if with_pos:
+            columns.append(_take(tags, corpus.pos_ids[start:stop], fmt, pa))
+        writer.write_columns(columns)
+        if progress is not None:
+            progress(stop, total)
+
+
+# 导出词性标注结果
+def export_pos(words_pos, path, fmt=None, chunk_rows=CHUNK_ROWS, append=False, progress=None):
+    """
+    导出词性标注结果，列为 word, pos
+    :param words_pos: TokenCorpus 或 [(词, 词性)] 可迭代对象（可以是生成器）
+    :param path: 输出文件路径
+    :param fmt: 导出格式，默认由扩展名推断
+    :param chunk_rows: 每块的行数
+    :param append: 追加到已有文件（仅 tsv/csv）
+    :param progress: 进度回调 progress(已写出行数, 总行数)，仅输入为 TokenCorpus 时调用
+    :return: 输出文件路径
+    """
+    with TableWriter(path, ['word', 'pos'], fmt, chunk_rows, append) as writer:
+        if getattr(words_pos, 'pos_ids', None) is not None:
+            _export_corpus(words_pos, writer, True, progress)
+        else:
+            # jieba 的 pair 对象拆成普通元组
+            writer.write_rows((word, pos) for word, pos in words_pos)
+    return path
+
+
+# 导出分词结果
+def export_tokens(words, path, fmt=None, chunk_rows=CHUNK_ROWS, append=False, progress=None):
+    """
+    导出分词结果，每个词一行，列为 word
+    :param words: TokenCorpus 或词语可迭代对象
+    :param path: 输出文件路径
+    :param fmt: 导出格式，默认由扩展名推断
+    :param chunk_rows: 每块的行数
+    :param append: 追加到已有文件（仅 tsv/csv）
+    :param progress: 进度回调，仅输入为 TokenCorpus 时调用
+    :return: 输出文件路径
+    """
+    with TableWriter(path, ['word'], fmt, chunk_rows, append) as writer:
+        if hasattr(words, 'ids') and hasattr(words, 'vocab'):
+            _export_corpus(words, writer, False, progress)
+        else:
+            writer.write_rows((word,) for word in words)
+    return path
+
+
+# 导出词频或实体统计
+def export_counts(counts, path, fmt=None, column='word', chunk_rows=CHUNK_ROWS, append=False, progress=None,
+                  value_column='count'):
+    """
+    按频次降序导出计数表，列为 <column>, <value_column>
+    :param counts: Counter、{词: 频次} 或已排序的 [(词, 频次)]（也可以是关键词权重）
+    :param path: 输出文件路径
+    :param fmt: 导出格式，默认由扩展名推断
+    :param column: 第一列的列名，如 word、name、location、weapon
+    :param chunk_rows: 每块的行数
+    :param append: 追加到已有文件（仅 tsv/csv）
+    :param progress: 进度回调 progress(已写出行数, 总行数)
+    :param value_column: 第二列的列名
+    :return: 输出文件路径
+    """
+    if hasattr(counts, 'most_common'):
+        items = counts.most_common()
+    elif isinstance(counts, dict):
+        items = sorted(counts.items(), key=lambda x: x[1], reverse=True)
+    else:
+        items = list(counts)
+    with TableWriter(path, [column, value_column], fmt, chunk_rows, append) as writer:
+        total = len(items)
+        for start in range(0, total, chunk_rows):
+            chunk = items[start:start + chunk_rows]
+            writer.write_columns([[item[0] for item in chunk], [item[1] for item in chunk]])
+            if progress is not None:
+                progress(start + len(chunk), total)
+    return path
+
+
+def read_table(path, fmt=None):
+    """
+    读取导出的表格
+    :param path: 文件路径
+    :param fmt: 格式，默认由扩展名推断
+    :return: pandas.DataFrame
+    """
+    import pandas as pd
+    fmt = fmt or format_of(path)
+    if fmt == 'parquet':
+        return pd.read_parquet(path)
+    if fmt == 'arrow':
+        return pd.read_feather(path)
+    # 第一列是词语（或实体、文件名），'007'、'1e3' 之类的词不能被推断为数字
+    if fmt == 'tsv':
+        return pd.read_csv(path, sep='\t', header=None, encoding='utf-8', keep_default_na=False,
+                           quoting=csv.QUOTE_NONE, dtype={0: str})
+    return pd.read_csv(path, encoding='utf-8', keep_default_na=False, dtype={0: str})
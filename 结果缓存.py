@@ -0,0 +1,230 @@
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+import jieba
+import numpy as np
+
+from 文本处理 import TokenCorpus
+
+
+# 结果缓存目录与默认容量上限
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'nlp_system', 'results')
+DEFAULT_MAX_BYTES = 1 << 30
+
+# 缓存文件格式: 魔数 | 头部长度(uint32) | JSON头部 | 词表偏移(uint32) | 词表 | 词ID(int32) | 词性ID(uint8)
+_MAGIC = b'NLPC'
+_FORMAT_VERSION = 1
+_SUFFIX = '.nlpc'
+
+
+def _align(offset, size=4):
+    return (offset + size - 1) // size * size
+
+
+# 文本内容指纹
+def text_fingerprint(text, block_size=1 << 20):
+    """
+    分块计算文本的 SHA-1 指纹，避免一次性编码整篇文本
+    :param text: 文本内容或文本块可迭代对象
+    :param block_size: 每次编码的字符数
+    :return: 十六进制指纹字符串
+    """
+    digest = hashlib.sha1()
+    blocks = text
+    if isinstance(text, str):
+        blocks = (text[i:i + block_size] for i in range(0, len(text), block_size))
+    for block in blocks:
+        digest.update(block.encode('utf-8'))
+    return digest.hexdigest()
+
+
+# 缓存键
+def make_cache_key(text_hash, mode, dict_fingerprint=None):
+    """
+    由文本指纹、词典指纹、jieba版本和分析模式生成缓存键
+    :param text_hash: 文本指纹（text_fingerprint 的结果）
+    :param mode: 分析模式，如 'segment'、'pos'
+    :param dict_fingerprint: 自定义词典指纹
+    :return: 缓存键
+    """
+    raw = '|'.join([text_hash, dict_fingerprint or '', jieba.__version__, mode])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class CachedResult:
+    """
+    从缓存文件映射出的分词/词性标注结果，词ID和词性ID数组直接引用映射内存
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._parse(path)
+        except (struct.error, KeyError, IndexError, TypeError) as e:
+            # 截断或只写了一部分的文件
+            raise ValueError(f"缓存文件已损坏: {path}") from e
+
+    def _parse(self, path):
+        buf = memoryview(self._mmap)
+        if buf[:4] != _MAGIC:
+            raise ValueError(f"不是有效的缓存文件: {path}")
+        header_len, = struct.unpack_from('<I', buf, 4)
+        offset = 8 + header_len
+        header = json.loads(bytes(buf[8:offset]).decode('utf-8'))
+        if header['version'] != _FORMAT_VERSION or header['byteorder'] != sys.byteorder:
+            raise ValueError(f"缓存文件格式不兼容: {path}")
+
+        vocab_size = header['vocab_size']
+        offset = _align(offset)
+        vocab_offsets = buf[offset:offset + 4 * (vocab_size + 1)].cast('I')
+        offset += 4 * (vocab_size + 1)
+        blob = bytes(buf[offset:offset + vocab_offsets[-1]])
+        self.vocab = [blob[vocab_offsets[i]:vocab_offsets[i + 1]].decode('utf-8')
+                      for i in range(vocab_size)]
+        offset = _align(offset + vocab_offsets[-1])
+
+        n_tokens = header['n_tokens']
+        if offset + n_tokens * (4 if header['tags'] is None else 5) > len(buf):
+            raise ValueError(f"缓存文件不完整: {path}")
+        ids = np.frombuffer(self._mmap, dtype=np.int32, count=n_tokens, offset=offset)
+        offset += 4 * n_tokens
+        tags = header['tags']
+        pos_ids = None
+        if tags is not None:
+            pos_ids = np.frombuffer(self._mmap, dtype=np.uint8, count=n_tokens, offset=offset)
+        self.corpus = TokenCorpus(self.vocab, ids, tags, pos_ids)
+        self.meta = header.get('meta', {})
+
+    @property
+    def words(self):
+        return self.corpus.words
+
+    @property
+    def words_pos(self):
+        return self.corpus.words_pos
+
+    def __len__(self):
+        return len(self.corpus)
+
+
+def write_result(path, corpus, meta=None):
+    """
+    将 TokenCorpus 写为紧凑的二进制缓存文件
+    :param path: 输出文件路径
+    :param corpus: TokenCorpus
+    :param meta: 附加元信息字典
+    """
+    encoded = [word.encode('utf-8') for word in corpus.vocab]
+    vocab_offsets = array('I', [0])
+    for data in encoded:
+        vocab_offsets.append(vocab_offsets[-1] + len(data))
+
+    header = json.dumps({
+        'version': _FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'n_tokens': len(corpus),
+        'vocab_size': len(encoded),
+        'tags': corpus.tags,
+        'meta': meta or {},
+    }, ensure_ascii=False).encode('utf-8')
+
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(_MAGIC + struct.pack('<I', len(header)) + header)
+        f.write(b'\0' * (_align(f.tell()) - f.tell()))
+        f.write(vocab_offsets.tobytes())
+        for data in encoded:
+            f.write(data)
+        f.write(b'\0' * (_align(f.tell()) - f.tell()))
+        f.write(corpus.ids.astype(np.int32, copy=False).tobytes())
+        if corpus.pos_ids is not None:
+            f.write(corpus.pos_ids.astype(np.uint8, copy=False).tobytes())
+    os.replace(temp_file, path)
+
+
+# 基于内容寻址的结果缓存
+class ResultCache:
+    """
+    以 (文本指纹, 词典指纹, jieba版本, 分析模式) 为键的磁盘缓存
+    条目以内存映射方式读取，总大小超过上限时按最近访问时间淘汰
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param cache_dir: 缓存目录
+        :param max_bytes: 缓存总大小上限（字节）
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + _SUFFIX)
+
+    def get(self, key):
+        """
+        读取缓存条目，命中时刷新其访问时间
+        :param key: 缓存键
+        :return: CachedResult，未命中时返回 None
+        """
+        path = self._path(key)
+        try:
+            result = CachedResult(path)
+            os.utime(path)
+        except ValueError:
+            # 损坏的条目按未命中处理并删除，之后重新写入
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        except OSError:
+            return None
+        return result
+
+    def put(self, key, corpus, meta=None):
+        """
+        写入缓存条目并按容量上限淘汰旧条目
+        :param key: 缓存键
+        :param corpus: TokenCorpus
+        :param meta: 附加元信息字典
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_result(self._path(key), corpus, meta)
+        self.evict()
+
+    def evict(self):
+        """删除最久未访问的条目，直到总大小不超过上限"""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        """清空缓存"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(_SUFFIX):
+                os.remove(os.path.join(self.cache_dir, name))
@@ -0,0 +1,364 @@
+import tkinter as tk
+from abc import ABC, abstractmethod
+from tkinter import ttk
+import tkinter.font as tkfont
+
+import numpy as np
+
+from 结果导出 import export_counts, export_pos, export_tokens
+
+
+# 空白词（jieba 会把换行、空格单独切成词）显示时的替代字符，保证每个结果行只占一行
+_VISIBLE = str.maketrans({'\n': '↵', '\r': '↵', '\t': '⇥', ' ': '␣', '\u3000': '␣'})
+
+
+def _display(word):
+    """
+    词语在结果显示区中的写法，空白词替换为可见字符
+    :param word: 词语
+    :return: 显示文本
+    """
+    return word.translate(_VISIBLE) if word.isspace() else word
+
+
+# 结果的惰性行序列
+class ResultSource(ABC):
+    """
+    以行为单位按需生成结果文本，查看和保存时都不需要一次性拼出完整字符串
+    子类实现 _count（正文行数）和 _body（正文第 start 到 stop 行）
+    """
+
+    def __init__(self, header=()):
+        """
+        :param header: 正文之前的标题行
+        """
+        self.header = list(header)
+
+    @abstractmethod
+    def _count(self):
+        """正文行数"""
+
+    @abstractmethod
+    def _body(self, start, stop):
+        """正文第 start 到 stop 行（不含），每行不含换行符"""
+
+    def __len__(self):
+        return len(self.header) + self._count()
+
+    def lines(self, start, stop):
+        """
+        读取一页结果
+        :param start: 起始行号
+        :param stop: 结束行号（不含）
+        :return: 行列表
+        """
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        head = len(self.header)
+        result = self.header[start:stop]
+        if stop > head:
+            result += self._body(max(start - head, 0), stop - head)
+        return result
+
+    def line_of(self, offset):
+        """
+        由项的序号（第几个词、第几名）得到所在行号
+        :param offset: 从0开始的序号
+        :return: 行号
+        """
+        return len(self.header) + offset
+
+    def iter_chunks(self, chunk_lines=4096):
+        """
+        分块产出完整结果，用于流式保存
+        :param chunk_lines: 每块的行数
+        :return: (文本块, 已产出行数) 生成器
+        """
+        total = len(self)
+        for start in range(0, total, chunk_lines):
+            stop = min(start + chunk_lines, total)
+            yield '\n'.join(self.lines(start, stop)) + '\n', stop
+
+    def find(self, needle, start=0, page=4096):
+        """
+        从指定行开始向后查找包含 needle 的行，到末尾后从头继续
+        :param needle: 查找内容
+        :param start: 起始行号
+        :param page: 每次读取的行数
+        :return: 行号，找不到时返回 -1
+        """
+        total = len(self)
+        for first, last in ((start, total), (0, start)):
+            for page_start in range(first, last, page):
+                for i, line in enumerate(self.lines(page_start, min(page_start + page, last))):
+                    if needle in line:
+                        return page_start + i
+        return -1
+
+    def export(self, path, fmt=None, progress=None):
+        """
+        保存完整结果
+        :param path: 输出文件路径
+        :param fmt: 表格格式 tsv/csv/parquet/arrow；为 None 时按显示的文本逐行保存
+        :param progress: 进度回调 progress(已完成量, 总量)
+        :return: 输出文件路径
+        """
+        if fmt is not None:
+            raise ValueError("该结果只能保存为文本")
+        total = len(self)
+        with open(path, 'w', encoding='utf-8') as f:
+            for chunk, done in self.iter_chunks():
+                f.write(chunk)
+                if progress is not None:
+                    progress(done, total)
+        return path
+
+
+class TextResult(ResultSource):
+    """普通文本结果，如提示和错误信息"""
+
+    def __init__(self, text):
+        super().__init__()
+        self._lines = text.split('\n')
+
+    def _count(self):
+        return len(self._lines)
+
+    def _body(self, start, stop):
+        return self._lines[start:stop]
+
+
+class TokenResult(ResultSource):
+    """
+    分词或词性标注结果，每行若干个词，从 TokenCorpus 按需解码
+    """
+
+    def __init__(self, corpus, with_pos=False, per_line=20, header=()):
+        """
+        :param corpus: TokenCorpus（可以来自内存映射的结果缓存）
+        :param with_pos: 是否显示词性
+        :param per_line: 每行的词数
+        :param header: 标题行
+        """
+        super().__init__(header)
+        self.corpus = corpus
+        self.with_pos = with_pos
+        self.per_line = per_line
+        self._view = corpus.words_pos if with_pos else corpus.words
+
+    def _count(self):
+        return -(-len(self.corpus) // self.per_line)
+
+    def _body(self, start, stop):
+        per_line = self.per_line
+        tokens = self._view[start * per_line:stop * per_line]
+        if self.with_pos:
+            tokens = [f"{_display(word)}/{pos}" for word, pos in tokens]
+        else:
+            tokens = [_display(word) for word in tokens]
+        return [' '.join(tokens[i:i + per_line]) for i in range(0, len(tokens), per_line)]
+
+    def line_of(self, offset):
+        return len(self.header) + offset // self.per_line
+
+    def find(self, needle, start=0, page=4096):
+        if '/' in needle or ' ' in needle:
+            return super().find(needle, start, page)
+        head = len(self.header)
+        for i in range(start, head):
+            if needle in self.header[i]:
+                return i
+        # 只查词表（词性视图中还查词性表），再在ID数组中向量化定位，不需要解码整篇结果
+        corpus = self.corpus
+        word_ids = [i for i, word in enumerate(corpus.vocab) if needle in _display(word)]
+        tag_ids = []
+        if self.with_pos:
+            tag_ids = [i for i, tag in enumerate(corpus.tags) if needle in tag]
+
+        def first_hit(lo, hi):
+            mask = np.isin(corpus.ids[lo:hi], word_ids)
+            if tag_ids:
+                mask |= np.isin(corpus.pos_ids[lo:hi], tag_ids)
+            hits = np.flatnonzero(mask)
+            return self.line_of(lo + int(hits[0])) if len(hits) else -1
+
+        first = max(start - head, 0) * self.per_line
+        if word_ids or tag_ids:
+            line = first_hit(first, None)
+            if line >= 0:
+                return line
+        for i in range(min(start, head)):
+            if needle in self.header[i]:
+                return i
+        if word_ids or tag_ids:
+            return first_hit(0, first)
+        return -1
+
+    def export(self, path, fmt=None, progress=None):
+        if fmt is None:
+            return super().export(path, fmt, progress)
+        if self.with_pos:
+            return export_pos(self.corpus, path, fmt, progress=progress)
+        return export_tokens(self.corpus, path, fmt, progress=progress)
+
+
+class CountResult(ResultSource):
+    """词频或实体统计结果，按频次降序，每行一项"""
+
+    def __init__(self, counts, header=(), column='word', value_column='count'):
+        """
+        :param counts: Counter 或 [(词, 频次)] 列表
+        :param header: 标题行
+        :param column: 导出为表格时第一列的列名
+        :param value_column: 导出为表格时第二列的列名
+        """
+        super().__init__(header)
+        self.column = column
+        self.value_column = value_column
+        self._counts = counts
+        self._items = None
+
+    @property
+    def items(self):
+        # 第一次查看时才排序
+        if self._items is None:
+            counts = self._counts
+            self._items = counts.most_common() if hasattr(counts, 'most_common') else list(counts)
+        return self._items
+
+    def _count(self):
+        return len(self._counts)
+
+    def _body(self, start, stop):
+        return [f"{_display(word)}: {count}" for word, count in self.items[start:stop]]
+
+    def export(self, path, fmt=None, progress=None):
+        if fmt is None:
+            return super().export(path, fmt, progress)
+        return export_counts(self.items, path, fmt, column=self.column, progress=progress,
+                             value_column=self.value_column)
+
+
+# 虚拟滚动的结果显示区
+class ResultViewer(ttk.Frame):
+    """
+    只渲染可见的若干行；滚动条对应完整结果，滚动时按需读取对应的页
+    支持查找（从当前位置向后，循环）和跳转到第N项
+    """
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, **kwargs)
+        self.source = TextResult('')
+        self.top = 0
+        self.match = None
+
+        toolbar = ttk.Frame(self)
+        toolbar.pack(fill=tk.X)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(toolbar, textvariable=self.search_var, width=16)
+        search_entry.pack(side=tk.LEFT, padx=2)
+        search_entry.bind('<Return>', lambda event: self.search())
+        ttk.Button(toolbar, text="查找", command=self.search).pack(side=tk.LEFT, padx=2)
+        self.jump_var = tk.StringVar()
+        jump_entry = ttk.Entry(toolbar, textvariable=self.jump_var, width=10)
+        jump_entry.pack(side=tk.LEFT, padx=(10, 2))
+        jump_entry.bind('<Return>', lambda event: self.jump())
+        ttk.Button(toolbar, text="跳转到第N项", command=self.jump).pack(side=tk.LEFT, padx=2)
+        self.info = ttk.Label(toolbar, text="")
+        self.info.pack(side=tk.RIGHT, padx=2)
+
+        body = ttk.Frame(self)
+        body.pack(fill=tk.BOTH, expand=True)
+        self.text = tk.Text(body, wrap=tk.NONE, width=60, height=15)
+        self.scrollbar = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self._on_scroll)
+        xscroll = ttk.Scrollbar(body, orient=tk.HORIZONTAL, command=self.text.xview)
+        self.text.config(xscrollcommand=xscroll.set, state=tk.DISABLED)
+        self.text.tag_configure('match', background='yellow')
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        xscroll.pack(side=tk.BOTTOM, fill=tk.X)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.text.bind('<Configure>', lambda event: self.render())
+        self.text.bind('<MouseWheel>', lambda event: self.scroll(-1 if event.delta > 0 else 1, 'units'))
+        self.text.bind('<Button-4>', lambda event: self.scroll(-1, 'units'))
+        self.text.bind('<Button-5>', lambda event: self.scroll(1, 'units'))
+        self.text.bind('<Prior>', lambda event: self.scroll(-1, 'pages'))
+        self.text.bind('<Next>', lambda event: self.scroll(1, 'pages'))
+
+    def set_source(self, source):
+        """
+        显示新的结果
+        :param source: ResultSource 或字符串
+        """
+        self.source = TextResult(source) if isinstance(source, str) else source
+        self.top = 0
+        self.match = None
+        self.render()
+
+    def visible_lines(self):
+        font = tkfont.Font(font=self.text.cget('font'))
+        return max(self.text.winfo_height() // font.metrics('linespace'), 1)
+
+    def render(self):
+        total = len(self.source)
+        count = self.visible_lines()
+        self.top = max(min(self.top, total - count), 0)
+        lines = self.source.lines(self.top, self.top + count)
+
+        self.text.config(state=tk.NORMAL)
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.END, '\n'.join(lines))
+        needle = self.search_var.get()
+        if self.match is not None and needle and self.top <= self.match < self.top + count:
+            row = self.match - self.top + 1
+            start = self.text.search(needle, f"{row}.0", stopindex=f"{row}.end")
+            while start:
+                end = f"{start}+{len(needle)}c"
+                self.text.tag_add('match', start, end)
+                start = self.text.search(needle, end, stopindex=f"{row}.end")
+        self.text.config(state=tk.DISABLED)
+
+        if total:
+            self.scrollbar.set(self.top / total, min((self.top + count) / total, 1.0))
+            self.info.config(text=f"第 {self.top + 1}-{self.top + len(lines)} 行 / 共 {total} 行")
+        else:
+            self.scrollbar.set(0.0, 1.0)
+            self.info.config(text="")
+
+    def scroll_to(self, line):
+        self.top = line
+        self.render()
+
+    def scroll(self, amount, what='units'):
+        step = self.visible_lines() if what == 'pages' else 3
+        self.scroll_to(self.top + amount * step)
+        return 'break'
+
+    def _on_scroll(self, action, *args):
+        if action == 'moveto':
+            self.scroll_to(int(float(args[0]) * len(self.source)))
+        elif action == 'scroll':
+            self.scroll(int(args[0]), args[1])
+
+    def search(self):
+        needle = self.search_var.get()
+        if not needle:
+            return
+        start = self.match + 1 if self.match is not None else self.top
+        line = self.source.find(needle, start % max(len(self.source), 1))
+        if line < 0:
+            self.match = None
+            self.render()
+            self.info.config(text=f"未找到: {needle}")
+            return
+        self.match = line
+        self.scroll_to(line - self.visible_lines() // 2)
+
+    def jump(self):
+        try:
+            offset = int(self.jump_var.get())
+        except ValueError:
+            self.info.config(text="请输入项的序号")
+            return
+        self.match = None
+        self.scroll_to(self.source.line_of(max(offset - 1, 0)))
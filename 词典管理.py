@@ -0,0 +1,305 @@
+import hashlib
+import marshal
+import os
+import re
+import threading
+
+import jieba
+
+
+# 预编译词典缓存目录
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'nlp_system', 'dict')
+
+# 预编译词典缓存最多保留的文件数，超出时删除最久未使用的
+MAX_COMPILED_DICTS = 16
+
+# 与 jieba.load_userdict 相同的行格式: 词 [词频] [词性]
+_DICT_LINE = re.compile(r'^(.+?)( [0-9]+)?( [a-z]+)?$')
+
+
+# 读取词典词表
+def load_dict_words(dict_path):
+    """
+    读取 jieba 格式词典（每行: 词 [词频] [词性]）中的词语
+    :param dict_path: 词典文件路径
+    :return: 词语集合
+    """
+    words = set()
+    with open(dict_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.strip().split()
+            if parts:
+                words.add(parts[0])
+    return words
+
+
+# 自定义词典功能
+def create_custom_dict(words_dict, output_file):
+    """
+    创建自定义词典
+    :param words_dict: 词汇字典 {词: 词频}
+    :param output_file: 输出文件路径
+    """
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for word, freq in words_dict.items():
+            f.write(f"{word} {freq} n\n")  # 默认词性为n
+
+
+# 解析词典条目
+def parse_dict_entries(dict_path):
+    """
+    解析 jieba 格式词典
+    :param dict_path: 词典文件路径
+    :return: 条目列表 [(词, 词频或None, 词性或None)]
+    """
+    entries = []
+    with open(dict_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip().lstrip('\ufeff')
+            if not line:
+                continue
+            word, freq, tag = _DICT_LINE.match(line).groups()
+            entries.append((
+                word.strip(),
+                int(freq) if freq is not None else None,
+                tag.strip() if tag is not None else None
+            ))
+    return entries
+
+
+# 计算词典指纹
+def file_fingerprint(file_path):
+    """
+    计算文件内容的 SHA-1 指纹
+    :param file_path: 文件路径
+    :return: 十六进制指纹字符串
+    """
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# 词典管理器
+class DictionaryManager:
+    """
+    管理加载到 jieba 中的自定义词典
+    - 每个词典只解析一次，解析结果按内容指纹持久化为预编译文件
+    - 词典内容未变化时不做任何操作
+    - 词典变化时只对新增/修改/删除的词条调用 add_word/del_word
+    """
+
+    def __init__(self, tokenizer=None, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        :param tokenizer: jieba 分词器，默认为全局分词器
+        :param cache_dir: 预编译词典缓存目录，为 None 时不持久化
+        """
+        self.tokenizer = tokenizer or jieba.dt
+        self.cache_dir = cache_dir
+        self._lock = threading.RLock()
+        self._dicts = []          # 已注册的词典路径（后注册的优先）
+        self._stats = {}          # 路径 -> (修改时间, 大小, 指纹)
+        self._parsed = {}         # 指纹 -> 条目列表
+        self._manual = {}         # 手动添加的词条，None 表示手动删除
+        self._applied = {}        # 当前已应用到分词器的词条 {词: (词频, 词性)}
+        self._original = {}       # 被覆盖词条在默认词典中的原始 (词频, 词性)
+        self.fingerprint = None
+
+    def add_dict(self, dict_path):
+        """
+        注册词典并同步到分词器
+        :param dict_path: 词典文件路径
+        :return: 同步后的整体指纹
+        """
+        with self._lock:
+            dict_path = os.path.abspath(dict_path)
+            if dict_path not in self._dicts:
+                self._dicts.append(dict_path)
+            return self.sync()
+
+    def remove_dict(self, dict_path):
+        """
+        注销词典，并从分词器中撤销它带来的词条
+        :param dict_path: 词典文件路径
+        """
+        with self._lock:
+            dict_path = os.path.abspath(dict_path)
+            if dict_path in self._dicts:
+                self._dicts.remove(dict_path)
+                self._stats.pop(dict_path, None)
+            return self.sync()
+
+    def add_word(self, word, freq=None, tag=None):
+        """
+        手动添加词条，优先级高于词典文件
+        :param word: 词语
+        :param freq: 词频
+        :param tag: 词性
+        """
+        with self._lock:
+            self._manual[word] = (freq, tag)
+            return self.sync()
+
+    def del_word(self, word):
+        """
+        手动删除词条
+        :param word: 词语
+        """
+        with self._lock:
+            self._manual[word] = None
+            return self.sync()
+
+    def _dict_fingerprint(self, dict_path):
+        """文件修改时间和大小未变时复用上次的指纹，避免重复读取大词典"""
+        stat = os.stat(dict_path)
+        cached = self._stats.get(dict_path)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        fingerprint = file_fingerprint(dict_path)
+        self._stats[dict_path] = (stat.st_mtime_ns, stat.st_size, fingerprint)
+        return fingerprint
+
+    def _load_entries(self, dict_path, fingerprint):
+        """优先读取预编译文件，不存在时解析词典并写入预编译文件"""
+        entries = self._parsed.get(fingerprint)
+        if entries is not None:
+            return entries
+        compiled = os.path.join(self.cache_dir, fingerprint + '.dict') if self.cache_dir else None
+        if compiled and os.path.exists(compiled):
+            with open(compiled, 'rb') as f:
+                entries = marshal.load(f)
+            # 更新修改时间，清理时按最近使用排序
+            os.utime(compiled)
+        else:
+            entries = parse_dict_entries(dict_path)
+            if compiled:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                temp_file = f"{compiled}.{os.getpid()}.tmp"
+                with open(temp_file, 'wb') as f:
+                    marshal.dump(entries, f)
+                os.replace(temp_file, compiled)
+                self._prune_compiled()
+        self._parsed[fingerprint] = entries
+        return entries
+
+    def _prune_compiled(self, keep=MAX_COMPILED_DICTS):
+        """只保留最近使用的 keep 个预编译文件"""
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.dict'):
+                try:
+                    files.append((entry.stat().st_mtime_ns, entry.path))
+                except OSError:
+                    continue
+        files.sort(reverse=True)
+        for _, path in files[keep:]:
+            try:
+                os.remove(path)
+            except OSError:
+                # 其他进程可能已经删除
+                pass
+
+    def sync(self):
+        """
+        重新检查所有已注册词典，并把合并后的差异应用到分词器
+        :return: 整体指纹
+        """
+        with self._lock:
+            fingerprints = [(path, self._dict_fingerprint(path)) for path in self._dicts]
+            digest = hashlib.sha1(repr((
+                [fp for _, fp in fingerprints], sorted(self._manual.items())
+            )).encode('utf-8')).hexdigest()
+            if digest == self.fingerprint:
+                return digest
+
+            merged = {}
+            for path, fp in fingerprints:
+                for word, freq, tag in self._load_entries(path, fp):
+                    merged[word] = (freq, tag)
+            for word, entry in self._manual.items():
+                if entry is None:
+                    merged.pop(word, None)
+                else:
+                    merged[word] = entry
+
+            self._apply_delta(merged)
+            self._applied = merged
+            self.fingerprint = digest
+            return digest
+
+    def _pos_tags(self):
+        """
+        posseg 实际使用的词性表，先合并分词器中尚未合并的自定义词性
+        :return: 词性表；分词器不是 jieba 全局分词器时为 None
+        """
+        if self.tokenizer is not jieba.dt:
+            return None
+        import jieba.posseg as pseg
+        pseg.dt.makesure_userdict_loaded()
+        return pseg.dt.word_tag_tab
+
+    def _apply_delta(self, merged):
+        tokenizer = self.tokenizer
+        tokenizer.check_initialized()
+        tags = self._pos_tags()
+
+        def remember(word):
+            if word not in self._original:
+                tag = tags.get(word) if tags is not None else None
+                self._original[word] = (tokenizer.FREQ.get(word), tag)
+
+        for word, entry in self._applied.items():
+            if word not in merged:
+                self._restore(word)
+        for word, entry in merged.items():
+            if self._applied.get(word) != entry:
+                remember(word)
+                tokenizer.add_word(word, *entry)
+        for word, entry in self._manual.items():
+            if entry is None and word not in self._original:
+                remember(word)
+                tokenizer.del_word(word)
+
+    def _restore(self, word):
+        """撤销词条，恢复其在默认词典中的词频和词性"""
+        tokenizer = self.tokenizer
+        freq, tag = self._original.pop(word, (None, None))
+        tokenizer.user_word_tag_tab.pop(word, None)
+        if freq:
+            tokenizer.add_word(word, freq)
+        else:
+            tokenizer.del_word(word)
+        # posseg 已把自定义词性合并进自己的词性表，只清除分词器中的待合并项不够
+        tags = self._pos_tags()
+        if tags is not None:
+            if tag is None:
+                tags.pop(word, None)
+            else:
+                tags[word] = tag
+
+
+# 全局词典管理器
+_default_manager = None
+_default_lock = threading.Lock()
+
+
+def get_dictionary_manager():
+    """
+    获取作用于 jieba 全局分词器的词典管理器
+    :return: DictionaryManager
+    """
+    global _default_manager
+    with _default_lock:
+        if _default_manager is None:
+            _default_manager = DictionaryManager()
+        return _default_manager
+
+
+def ensure_user_dict(dict_path):
+    """
+    确保自定义词典已加载到 jieba；词典未变化时不会重复加载
+    :param dict_path: 词典文件路径
+    :return: 整体指纹
+    """
+    return get_dictionary_manager().add_dict(dict_path)